@@ -1,5 +1,8 @@
 #!/bin/bash
 
+# 脚本通过 pipeline.utils 导入与推理管道共用的模块
+export PYTHONPATH="$(pwd)/src${PYTHONPATH:+:$PYTHONPATH}"
+
 OUTPUT_BASE_DIR="./outputs/bird"
 data_mode="dev"
 db_root_path="../datasets/BIRD/dev/dev_databases"
@@ -10,8 +13,11 @@ predicted_sql_json_path_2="${OUTPUT_BASE_DIR}/${data_mode}/sql_results/refined_s
 predicted_sql_json_path_3="${OUTPUT_BASE_DIR}/${data_mode}/sql_results/selected_sqls.sql"
 ground_truth_sql_path="${OUTPUT_BASE_DIR}/${data_mode}/sql_results/gold_sqls.sql"
 question_ids_path="${OUTPUT_BASE_DIR}/${data_mode}/sql_results/question_ids.txt"
+# 由管道流写出的按数据库延迟统计；存在时用于自适应超时（meta_time_out 作为上限）
+latency_stats_path="${OUTPUT_BASE_DIR}/${data_mode}/latency_stats.json"
 num_cpus=12
 meta_time_out=60.0
+db_residency_mb=0 # 每个评估进程常驻内存的数据库副本预算（MB），0 表示关闭
 time_out=60
 mode_gt="gt"
 mode_predict="gpt"
@@ -34,7 +40,12 @@ CMD="$CMD \
     --diff_json_path \"$diff_json_path\" \
     --num_cpus \"$num_cpus\" \
     --meta_time_out \"$meta_time_out\" \
+    --db_residency_mb \"$db_residency_mb\" \
     --mode_predict \"$mode_predict\""
 
+if [ -f "$latency_stats_path" ]; then
+    CMD="$CMD --latency_stats_path \"$latency_stats_path\""
+fi
+
 eval $CMD
 echo "Compare EX done!"
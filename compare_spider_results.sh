@@ -1,5 +1,8 @@
 #!/bin/bash
 
+# 脚本通过 pipeline.utils 导入与推理管道共用的模块
+export PYTHONPATH="$(pwd)/src${PYTHONPATH:+:$PYTHONPATH}"
+
 OUTPUT_BASE_DIR="./outputs/spider"
 data_mode="dev"
 DB_PATH="../datasets/Spider/database"
@@ -10,6 +13,7 @@ PRED3_PATH="${OUTPUT_BASE_DIR}/${data_mode}/sql_results/selected_sqls.sql"
 GOLD_PATH="${OUTPUT_BASE_DIR}/${data_mode}/sql_results/gold_sqls.sql"
 QUESTION_IDS_PATH="${OUTPUT_BASE_DIR}/${data_mode}/sql_results/question_ids.txt"
 META_TIME_OUT=30.0 # 默认超时时间
+DB_RESIDENCY_MB=1024 # 常驻内存的数据库副本预算（MB），0 表示关闭
 
 python ./evaluation/compare_evaluation_spider.py \
     --db "${DB_PATH}" \
@@ -19,4 +23,5 @@ python ./evaluation/compare_evaluation_spider.py \
     --gold "${GOLD_PATH}" \
     --question_ids_path "${QUESTION_IDS_PATH}" \
     --meta_time_out "${META_TIME_OUT}" \
+    --db_residency_mb "${DB_RESIDENCY_MB}" \
     --etype "exec"
@@ -0,0 +1,353 @@
+import os
+import re
+import json
+import time
+import shutil
+import sys
+import logging
+import sqlite3
+import argparse
+import statistics
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from tqdm import tqdm
+
+SQLITE_READ = 20
+
+IDENTIFIER = r'(?:`[^`]+`|"[^"]+"|\[[^\]]+\]|[A-Za-z_][A-Za-z0-9_]*)'
+# column optionally qualified by a table alias, e.g. T1.`School Name`
+COLUMN_REF = rf'(?:{IDENTIFIER}\s*\.\s*)?({IDENTIFIER})'
+EQUALITY_OPS = r'(?:==|=|\bIN\b|\bIS\b)'
+RANGE_OPS = r'(?:<=|>=|<>|!=|<|>|\bBETWEEN\b|\bLIKE\b|\bGLOB\b)'
+EQUALITY_PATTERNS = [
+    re.compile(rf'{COLUMN_REF}\s*{EQUALITY_OPS}', re.IGNORECASE),
+    re.compile(rf'(?<![<>!])=\s*{COLUMN_REF}', re.IGNORECASE),
+]
+RANGE_PATTERNS = [
+    re.compile(rf'{COLUMN_REF}\s*(?:NOT\s+)?{RANGE_OPS}', re.IGNORECASE),
+    re.compile(rf'(?:<=|>=|<|>)\s*{COLUMN_REF}', re.IGNORECASE),
+]
+
+
+def quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def unquote_identifier(name):
+    if name[:1] in ('`', '"', '[') and len(name) >= 2:
+        return name[1:-1]
+    return name
+
+
+def load_queries(json_dataset=None, sql_results_dir=None):
+    """
+    Collect (query_key, db_id, sql) triples.
+    Gold queries come from a BIRD style json dataset (SQL, db_id) and/or from the pipeline's sql_results
+    directory, whose other *.sql files (candidates, refined, selected) are line-aligned with gold_sqls.sql.
+    """
+    queries = []
+    if json_dataset:
+        with open(json_dataset, 'r', encoding='utf-8') as f:
+            dataset = json.load(f)
+        for idx, item in enumerate(dataset):
+            question_id = item.get('question_id', idx)
+            queries.append((f"dataset:{question_id}", item['db_id'], item.get('SQL', item.get('query'))))
+
+    if sql_results_dir:
+        gold_path = os.path.join(sql_results_dir, "gold_sqls.sql")
+        with open(gold_path, 'r', encoding='utf-8') as f:
+            gold_lines = [line.rstrip('\n') for line in f if line.strip()]
+        db_ids = [line.rsplit('\t', 1)[1].strip() for line in gold_lines]
+        for file_name in sorted(os.listdir(sql_results_dir)):
+            if not file_name.endswith('.sql'):
+                continue
+            with open(os.path.join(sql_results_dir, file_name), 'r', encoding='utf-8') as f:
+                lines = [line.rstrip('\n') for line in f if line.strip()]
+            if len(lines) != len(db_ids):
+                logging.warning(f"{file_name} has {len(lines)} lines but gold_sqls.sql has {len(db_ids)}. Skipping...")
+                continue
+            for idx, (line, db_id) in enumerate(zip(lines, db_ids)):
+                sql = line.rsplit('\t', 1)[0] if file_name == "gold_sqls.sql" else line
+                queries.append((f"{file_name}:{idx}", db_id, sql))
+    return queries
+
+
+def get_referenced_columns(conn, sql):
+    """Use the SQLite authorizer while compiling the query to get {table: [columns read]}, with aliases resolved."""
+    referenced = defaultdict(list)
+
+    def authorizer(action, arg1, arg2, db_name, trigger_name):
+        if action == SQLITE_READ and arg1 and arg2 and db_name == "main" and not arg1.startswith("sqlite_"):
+            if arg2 not in referenced[arg1]:
+                referenced[arg1].append(arg2)
+        return sqlite3.SQLITE_OK
+
+    conn.set_authorizer(authorizer)
+    try:
+        conn.execute(f"EXPLAIN {sql}")
+    finally:
+        conn.set_authorizer(None)
+    return referenced
+
+
+def get_predicate_columns(sql):
+    """Return (equality columns, range columns) in order of appearance, as lower-cased bare column names."""
+    def collect(patterns):
+        found = []
+        for pattern in patterns:
+            for match in pattern.finditer(sql):
+                found.append((match.start(1), unquote_identifier(match.group(1)).lower()))
+        names = []
+        for _, name in sorted(found):
+            if name not in names:
+                names.append(name)
+        return names
+
+    equality_columns = collect(EQUALITY_PATTERNS)
+    range_columns = [c for c in collect(RANGE_PATTERNS) if c not in equality_columns]
+    return equality_columns, range_columns
+
+
+def get_rowid_alias(conn, table_name):
+    """Lower-cased name of the INTEGER PRIMARY KEY column of a table, which is already the rowid, or None."""
+    pk_columns = [row for row in conn.execute(f"PRAGMA table_info({quote_identifier(table_name)})") if row[5] > 0]
+    if len(pk_columns) == 1 and pk_columns[0][2].upper() == "INTEGER":
+        return pk_columns[0][1].lower()
+    return None
+
+
+def get_existing_index_keys(conn, table_name):
+    """Key column lists (lower-cased) of the indexes a table already has."""
+    keys = []
+    for index in conn.execute(f"PRAGMA index_list({quote_identifier(table_name)})").fetchall():
+        columns = [row[2] for row in conn.execute(f"PRAGMA index_info({quote_identifier(index[1])})")]
+        if all(columns):
+            keys.append([c.lower() for c in columns])
+    return keys
+
+
+def recommend_indexes(conn, sqls, max_index_columns=6, max_indexes_per_table=3, min_support=1):
+    """
+    Mine the predicates of the given queries and recommend indexes as {table: [[columns], ...]}.
+    Each query contributes, per table, its equality columns followed by one range column; the remaining
+    columns it reads from that table are appended when the index stays within max_index_columns, so the
+    query can be answered from the index alone.
+    """
+    support = Counter()
+    for sql in sqls:
+        try:
+            referenced = get_referenced_columns(conn, sql)
+        except sqlite3.Error:
+            continue # the query does not compile, nothing to learn from it
+        equality_columns, range_columns = get_predicate_columns(sql)
+        for table_name, columns in referenced.items():
+            # the rowid is part of every index entry and rowid lookups need no index
+            rowid_alias = get_rowid_alias(conn, table_name)
+            columns = [c for c in columns if c.lower() != rowid_alias]
+            by_name = {c.lower(): c for c in columns}
+            key = [by_name[c] for c in equality_columns if c in by_name]
+            key += [by_name[c] for c in range_columns if c in by_name][:1]
+            if not key:
+                continue
+            covering = key + [c for c in columns if c not in key]
+            support[(table_name, tuple(covering if len(covering) <= max_index_columns else key))] += 1
+
+    # an index also serves every query whose key is one of its prefixes
+    candidates = sorted(support, key=lambda k: len(k[1]), reverse=True)
+    merged = Counter()
+    for table_name, columns in candidates:
+        lowered = [c.lower() for c in columns]
+        wider = next((
+            other for other in merged
+            if other[0] == table_name and [c.lower() for c in other[1][:len(columns)]] == lowered
+        ), None)
+        merged[wider or (table_name, columns)] += support[(table_name, columns)]
+
+    recommendations = defaultdict(list)
+    for (table_name, columns), count in merged.most_common():
+        if count < min_support or len(recommendations[table_name]) >= max_indexes_per_table:
+            continue
+        lowered = [c.lower() for c in columns]
+        existing_keys = get_existing_index_keys(conn, table_name)
+        if any(existing[:len(lowered)] == lowered for existing in existing_keys):
+            continue # an existing index already starts with these columns
+        recommendations[table_name].append(list(columns))
+    return {table: indexes for table, indexes in recommendations.items() if indexes}
+
+
+def build_indexed_database(db_file_path, indexed_file_path, recommendations):
+    """Copy db_file_path to indexed_file_path and create the recommended indexes on the copy."""
+    os.makedirs(os.path.dirname(indexed_file_path), exist_ok=True)
+    tmp_path = f"{indexed_file_path}.tmp"
+    shutil.copyfile(db_file_path, tmp_path)
+    created = []
+    conn = sqlite3.connect(tmp_path)
+    try:
+        for table_name, indexes in recommendations.items():
+            for n, columns in enumerate(indexes):
+                index_name = f"idx_advisor_{re.sub(r'[^0-9A-Za-z_]', '_', table_name)}_{n}"
+                column_list = ", ".join(quote_identifier(c) for c in columns)
+                try:
+                    conn.execute(f"CREATE INDEX {quote_identifier(index_name)} ON {quote_identifier(table_name)} ({column_list})")
+                    created.append({"table": table_name, "columns": columns})
+                except sqlite3.Error as e:
+                    logging.warning(f"Could not create index on {table_name}({column_list}) in {db_file_path}: {e}")
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, indexed_file_path)
+    return created
+
+
+def timed_execute(db_file_path, sql, timeout):
+    """Execute sql and return (rows, seconds, error); the query is interrupted after timeout seconds."""
+    conn = sqlite3.connect(db_file_path)
+    start_time = time.time()
+    deadline = start_time + timeout
+    conn.set_progress_handler(lambda: 1 if time.time() > deadline else 0, 10000)
+    try:
+        rows = conn.execute(sql).fetchall()
+        return rows, time.time() - start_time, ""
+    except sqlite3.Error as e:
+        error = "timeout" if time.time() > deadline else str(e)
+        return None, time.time() - start_time, error
+    finally:
+        conn.close()
+
+
+def normalize_row(row):
+    # aggregates over floats may be summed in a different order once an index changes the plan
+    return tuple(float(f"{v:.10g}") if isinstance(v, float) else v for v in row)
+
+
+def same_result_set(rows_a, rows_b):
+    """Order-insensitive comparison: both results must contain the same rows with the same multiplicity."""
+    return Counter(map(normalize_row, rows_a)) == Counter(map(normalize_row, rows_b))
+
+
+def measure_speedups(db_file_path, indexed_file_path, queries, timeout):
+    """Run every query on the original and on the indexed copy, returning per-query timings and equivalence."""
+    reports = []
+    for query_key, sql in queries:
+        original_rows, original_time, original_error = timed_execute(db_file_path, sql, timeout)
+        indexed_rows, indexed_time, indexed_error = timed_execute(indexed_file_path, sql, timeout)
+        report = {
+            "query_key": query_key,
+            "original_time": original_time,
+            "indexed_time": indexed_time,
+            "speedup": original_time / indexed_time if indexed_time > 0 else None,
+            "original_error": original_error,
+            "indexed_error": indexed_error,
+        }
+        if original_rows is not None and indexed_rows is not None:
+            report["equivalent"] = same_result_set(original_rows, indexed_rows)
+            if not report["equivalent"]:
+                logging.warning(f"Result mismatch between original and indexed database for {query_key}: {sql}")
+        reports.append(report)
+    return reports
+
+
+def advise_database(db_id, db_file_path, indexed_file_path, queries, args):
+    conn = sqlite3.connect(db_file_path)
+    try:
+        recommendations = recommend_indexes(
+            conn, [sql for _, sql in queries],
+            args.max_index_columns, args.max_indexes_per_table, args.min_support
+        )
+    finally:
+        conn.close()
+    if not recommendations:
+        # no copy is written, DatabaseManager falls back to the original database
+        if os.path.exists(indexed_file_path):
+            os.remove(indexed_file_path)
+        return {"db_id": db_id, "indexes": [], "queries": []}
+
+    created = build_indexed_database(db_file_path, indexed_file_path, recommendations)
+    query_reports = measure_speedups(db_file_path, indexed_file_path, queries, args.timeout) if args.measure else []
+    report = {"db_id": db_id, "indexes": created, "queries": query_reports}
+    if any(q.get("equivalent") is False for q in query_reports):
+        # never let DatabaseManager serve a copy that changes query results
+        report["quarantined"] = quarantine_indexed_database(indexed_file_path)
+    return report
+
+
+def quarantine_indexed_database(indexed_file_path):
+    """Move an indexed copy out of the path DatabaseManager looks up and return its new location."""
+    quarantined_path = f"{indexed_file_path}.quarantined"
+    os.replace(indexed_file_path, quarantined_path)
+    logging.error(f"Indexed copy {indexed_file_path} returned different results than the original; moved to {quarantined_path}.")
+    return quarantined_path
+
+
+def summarize(db_reports):
+    query_reports = [q for r in db_reports for q in r["queries"] if q["speedup"] and not q["original_error"]]
+    speedups = [q["speedup"] for q in query_reports]
+    return {
+        "databases_indexed": sum(1 for r in db_reports if r["indexes"]),
+        "indexes_created": sum(len(r["indexes"]) for r in db_reports),
+        "queries_measured": len(query_reports),
+        "median_speedup": statistics.median(speedups) if speedups else None,
+        "queries_faster_2x": sum(1 for s in speedups if s >= 2.0),
+        "queries_slower": sum(1 for s in speedups if s < 0.9),
+        "result_mismatches": sum(1 for r in db_reports for q in r["queries"] if q.get("equivalent") is False),
+        "databases_quarantined": sum(1 for r in db_reports if r.get("quarantined")),
+        "original_total_time": sum(q["original_time"] for q in query_reports),
+        "indexed_total_time": sum(q["indexed_time"] for q in query_reports),
+    }
+
+
+def main(args):
+    queries = load_queries(args.json_dataset, args.sql_results_dir)
+    queries_by_db = defaultdict(list)
+    for query_key, db_id, sql in queries:
+        if isinstance(sql, str) and sql.strip():
+            queries_by_db[db_id].append((query_key, sql))
+    logging.info(f"Loaded {len(queries)} queries over {len(queries_by_db)} databases.")
+
+    def run(db_id):
+        db_file_path = os.path.join(args.db_dir, db_id, f"{db_id}.sqlite")
+        if not os.path.isfile(db_file_path):
+            logging.warning(f"Database file {db_file_path} not found. Skipping...")
+            return {"db_id": db_id, "indexes": [], "queries": []}
+        indexed_file_path = os.path.join(args.output_dir, db_id, f"{db_id}.sqlite")
+        try:
+            return advise_database(db_id, db_file_path, indexed_file_path, queries_by_db[db_id], args)
+        except (sqlite3.Error, OSError) as e:
+            logging.error(f"Failed to build indexed database for {db_id}: {e}")
+            return {"db_id": db_id, "indexes": [], "queries": []}
+
+    with ThreadPoolExecutor(max_workers=args.num_workers) as executor:
+        db_reports = list(tqdm(executor.map(run, sorted(queries_by_db)), total=len(queries_by_db), desc="Building indexed databases"))
+
+    summary = summarize(db_reports)
+    os.makedirs(args.output_dir, exist_ok=True)
+    report_path = os.path.join(args.output_dir, "index_report.json")
+    with open(report_path, 'w', encoding='utf-8') as f:
+        json.dump({"summary": summary, "databases": db_reports}, f, indent=2, ensure_ascii=False)
+    logging.info(f"Index advisor summary: {summary}")
+    logging.info(f"Per-query report written to {report_path}")
+    if summary["databases_quarantined"]:
+        logging.error(f"{summary['databases_quarantined']} indexed copies were quarantined because of result mismatches.")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mine query predicates and build copies of the databases with recommended covering indexes.")
+    parser.add_argument("--db_dir", required=True, help="Directory containing the {db_id}/{db_id}.sqlite files.")
+    parser.add_argument("--output_dir", required=True, help="Directory to write the indexed copies to (same layout).")
+    parser.add_argument("--json_dataset", default=None, help="Dataset json with gold SQL and db_id (e.g. BIRD dev.json).")
+    parser.add_argument("--sql_results_dir", default=None, help="Pipeline sql_results directory; gold and all candidate .sql files are mined.")
+    parser.add_argument("--max_index_columns", type=int, default=6, help="Widest index created when making it covering.")
+    parser.add_argument("--max_indexes_per_table", type=int, default=3, help="Maximum number of new indexes per table.")
+    parser.add_argument("--min_support", type=int, default=1, help="Minimum number of queries that must benefit from an index.")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Timeout (seconds) of each query when measuring speedups.")
+    parser.add_argument("--num_workers", type=int, default=4, help="Number of databases processed in parallel.")
+    parser.add_argument("--no_measure", dest="measure", action="store_false", help="Skip measuring per-query speedups.")
+    args = parser.parse_args()
+
+    if not args.json_dataset and not args.sql_results_dir:
+        parser.error("at least one of --json_dataset and --sql_results_dir is required")
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    main(args)
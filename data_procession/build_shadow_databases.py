@@ -0,0 +1,175 @@
+import os
+import math
+import logging
+import sqlite3
+import argparse
+from tqdm import tqdm
+
+
+def quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def get_user_objects(conn, schema, object_type):
+    return conn.execute(
+        f"SELECT name, sql FROM {schema}.sqlite_master WHERE type = ? AND name NOT LIKE 'sqlite_%' AND sql IS NOT NULL",
+        (object_type,)
+    ).fetchall()
+
+
+def get_column_names(conn, schema, table_name):
+    return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({quote_identifier(table_name)})")]
+
+
+def get_primary_key_columns(conn, schema, table_name):
+    rows = conn.execute(f"PRAGMA {schema}.table_info({quote_identifier(table_name)})").fetchall()
+    return [row[1] for row in sorted(rows, key=lambda r: r[5]) if row[5] > 0]
+
+
+def has_rowid(conn, table_name):
+    try:
+        conn.execute(f"SELECT rowid FROM src.{quote_identifier(table_name)} LIMIT 0")
+        return True
+    except sqlite3.Error:
+        return False
+
+
+def copy_rows(conn, table_name, where_clause, params=(), limit=None):
+    """
+    Copy matching rows of src.table into main.table, keeping rowids and skipping rows already copied.
+    At most limit rows are copied when limit is given.
+    """
+    table = quote_identifier(table_name)
+    columns = ", ".join(quote_identifier(c) for c in get_column_names(conn, "src", table_name))
+    if has_rowid(conn, table_name):
+        sql = (
+            f"INSERT INTO main.{table} (rowid, {columns}) "
+            f"SELECT rowid, {columns} FROM src.{table} "
+            f"WHERE ({where_clause}) AND rowid NOT IN (SELECT rowid FROM main.{table})"
+        )
+    else:
+        sql = f"INSERT OR IGNORE INTO main.{table} ({columns}) SELECT {columns} FROM src.{table} WHERE ({where_clause})"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params = tuple(params) + (int(limit),)
+    return conn.execute(sql, params).rowcount
+
+
+def sample_table(conn, table_name, max_rows):
+    """
+    Stratified sample over the rowid space: the table is cut into max_rows equal rowid strata
+    and the first row of every stratum is kept, so the sample spans old and new rows alike.
+    """
+    table = quote_identifier(table_name)
+    if not has_rowid(conn, table_name):
+        return copy_rows(conn, table_name, "1 = 1", limit=max_rows)
+
+    min_rowid, max_rowid = conn.execute(f"SELECT min(rowid), max(rowid) FROM src.{table}").fetchone()
+    if min_rowid is None:
+        return 0
+    stride = max(1, math.ceil((max_rowid - min_rowid + 1) / max_rows))
+    if stride == 1:
+        return copy_rows(conn, table_name, "1 = 1")
+    return copy_rows(
+        conn, table_name,
+        f"rowid IN (SELECT min(rowid) FROM src.{table} GROUP BY (rowid - ?) / ?)",
+        (min_rowid, stride)
+    )
+
+
+def close_foreign_keys(conn, table_names, max_passes=10):
+    """Add every parent row referenced by a sampled child row, until no foreign key adds new rows."""
+    foreign_keys = []
+    for table_name in table_names:
+        groups = {}
+        for fk in conn.execute(f"PRAGMA src.foreign_key_list({quote_identifier(table_name)})"):
+            fk_id, _, parent_table, from_col, to_col = fk[:5]
+            groups.setdefault((fk_id, parent_table), []).append((from_col, to_col))
+        for (_, parent_table), pairs in groups.items():
+            if parent_table.lower() not in {t.lower() for t in table_names}:
+                continue
+            parent_table = next(t for t in table_names if t.lower() == parent_table.lower())
+            to_cols = [to_col for _, to_col in pairs]
+            if any(to_col is None for to_col in to_cols):
+                to_cols = get_primary_key_columns(conn, "src", parent_table)
+            if len(to_cols) != len(pairs):
+                continue
+            foreign_keys.append((table_name, [from_col for from_col, _ in pairs], parent_table, to_cols))
+
+    for _ in range(max_passes):
+        added = 0
+        for child_table, from_cols, parent_table, to_cols in foreign_keys:
+            child_cols = ", ".join(quote_identifier(c) for c in from_cols)
+            parent_cols = ", ".join(quote_identifier(c) for c in to_cols)
+            try:
+                added += copy_rows(
+                    conn, parent_table,
+                    f"({parent_cols}) IN (SELECT {child_cols} FROM main.{quote_identifier(child_table)})"
+                )
+            except sqlite3.Error as e:
+                logging.warning(f"Skipping foreign key {child_table}({child_cols}) -> {parent_table}({parent_cols}): {e}")
+        if added == 0:
+            break
+
+
+def build_shadow_database(db_file_path, shadow_file_path, max_rows_per_table=1000):
+    """Build a small copy of db_file_path with the same schema and a sampled, foreign-key-closed subset of rows."""
+    os.makedirs(os.path.dirname(shadow_file_path), exist_ok=True)
+    tmp_path = f"{shadow_file_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute("ATTACH DATABASE ? AS src", (db_file_path,))
+        tables = get_user_objects(conn, "src", "table")
+        for _, sql in tables:
+            conn.execute(sql)
+        table_names = [name for name, _ in tables]
+        for table_name in table_names:
+            try:
+                sample_table(conn, table_name, max_rows_per_table)
+            except sqlite3.Error as e:
+                logging.warning(f"Could not sample table {table_name} of {db_file_path}: {e}")
+        close_foreign_keys(conn, table_names)
+        for object_type in ("index", "view"):
+            for name, sql in get_user_objects(conn, "src", object_type):
+                try:
+                    conn.execute(sql)
+                except sqlite3.Error as e:
+                    logging.warning(f"Could not create {object_type} {name} in shadow of {db_file_path}: {e}")
+        conn.commit()
+        conn.execute("DETACH DATABASE src")
+    finally:
+        conn.close()
+    os.replace(tmp_path, shadow_file_path)
+
+
+def build_shadow_databases(db_dir, shadow_dir, max_rows_per_table=1000, overwrite=False):
+    """Build a shadow copy for every {db_id}/{db_id}.sqlite under db_dir into shadow_dir with the same layout."""
+    db_ids = sorted(d for d in os.listdir(db_dir) if not d.startswith('.'))
+    for db_id in tqdm(db_ids, desc="Building shadow databases"):
+        db_file_path = os.path.join(db_dir, db_id, f"{db_id}.sqlite")
+        if not os.path.isfile(db_file_path):
+            continue
+        shadow_file_path = os.path.join(shadow_dir, db_id, f"{db_id}.sqlite")
+        if not overwrite and os.path.exists(shadow_file_path) \
+                and os.path.getmtime(shadow_file_path) >= os.path.getmtime(db_file_path):
+            logging.info(f"Shadow database for {db_id} is up to date. Skipping...")
+            continue
+        try:
+            build_shadow_database(db_file_path, shadow_file_path, max_rows_per_table)
+        except sqlite3.Error as e:
+            logging.error(f"Failed to build shadow database for {db_id}: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build small sampled shadow copies of the databases for fast SQL validation.")
+    parser.add_argument("--db_dir", required=True, help="Directory containing the {db_id}/{db_id}.sqlite files.")
+    parser.add_argument("--shadow_dir", required=True, help="Directory to write the shadow databases to (same layout).")
+    parser.add_argument("--max_rows_per_table", type=int, default=1000, help="Number of rowid strata sampled per table before foreign-key closure.")
+    parser.add_argument("--overwrite", action="store_true", help="Rebuild shadow databases even if they are newer than the source.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    build_shadow_databases(args.db_dir, args.shadow_dir, args.max_rows_per_table, args.overwrite)
@@ -5,11 +5,13 @@ import logging
 import json
 from tqdm import tqdm
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
-def generate_db_desc(bird_dir, db_dir, output_dir):
+def generate_db_desc(bird_dir, db_dir, output_dir, num_workers=8):
     """
     Traverse all directories under bird_dir/db_dir and read the .csv files
     in the database_description folder using pandas.
+    Tables of one database are profiled in parallel, each worker with its own connection.
     """
     # Traverse all directories under bird_dir/db_dir
     subdirs = [d for d in os.listdir(os.path.join(bird_dir, db_dir)) if not d.startswith('.')]
@@ -22,35 +24,33 @@ def generate_db_desc(bird_dir, db_dir, output_dir):
 
         db_schema = {}
         db_desc_dir = os.path.join(bird_dir, db_dir, subdir, 'database_description')
-        conn = sqlite3.connect(os.path.join(bird_dir, db_dir, subdir, f'{subdir}.sqlite'))
-        for filename in os.listdir(db_desc_dir):
-            if not filename.endswith('.csv'):
-                continue
-            table_name = filename[: -4]
-            logging.info(f"Processing file: {filename}")
-            csv_path = os.path.join(db_desc_dir, filename)
-            with open(csv_path, 'rb') as f:
-                result = chardet.detect(f.read())
-            table_df = pd.read_csv(csv_path, encoding=result['encoding'])
-            
-            table_schema = get_table_schema(conn, table_name, table_df)
-            db_schema[quote_field(table_name)] = table_schema
+        db_path = os.path.join(bird_dir, db_dir, subdir, f'{subdir}.sqlite')
+        filenames = [filename for filename in os.listdir(db_desc_dir) if filename.endswith('.csv')]
+        with ThreadPoolExecutor(max_workers=max(1, num_workers)) as executor:
+            table_schemas = executor.map(lambda filename: describe_table(db_path, db_desc_dir, filename), filenames)
+            for filename, table_schema in zip(filenames, table_schemas):
+                db_schema[quote_field(filename[: -4])] = table_schema
         with open(schema_file_path, "w") as f:
             json.dump(db_schema, f, indent=4)
+
+def describe_table(db_path, db_desc_dir, filename):
+    table_name = filename[: -4]
+    logging.info(f"Processing file: {filename}")
+    csv_path = os.path.join(db_desc_dir, filename)
+    with open(csv_path, 'rb') as f:
+        result = chardet.detect(f.read())
+    table_df = pd.read_csv(csv_path, encoding=result['encoding'])
+
+    conn = sqlite3.connect(db_path)
+    try:
+        return get_table_schema(conn, table_name, table_df)
+    finally:
         conn.close()
-                
+
 def get_table_schema(conn, table_name, table_df):
     # print("table_name:", table_name)
     cursor = conn.cursor()
-    df = pd.read_sql_query(f"SELECT * FROM `{table_name}`", conn)
-    contains_null = {
-        column: df[column].isnull().any()
-        for column in df.columns
-    }
-    contains_duplicates = {
-        column: df[column].duplicated().any()
-        for column in df.columns
-    }
+    _, contains_null, contains_duplicates = profile_table(conn, table_name)
     dic = {}
     for _, row in table_df.iterrows():
         try:
@@ -128,6 +128,41 @@ def get_table_schema(conn, table_name, table_df):
 
     return table_schema
 
+# Columns profiled per aggregate query; keeps the result row well below SQLite's column limit
+PROFILE_COLUMNS_PER_QUERY = 256
+
+def profile_table(conn, table_name):
+    """
+    Compute the NOT NULL / UNIQUE hints with SQL aggregates instead of loading the table.
+    SQLite streams the rows (COUNT(DISTINCT) spills to temp storage), so memory stays constant.
+    Same semantics as pandas isnull().any() / duplicated().any(): two NULLs count as a duplicate,
+    and values are compared with BINARY collation regardless of the column collation.
+    Returns (row_count, {column: contains_null}, {column: contains_duplicates}).
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"PRAGMA table_info({quote_identifier(table_name)})")
+    column_names = [column[1].strip() for column in cursor.fetchall()]
+    row_count = 0
+    contains_null, contains_duplicates = {}, {}
+    for start in range(0, max(len(column_names), 1), PROFILE_COLUMNS_PER_QUERY):
+        chunk = column_names[start: start + PROFILE_COLUMNS_PER_QUERY]
+        aggregates = ["COUNT(*)"]
+        for column in chunk:
+            aggregates.append(f"COUNT({quote_identifier(column)})")
+            aggregates.append(f"COUNT(DISTINCT {quote_identifier(column)} COLLATE BINARY)")
+        cursor.execute(f"SELECT {', '.join(aggregates)} FROM {quote_identifier(table_name)}")
+        row = cursor.fetchone()
+        row_count = row[0]
+        for i, column in enumerate(chunk):
+            non_null, distinct = row[1 + 2 * i], row[2 + 2 * i]
+            contains_null[column] = non_null < row_count
+            contains_duplicates[column] = distinct < non_null or row_count - non_null > 1
+    cursor.close()
+    return row_count, contains_null, contains_duplicates
+
+def quote_identifier(name):
+    return '"' + name.replace('"', '""') + '"'
+
 def get_foreign_key_stmt(foreign_keys):
     foreign_key_groups = defaultdict(list)
     for foreign_key in foreign_keys:
@@ -169,6 +204,7 @@ if __name__ == "__main__":
     parser.add_argument('--bird_dir', type=str, required=True, help='Root directory for the BIRD dataset.')
     parser.add_argument('--db_dir_suffix', type=str, required=True, help='Suffix for the database directory (e.g., "dev/dev_databases").')
     parser.add_argument('--output_dir', type=str, required=True, help='The path of output directory for schema files.')
+    parser.add_argument('--num_workers', type=int, default=8, help='Number of tables profiled in parallel per database.')
     args = parser.parse_args()
     
     logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -177,5 +213,6 @@ if __name__ == "__main__":
     generate_db_desc(
         bird_dir=args.bird_dir, 
         db_dir=args.db_dir_suffix,
-        output_dir=args.output_dir
+        output_dir=args.output_dir,
+        num_workers=args.num_workers
     )
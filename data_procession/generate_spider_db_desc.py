@@ -1,17 +1,18 @@
 import os
-import pandas as pd
 import re, sqlite3, json
 import logging
 from tqdm import tqdm
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def generate_db_desc(spider_dir, db_dir, output_dir):
+def generate_db_desc(spider_dir, db_dir, output_dir, num_workers=8):
     """
     遍历 Spider 数据集下的所有数据库，并生成数据库的 schema JSON 文件。
     由于 Spider 数据集没有表描述的 CSV 文件，列描述将为空。
+    同一数据库的各表并行统计，每个线程使用独立的数据库连接。
     """
     # 确保输出目录存在
     os.makedirs(output_dir, exist_ok=True)
@@ -42,10 +43,10 @@ def generate_db_desc(spider_dir, db_dir, output_dir):
             cursor.execute("SELECT name FROM sqlite_master WHERE type='table';")
             table_names = [row[0] for row in cursor.fetchall()]
 
-            for table_name in table_names:
-                logging.info(f"Processing table: {table_name} in database: {db_name}")
-                table_schema = get_table_schema(conn, table_name)
-                db_schema[quote_field(table_name)] = table_schema
+            with ThreadPoolExecutor(max_workers=max(1, num_workers)) as executor:
+                table_schemas = executor.map(lambda table_name: describe_table(db_path, db_name, table_name), table_names)
+                for table_name, table_schema in zip(table_names, table_schemas):
+                    db_schema[quote_field(table_name)] = table_schema
             
             with open(schema_file_path, "w", encoding='utf-8') as f:
                 json.dump(db_schema, f, indent=4, ensure_ascii=False)
@@ -59,6 +60,15 @@ def generate_db_desc(spider_dir, db_dir, output_dir):
             if conn:
                 conn.close()
 
+def describe_table(db_path, db_name, table_name):
+    """在独立的连接上生成单张表的 schema，供线程池并行调用"""
+    logging.info(f"Processing table: {table_name} in database: {db_name}")
+    conn = sqlite3.connect(db_path)
+    try:
+        return get_table_schema(conn, table_name)
+    finally:
+        conn.close()
+
 def get_table_schema(conn, table_name):
     """
     从 SQLite 数据库中获取表的 schema 信息，包括列类型、主键、外键等。
@@ -66,26 +76,14 @@ def get_table_schema(conn, table_name):
     """
     cursor = conn.cursor()
     
-    # 尝试读取表数据以获取空值和重复值信息，以及示例值
-    df = None
-    try:
-        df = pd.read_sql_query(f"SELECT * FROM `{table_name}`", conn)
-    except Exception as e: # 捕获更广泛的异常，包括 UnicodeDecodeError
-        logging.warning(f"Could not read data from table `{table_name}` due to: {e}. Skipping data-dependent features.")
-        df = pd.DataFrame() # 创建一个空DataFrame以避免后续错误
-
+    # 用聚合查询获取空值和重复值信息，不把整张表读入内存
+    row_count = 0
     contains_null = {}
     contains_duplicates = {}
-
-    if not df.empty: # 仅当 DataFrame 不为空时才处理数据相关特性
-        contains_null = {
-            column: df[column].isnull().any()
-            for column in df.columns
-        }
-        contains_duplicates = {
-            column: df[column].duplicated().any()
-            for column in df.columns
-        }
+    try:
+        row_count, contains_null, contains_duplicates = profile_table(conn, table_name)
+    except sqlite3.Error as e:
+        logging.warning(f"Could not profile table `{table_name}` due to: {e}. Skipping data-dependent features.")
 
     # 获取列信息
     cursor.execute(f"PRAGMA table_info(`{table_name}`)")
@@ -114,8 +112,8 @@ def get_table_schema(conn, table_name):
         
         tmp_col = column_name.strip()
 
-        # 添加空值和重复值信息，仅当 DataFrame 不为空时
-        if not df.empty:
+        # 添加空值和重复值信息，仅当表不为空时
+        if row_count:
             if not contains_null[tmp_col]: # If it does not include Null, it's NOT NULL
                 constraints.append("NOT NULL")
             if not contains_duplicates[tmp_col]: # If it does not include duplicates, it's UNIQUE
@@ -142,6 +140,41 @@ def get_table_schema(conn, table_name):
     cursor.close()
     return table_schema
 
+# 每条聚合查询统计的列数，避免结果列数超过 SQLite 的上限
+PROFILE_COLUMNS_PER_QUERY = 256
+
+def profile_table(conn, table_name):
+    """
+    用 SQL 聚合（COUNT(*)、COUNT(列)、COUNT(DISTINCT 列)）统计 NOT NULL / UNIQUE 提示，不把整张表读入 pandas。
+    SQLite 流式扫描表（COUNT(DISTINCT) 使用临时存储），内存占用与表大小无关。
+    与 pandas 的 isnull().any() / duplicated().any() 语义一致：两个 NULL 视为重复，比较时统一使用 BINARY 排序规则。
+    返回 (行数, {列名: 是否含空值}, {列名: 是否含重复值})。
+    """
+    cursor = conn.cursor()
+    cursor.execute(f"PRAGMA table_info({quote_identifier(table_name)})")
+    column_names = [column[1].strip() for column in cursor.fetchall()]
+    row_count = 0
+    contains_null, contains_duplicates = {}, {}
+    for start in range(0, max(len(column_names), 1), PROFILE_COLUMNS_PER_QUERY):
+        chunk = column_names[start: start + PROFILE_COLUMNS_PER_QUERY]
+        aggregates = ["COUNT(*)"]
+        for column in chunk:
+            aggregates.append(f"COUNT({quote_identifier(column)})")
+            aggregates.append(f"COUNT(DISTINCT {quote_identifier(column)} COLLATE BINARY)")
+        cursor.execute(f"SELECT {', '.join(aggregates)} FROM {quote_identifier(table_name)}")
+        row = cursor.fetchone()
+        row_count = row[0]
+        for i, column in enumerate(chunk):
+            non_null, distinct = row[1 + 2 * i], row[2 + 2 * i]
+            contains_null[column] = non_null < row_count
+            contains_duplicates[column] = distinct < non_null or row_count - non_null > 1
+    cursor.close()
+    return row_count, contains_null, contains_duplicates
+
+def quote_identifier(name):
+    """用双引号引用 SQL 标识符"""
+    return '"' + name.replace('"', '""') + '"'
+
 def get_foreign_key_stmt(foreign_keys):
     """
     根据外键信息生成 SQL 风格的外键语句。
@@ -189,6 +222,7 @@ if __name__ == "__main__":
     parser.add_argument('--spider_dir', type=str, required=True, help='Root directory for the Spider dataset.')
     parser.add_argument('--db_dir_suffix', type=str, required=True, help='Suffix for the database directory (e.g., "database").')
     parser.add_argument('--output_dir', type=str, required=True, help='The path of output directory for schema files.')
+    parser.add_argument('--num_workers', type=int, default=8, help='Number of tables profiled in parallel per database.')
     args = parser.parse_args()
     
     logging.info(f"Starting to generate database descriptions for Spider dataset.")
@@ -199,6 +233,7 @@ if __name__ == "__main__":
     generate_db_desc(
         spider_dir=args.spider_dir, 
         db_dir=args.db_dir_suffix,
-        output_dir=args.output_dir
+        output_dir=args.output_dir,
+        num_workers=args.num_workers
     )
     logging.info("Finished generating database descriptions for Spider dataset.")
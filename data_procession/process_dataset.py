@@ -9,8 +9,9 @@ import argparse
 from tqdm import tqdm
 from sql_metadata import Parser
 from sql_regularizator import format_and_lowercase_sql_query
-from pyserini.search.lucene import LuceneSearcher
-from value_retriever import build_index_for_dataset, retrieve_relevant_hits, retrieve_question_related_db_values, obtain_n_grams
+from pipeline.utils.schema_catalog import get_schema_catalog
+from pipeline.utils.example_store import ExampleStore, EXAMPLE_STORE_FILENAME
+from value_retriever import build_index_for_dataset, SearcherPool, QueryHitCache, retrieve_question_related_db_values, obtain_n_grams
 
 # --- 配置日志 ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -54,25 +55,31 @@ def quote_field(field_name):
 
 
 def extract_tables(db_schema_dir, db_id, query):
-    with open(os.path.join(db_schema_dir, f"{db_id}_schema.json"), "r") as f:
-        schema = json.load(f)
+    schema_tables = get_schema_catalog(os.path.join(db_schema_dir, f"{db_id}_schema.json")).tables
     tables = [quote_field(t) for t in Parser(query).tables]
     correct_tables = []
     for table in tables:
-        if table in schema.keys():
+        if table in schema_tables:
             correct_tables.append(table)
     return correct_tables
 
 
 def clean_existing_examples(db_schema_dir):
     """
-    遍历指定目录下的所有 _schema.json 文件，并移除其中已存在的 'examples' 字段。
+    清空旁路 Example 存储；并遍历指定目录下的所有 _schema.json 文件，移除旧版本写入的 'examples' 字段。
+    只有仍含 'examples' 的文件会被重写，迁移完成后不再改动 schema 文件。
     """
     logging.info(f"Cleaning up existing 'examples' fields from schema files in {db_schema_dir}...")
     if not os.path.isdir(db_schema_dir):
         logging.warning(f"Schema directory not found: {db_schema_dir}. Skipping cleanup.")
         return
 
+    store_path = os.path.join(db_schema_dir, EXAMPLE_STORE_FILENAME)
+    if os.path.exists(store_path):
+        store = ExampleStore(store_path)
+        store.clear()
+        store.close()
+
     for filename in tqdm(os.listdir(db_schema_dir), desc="Cleaning schema files"):
         if filename.endswith("_schema.json"):
             schema_path = os.path.join(db_schema_dir, filename)
@@ -97,106 +104,21 @@ def clean_existing_examples(db_schema_dir):
                 logging.error(f"Could not process or clean file {schema_path}: {e}")
 
 
-def update_schema_files(db_schema_dir, aggregated_examples):
-    """
-    将聚合在内存中的 example 数据更新到对应的 schema JSON 文件中。
-    """
-    logging.info("Updating schema files with aggregated example values...")
-    if not aggregated_examples:
-        logging.warning("`aggregated_examples` is empty. No schema files will be updated.")
-        return
-
-    for db_id, db_examples in tqdm(aggregated_examples.items(), desc="Writing examples to schema files"):
-        schema_path = os.path.join(db_schema_dir, f"{db_id}_schema.json")
-        if not os.path.exists(schema_path):
-            logging.warning(f"Schema file not found for db_id: {db_id}. Skipping.")
-            continue
-
-        try:
-            with open(schema_path, 'r', encoding='utf-8') as f:
-                schema_data = json.load(f)
-        except (json.JSONDecodeError, IOError) as e:
-            logging.error(f"Failed to read schema file {schema_path}: {e}")
-            continue
-
-        file_was_modified = False
-        for table_name, table_examples in db_examples.items():
-            if table_name in schema_data:
-                for column_name, column_examples in table_examples.items():
-                    if column_name in schema_data[table_name] and isinstance(schema_data[table_name][column_name], dict):
-                        # MODIFICATION: The .update() method still works perfectly here.
-                        # It will add or overwrite the 'examples' key in the column dictionary.
-                        schema_data[table_name][column_name].update(column_examples)
-                        file_was_modified = True
-
-        if file_was_modified:
-            try:
-                with open(schema_path, 'w', encoding='utf-8') as f:
-                    json.dump(schema_data, f, indent=4, ensure_ascii=False)
-            except IOError as e:
-                logging.error(f"Failed to write updated schema to {schema_path}: {e}")
-
-
-def build_database_schema(db_schema_dir, db_id, question_id, correct_tables=None):
+def build_database_schema(db_schema_dir, db_id, question_id, correct_tables=None, example_store=None):
     """
     构建数据库的 schema 字符串表示。
-    如果提供了 question_id，则只包含该问题相关的 example。
+    如果提供了 question_id，则只包含该问题相关的 example（从 example_store 中读取）。
+    各表片段由 SchemaCatalog 按数据库渲染一次并缓存，这里只做拼接。
     """
     schema_path = os.path.join(db_schema_dir, f"{db_id}_schema.json")
     if not os.path.exists(schema_path):
         return ""
-    
-    with open(schema_path, 'r', encoding='utf-8') as f:
-        schema_data = json.load(f)
-
-    create_statements = []
-    for table_name, table_info in schema_data.items():
-        if correct_tables and table_name not in correct_tables:
-            continue
-        columns = []
-        for column_name, column_info in table_info.items():
-            if column_name == "<<key_info>>":
-                continue
-            column_type = column_info["type"]
-            column_desc = column_info["description"]
-            column_constraints = " ".join(column_info.get("constraints", []))
-            column_details = column_info["details"]
-            
-            column_def_base = f"{column_name} {column_type} {column_constraints},"
-            
-            comment_parts = []
-            if column_desc or column_details:
-                comment_parts.append(f"{column_desc}{column_details}")
-            
-            example_part = ""
-            if 'examples' in column_info and isinstance(column_info['examples'], list):
-                found_example = next((ex for ex in column_info['examples'] if ex.get('question_id') == str(question_id)), None)
-                if found_example and 'values' in found_example:
-                    example_values = found_example['values']
-                    example_part = f"Example: {str(example_values)}"
-            
-            final_comment = ""
-            if comment_parts:
-                final_comment += f" -- {''.join(comment_parts)}"
-            if example_part:
-                final_comment += f" {example_part}" if final_comment else f" -- {example_part}" # Add comma if there's already a comment
-            
-            column_def = f"{column_def_base}{final_comment}"
-            columns.append(column_def.strip())
-
-        key_info = table_info.get("<<key_info>>", "")
-        col_info = '\n    '.join(columns)
-        create_statement = f"""CREATE TABLE {table_name} (
-    {col_info}
-    {key_info}
-);"""
-        
-        create_statements.append(create_statement)
-
-    return "\n\n".join(create_statements)
+    examples = example_store.get(db_id, question_id) if example_store is not None else None
+    return get_schema_catalog(schema_path).render(correct_tables or None, question_id, examples)
 
 
-def process_dataset(json_dataset, db_dir, db_schema_dir, output_dir, db_content_index_path):
+def process_dataset(json_dataset, db_dir, db_schema_dir, output_dir, db_content_index_path, index_workers=4, rebuild_index=False, index_backend="lucene",
+                    max_values_per_column=None, column_workers=4, searcher_pool_size=8):
     """
     主处理流程：聚合-写入-再读取。
     """
@@ -206,53 +128,59 @@ def process_dataset(json_dataset, db_dir, db_schema_dir, output_dir, db_content_
     build_index_for_dataset(
         dataset_name="bird",
         db_path=db_dir,
-        save_index_path=db_content_index_path
+        save_index_path=db_content_index_path,
+        num_workers=index_workers,
+        force=rebuild_index,
+        backend=index_backend,
+        max_values_per_column=max_values_per_column,
+        column_workers=column_workers
     )
-    logging.info("Loading Lucene searchers for all databases...")
-    db_id2searcher = {}
-    unique_db_ids = df["db_id"].unique()
-    for db_id in tqdm(unique_db_ids, desc="Loading searchers"):
-        index_path = os.path.join(db_content_index_path, db_id)
-        if os.path.exists(index_path):
-            db_id2searcher[db_id] = LuceneSearcher(index_path)
-
-    aggregated_examples = {}
+    # 检索器按需打开并以 LRU 方式限制同时打开的数量；下面按 db_id 分组遍历问题，每个数据库只需打开一次
+    searcher_pool = SearcherPool(db_content_index_path, index_backend, searcher_pool_size)
+
+    example_store = ExampleStore(os.path.join(db_schema_dir, EXAMPLE_STORE_FILENAME))
+    example_rows = []
     processed_dataset_temp = []
     error_count = 0
     has_question_id = "question_id" in df.columns
 
-    for index, row in tqdm(df.iterrows(), total=len(df), desc="Phase 1: Aggregating examples"):
-        db_id = row["db_id"]
-        question_id = row["question_id"] if has_question_id else index
-        
-        searcher = db_id2searcher.get(db_id)
-        if searcher:
-            full_question = f"{row['question']}\n{row.get('evidence', '')}".strip()
-            search_queries = list(set(obtain_n_grams(full_question, 8) + [full_question]))
-            query2hits = retrieve_relevant_hits(searcher, search_queries)
+    # 同一数据库的问题共享大量 n-gram：按数据库合并所有问题的查询，去重后一次性检索
+    hit_cache = QueryHitCache()
+    for db_id, db_rows in tqdm(df.groupby("db_id", sort=False), desc="Phase 1: Aggregating examples"):
+        searcher, vocabulary_filter = searcher_pool.get(db_id)
+        if not searcher:
+            continue
+        full_questions = [f"{row['question']}\n{row.get('evidence', '')}".strip() for _, row in db_rows.iterrows()]
+        queries_per_question = [list(set(obtain_n_grams(q, 8) + [q])) for q in full_questions]
+        query2hits_per_question = hit_cache.retrieve(searcher, db_id, queries_per_question, vocabulary_filter)
+
+        for index, full_question, query2hits in zip(db_rows.index, full_questions, query2hits_per_question):
+            question_id = db_rows.at[index, "question_id"] if has_question_id else index
             all_hits = list(itertools.chain.from_iterable(query2hits.values()))
             unique_hits = [dict(t) for t in {tuple(d.items()) for d in all_hits}]
             relevant_values = retrieve_question_related_db_values(unique_hits, full_question)
 
-            # MODIFICATION: Changed 'example' to 'examples' and data structure to a list of objects
             for full_column_name, values in relevant_values.items():
                 try:
                     table_name, column_name = full_column_name.split('.', 1)
-                    db_level = aggregated_examples.setdefault(db_id, {})
-                    table_level = db_level.setdefault(table_name, {})
-                    column_level = table_level.setdefault(column_name, {})
-                    
-                    # Get or create the list for 'examples'
-                    examples_list = column_level.setdefault('examples', [])
-                    
-                    # Append the new object to the list
-                    examples_list.append({
-                        "question_id": str(question_id),
-                        "values": values
-                    })
+                    example_rows.append((db_id, question_id, table_name, column_name, values))
                 except ValueError:
                     logging.warning(f"Could not parse '{full_column_name}'. Skipping for aggregation.")
-        
+        hit_cache.evict(db_id)
+
+    stats = hit_cache.stats()
+    logging.info(
+        f"Value retrieval: {stats['requested']} per-question searches, {stats['searched']} sent to the searcher, "
+        f"{stats['saved']} saved ({stats['saved_ratio']:.1%}); {stats['screened']} unique queries "
+        f"dropped by the vocabulary filter."
+    )
+    searcher_pool.close()
+    logging.info(f"Searcher pool: {searcher_pool.stats()}")
+
+    for index, row in tqdm(df.iterrows(), total=len(df), desc="Checking gold queries"):
+        db_id = row["db_id"]
+        question_id = row["question_id"] if has_question_id else index
+
         query = format_and_lowercase_sql_query(row["query"])
         is_error = not try_exec(db_dir, db_id, query)
         if is_error:
@@ -267,20 +195,22 @@ def process_dataset(json_dataset, db_dir, db_schema_dir, output_dir, db_content_
             "is_error": is_error,
         })
 
-    update_schema_files(db_schema_dir, aggregated_examples)
+    example_store.put_many(example_rows)
+    logging.info(f"Stored {len(example_rows)} column examples in {example_store.path}")
 
     final_dataset = []
-    logging.info("Phase 2: Building final dataset with updated schemas...")
+    logging.info("Phase 2: Building final dataset with question examples...")
     for data_row in tqdm(processed_dataset_temp, desc="Building final dataset rows"):
         db_id = data_row["db_id"]
         query = data_row["query"]
         question_id = data_row["question_id"]
         
         correct_tables = extract_tables(db_schema_dir, db_id, query)
-        data_row["database_schema"] = build_database_schema(db_schema_dir, db_id, question_id, None)
-        data_row["filtered_database_schema"] = build_database_schema(db_schema_dir, db_id, question_id, correct_tables)
+        data_row["database_schema"] = build_database_schema(db_schema_dir, db_id, question_id, None, example_store)
+        data_row["filtered_database_schema"] = build_database_schema(db_schema_dir, db_id, question_id, correct_tables, example_store)
         data_row["correct_tables"] = ", ".join(set(correct_tables))
         final_dataset.append(data_row)
+    example_store.close()
 
     logging.info(f"Processing complete. {error_count} queries failed to execute.")
     
@@ -298,6 +228,14 @@ def main():
     parser.add_argument("--db_schema_dir", required=True, help="Directory containing the _schema.json files.")
     parser.add_argument("--db_content_index_path", required=True, help="Path to save/load the Lucene content index.")
     parser.add_argument("--output_dir", required=True, help="Directory to save the final processed_dataset.csv.")
+    parser.add_argument("--index_workers", type=int, default=4, help="Number of databases whose content index is built concurrently.")
+    parser.add_argument("--rebuild_index", action="store_true", help="Rebuild every content index even if its database is unchanged.")
+    parser.add_argument("--index_backend", choices=["lucene", "fts5"], default="lucene",
+                        help="Content index backend: pyserini Lucene (needs a JVM) or an in-process SQLite FTS5 sidecar file.")
+    parser.add_argument("--max_values_per_column", type=int, default=0,
+                        help="Cap on the distinct values indexed per column (0 for no cap).")
+    parser.add_argument("--column_workers", type=int, default=4, help="Number of columns of one database extracted concurrently.")
+    parser.add_argument("--searcher_pool_size", type=int, default=8, help="Maximum number of content-index searchers kept open.")
     
     args = parser.parse_args()
 
@@ -308,7 +246,13 @@ def main():
         db_dir=args.db_dir,
         db_schema_dir=args.db_schema_dir,
         output_dir=args.output_dir,
-        db_content_index_path=args.db_content_index_path
+        db_content_index_path=args.db_content_index_path,
+        index_workers=args.index_workers,
+        rebuild_index=args.rebuild_index,
+        index_backend=args.index_backend,
+        max_values_per_column=args.max_values_per_column or None,
+        column_workers=args.column_workers,
+        searcher_pool_size=args.searcher_pool_size
     )
 
 
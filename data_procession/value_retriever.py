@@ -2,14 +2,30 @@ import json
 import shutil
 import sqlite3
 import os
+import sys
+import subprocess
+import threading
+import math
+import struct
+import hashlib
+import functools
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 import re
+import time
 import random
+import itertools
 from collections import OrderedDict
-from pyserini.search.lucene import LuceneSearcher
+try:
+    from pyserini.search.lucene import LuceneSearcher
+except ImportError:  # only the fts5 backend is available without pyserini / a JVM
+    LuceneSearcher = None
 from nltk.tokenize import word_tokenize
 from nltk import ngrams
+from nltk.stem import PorterStemmer
 from func_timeout import func_set_timeout, FunctionTimedOut
+from pipeline.utils.value_index import SubstringMatcher, FTS_INDEX_FILENAME
 
 SQL_RESERVED_WORDS = {'IDENTIFIED', 'FOREIGN', 'CONSTRAINT', 'USER', 'POSITION', 'DESCRIBE', 'CHECK', 'RECURSIVE',
                       'REAL', 'CONTINUE', 'GLOBAL', 'RLIKE', 'INSENSITIVE', 'BOOLEAN', 'CHAR', 'ROLE', 'CASE', 'SCHEMA',
@@ -36,6 +52,24 @@ SQL_RESERVED_WORDS = {'IDENTIFIED', 'FOREIGN', 'CONSTRAINT', 'USER', 'POSITION',
                       'SOME', 'SQLEXCEPTION', 'MAX', 'SUBSTRING', 'OF', 'AND', 'REPLACE', 'IS'}
 SPECIAL_CHARS_PATTERN = re.compile(r'[^a-zA-Z0-9_]')
 
+# Written next to each database's index; bump the version when the indexed contents change.
+INDEX_STAMP_FILENAME = "source_stamp.json"
+INDEX_STAMP_VERSION = 4
+
+# Only non-numeric string values up to this length are indexed; rows are streamed in batches of FETCH_SIZE.
+MAX_VALUE_LENGTH = 40
+FETCH_SIZE = 1000
+
+# Porter stemming over unicode61 approximates the English analyzer pyserini indexes with.
+FTS_TOKENIZER = "porter unicode61 remove_diacritics 2"
+FTS_TERM_PATTERN = re.compile(r'\w+')
+# token separators of the unicode61 tokenizer: everything except letters and digits
+FTS_SEPARATOR_PATTERN = re.compile(r'[\W_]+')
+
+VOCABULARY_FILTER_FILENAME = "vocabulary.bloom"
+VOCABULARY_FALSE_POSITIVE_RATE = 0.01
+_porter_stemmer = PorterStemmer(mode=PorterStemmer.ORIGINAL_ALGORITHM)
+
 def get_cursor_from_path(sqlite_path):
     try:
         if not os.path.exists(sqlite_path):
@@ -72,68 +106,413 @@ def is_number(s):
     except ValueError:
         return False
 
-def build_content_index(db_file_path: str, index_path: str):
+def list_table_columns(db_file_path: str):
+    """(table, column) pairs of every user table in the database."""
     cursor = get_cursor_from_path(db_file_path)
     results = execute_sql(cursor, "SELECT name FROM sqlite_master WHERE type='table';")
-    table_names = [result[0] for result in results]
+    table_names = [result[0] for result in results if result[0] != "sqlite_sequence"]
 
-    all_column_contents = []
+    columns = []
     for table_name in table_names:
-        if table_name == "sqlite_sequence":
-            continue
         results = execute_sql(cursor, f"SELECT name FROM PRAGMA_TABLE_INFO('{table_name}')")
-        column_names_in_one_table = [result[0] for result in results]
-        for column_name in column_names_in_one_table:
+        columns.extend((table_name, result[0]) for result in results)
+    cursor.connection.close()
+    return columns
+
+def iter_column_values(db_file_path: str, table_name: str, column_name: str, max_values_per_column: int = None,
+                       fetch_size: int = FETCH_SIZE):
+    """
+    Stream the distinct non-numeric string values (1-40 chars) of one column with fetchmany.
+    Type, length and all-digit values are filtered in SQL; is_number still rejects the remaining
+    numeric strings (decimals, exponents). max_values_per_column caps the distinct values read.
+    """
+    column = f"`{column_name}`"
+    sql = (
+        f"SELECT DISTINCT {column} FROM `{table_name}` "
+        f"WHERE typeof({column}) = 'text' AND length({column}) BETWEEN 1 AND {MAX_VALUE_LENGTH} "
+        f"AND ({column} NOT GLOB '[0-9]*' OR {column} GLOB '*[^0-9]*')"
+    )
+    if max_values_per_column:
+        sql += f" LIMIT {int(max_values_per_column)}"
+    print(sql + ";")
+
+    cursor = get_cursor_from_path(db_file_path)
+    try:
+        cursor.execute(sql)
+        while True:
+            rows = cursor.fetchmany(fetch_size)
+            if not rows:
+                break
+            for (value,) in rows:
+                if isinstance(value, str) and 0 < len(value) <= MAX_VALUE_LENGTH and not is_number(value):
+                    yield value
+    finally:
+        cursor.connection.close()
+
+def iter_column_documents(db_file_path: str, max_values_per_column: int = None):
+    """Sequentially stream the {"id", "contents"} documents of every column."""
+    for table_name, column_name in list_table_columns(db_file_path):
+        try:
+            for c_id, value in enumerate(iter_column_values(db_file_path, table_name, column_name, max_values_per_column)):
+                yield {"id": "{}-**-{}-**-{}".format(table_name, column_name, c_id), "contents": value}
+        except sqlite3.Error as e:
+            print(str(e))
+
+def write_column_documents(db_file_path: str, table_name: str, column_name: str, part_path: str,
+                           max_values_per_column: int = None):
+    """Write one column's documents as a JSONL part file; returns the number of documents."""
+    count = 0
+    with open(part_path, "w") as f:
+        for c_id, value in enumerate(iter_column_values(db_file_path, table_name, column_name, max_values_per_column)):
+            document = {"id": "{}-**-{}-**-{}".format(table_name, column_name, c_id), "contents": value}
+            f.write(json.dumps(document, ensure_ascii=True) + "\n")
+            count += 1
+    if count == 0:
+        os.remove(part_path)
+    return count
+
+def dump_column_contents(db_file_path: str, collection_dir: str, max_values_per_column: int = None, column_workers: int = 4):
+    """
+    Write the database's index documents as a streaming JSONL collection (one part file per column),
+    extracting columns in parallel, each on its own connection. Memory stays bounded by fetch_size
+    per worker instead of growing with the database. Returns the number of documents written.
+    """
+    os.makedirs(collection_dir, exist_ok=True)
+    columns = list_table_columns(db_file_path)
+    total = 0
+    with ThreadPoolExecutor(max_workers=max(1, column_workers)) as executor:
+        futures = [
+            executor.submit(write_column_documents, db_file_path, table_name, column_name,
+                            os.path.join(collection_dir, f"part-{i:05d}.jsonl"), max_values_per_column)
+            for i, (table_name, column_name) in enumerate(columns)
+        ]
+        for future in futures:
             try:
-                print(f"SELECT DISTINCT `{column_name}` FROM `{table_name}` WHERE `{column_name}` IS NOT NULL;")
-                results = execute_sql(cursor,
-                                      f"SELECT DISTINCT `{column_name}` FROM `{table_name}` WHERE `{column_name}` IS NOT NULL;")
-                column_contents = [result[0] for result in results if
-                                   isinstance(result[0], str) and not is_number(result[0])]
-
-                for c_id, column_content in enumerate(column_contents):
-                    if len(column_content) != 0 and len(column_content) <= 40:
-                        all_column_contents.append(
-                            {
-                                "id": "{}-**-{}-**-{}".format(table_name, column_name, c_id),
-                                "contents": column_content
-                            }
-                        )
+                total += future.result()
             except Exception as e:
                 print(str(e))
+    return total
+
+def iter_collection_documents(collection_dir: str):
+    """Stream the documents of a JSONL collection written by dump_column_contents."""
+    for filename in sorted(os.listdir(collection_dir)):
+        if filename.endswith(".jsonl"):
+            with open(os.path.join(collection_dir, filename), "r") as f:
+                for line in f:
+                    yield json.loads(line)
+
+def build_content_index(db_file_path: str, index_path: str, threads: int = 16, max_values_per_column: int = None,
+                        column_workers: int = 4):
+    """
+    Dump the distinct short string values of every column and index them with pyserini.
+    Returns True when the Lucene build subprocess succeeded.
+    """
+    temp_db_index_path = os.path.join(index_path, "temp_db_index")
+    dump_column_contents(db_file_path, temp_db_index_path, max_values_per_column, column_workers)
+    write_vocabulary_filter(iter_collection_documents(temp_db_index_path), index_path)
+
+    cmd = [
+        sys.executable, "-m", "pyserini.index.lucene", "--collection", "JsonCollection",
+        "--input", temp_db_index_path, "--index", index_path,
+        "--generator", "DefaultLuceneDocumentGenerator", "--threads", str(threads),
+        "--storePositions", "--storeDocvectors", "--storeRaw"
+    ]
+    d = subprocess.run(cmd).returncode
+    print(d)
+    shutil.rmtree(temp_db_index_path, ignore_errors=True)
+    return d == 0
 
+def build_fts_content_index(db_file_path: str, index_path: str, threads: int = 16, max_values_per_column: int = None,
+                            column_workers: int = 4):
+    """
+    Store the same documents as build_content_index in an FTS5 table of a sidecar SQLite file.
+    No JVM or subprocess is involved; threads is accepted for signature compatibility only.
+    """
     temp_db_index_path = os.path.join(index_path, "temp_db_index")
-    os.makedirs(temp_db_index_path, exist_ok=True)
+    dump_column_contents(db_file_path, temp_db_index_path, max_values_per_column, column_workers)
+    write_vocabulary_filter(iter_collection_documents(temp_db_index_path), index_path)
 
-    temp_content_path = f"{temp_db_index_path}/contents.json"
+    fts_file = os.path.join(index_path, FTS_INDEX_FILENAME)
+    temp_file = fts_file + ".tmp"
+    if os.path.exists(temp_file):
+        os.remove(temp_file)
+    try:
+        with sqlite3.connect(temp_file) as conn:
+            conn.execute(f"CREATE VIRTUAL TABLE column_values USING fts5(doc_id UNINDEXED, contents, tokenize='{FTS_TOKENIZER}')")
+            conn.executemany(
+                "INSERT INTO column_values (doc_id, contents) VALUES (?, ?)",
+                ((item["id"], item["contents"]) for item in iter_collection_documents(temp_db_index_path))
+            )
+            conn.execute("INSERT INTO column_values (column_values) VALUES ('optimize')")
+        conn.close()
+        os.replace(temp_file, fts_file)
+    except sqlite3.Error as e:
+        print(f"FTS5 index build failed for {db_file_path}: {e}")
+        return False
+    finally:
+        shutil.rmtree(temp_db_index_path, ignore_errors=True)
+    return True
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings, using double hashing of one blake2b digest."""
+    def __init__(self, num_bits: int, num_hashes: int, bits: bytearray = None):
+        self.num_bits = max(8, num_bits)
+        self.num_hashes = max(1, num_hashes)
+        self.bits = bits if bits is not None else bytearray((self.num_bits + 7) // 8)
+
+    @classmethod
+    def for_capacity(cls, capacity: int, false_positive_rate: float = VOCABULARY_FALSE_POSITIVE_RATE):
+        capacity = max(1, capacity)
+        num_bits = int(math.ceil(-capacity * math.log(false_positive_rate) / (math.log(2) ** 2)))
+        return cls(num_bits, int(round(num_bits / capacity * math.log(2))))
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.num_bits for i in range(self.num_hashes))
+
+    def add(self, item: str):
+        for position in self._positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item: str):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+    def save(self, path: str):
+        with open(path, "wb") as f:
+            f.write(struct.pack("<QI", self.num_bits, self.num_hashes))
+            f.write(self.bits)
 
-    with open(temp_content_path, "w") as f:
-        f.write(json.dumps(all_column_contents, indent=2, ensure_ascii=True))
+    @classmethod
+    def load(cls, path: str):
+        with open(path, "rb") as f:
+            num_bits, num_hashes = struct.unpack("<QI", f.read(12))
+            return cls(num_bits, num_hashes, bytearray(f.read()))
 
+@functools.lru_cache(maxsize=200000)
+def _stem(token: str):
+    return _porter_stemmer.stem(token)
+
+def fold_diacritics(text: str):
+    """Strip combining marks after NFKD decomposition, like unicode61's remove_diacritics (Café -> Cafe)."""
+    return "".join(ch for ch in unicodedata.normalize("NFKD", text) if not unicodedata.combining(ch))
+
+def vocabulary_tokens(text: str):
+    """
+    Lower-cased index terms text can produce under either backend, plus their Porter stems.
+    Lucene's analyzer keeps `foo_bar` as one token, while the FTS5 unicode61 tokenizer splits on every
+    non-alphanumeric character (including `_`) and folds diacritics, so both tokenizations are included.
+    Documents and queries are expanded the same way and both analyzers match on Porter stems, so a
+    query none of whose tokens is in the vocabulary cannot return any hit.
+    """
+    text = text.lower()
+    tokens = set(FTS_TERM_PATTERN.findall(text))
+    tokens.update(token for token in FTS_SEPARATOR_PATTERN.split(fold_diacritics(text)) if token)
+    return tokens | {_stem(token) for token in tokens}
+
+def write_vocabulary_filter(all_column_contents, index_path: str):
+    """Build the per-database token vocabulary of the indexed values and store it as a Bloom filter."""
+    vocabulary = set()
+    for item in all_column_contents:
+        vocabulary.update(vocabulary_tokens(item["contents"]))
+    bloom = BloomFilter.for_capacity(len(vocabulary))
+    for token in vocabulary:
+        bloom.add(token)
     os.makedirs(index_path, exist_ok=True)
-    cmd = f'python -m pyserini.index.lucene --collection JsonCollection --input {temp_db_index_path} --index "{index_path}" --generator DefaultLuceneDocumentGenerator --threads 16 --storePositions --storeDocvectors --storeRaw'
+    bloom.save(os.path.join(index_path, VOCABULARY_FILTER_FILENAME))
+    return bloom
 
-    d = os.system(cmd)
-    print(d)
-    os.remove(temp_content_path)
+def load_vocabulary_filter(index_path: str):
+    """Load a database's vocabulary Bloom filter, or None if the index predates it."""
+    path = os.path.join(index_path, VOCABULARY_FILTER_FILENAME)
+    if not os.path.exists(path):
+        return None
+    return BloomFilter.load(path)
+
+def screen_queries(queries, vocabulary_filter):
+    """Keep only queries with at least one token that may occur among the database's values."""
+    if vocabulary_filter is None:
+        return list(queries)
+    return [query for query in queries if any(token in vocabulary_filter for token in vocabulary_tokens(query))]
+
+class FtsValueSearcher:
+    """
+    Read-only BM25 search over an index written by build_fts_content_index.
+    Queries are tokenized into an OR of terms, like Lucene's default bag-of-words query.
+    """
+    def __init__(self, index_path: str):
+        fts_file = os.path.join(index_path, FTS_INDEX_FILENAME)
+        self.conn = sqlite3.connect(f"file:{fts_file}?mode=ro", uri=True, check_same_thread=False)
+        self.lock = threading.Lock()
+
+    def search_hits(self, query: str, k: int = 10):
+        terms = FTS_TERM_PATTERN.findall(query.lower())
+        if not terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in dict.fromkeys(terms))
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT doc_id, contents FROM column_values WHERE column_values MATCH ? ORDER BY rank LIMIT ?",
+                (match, k)
+            ).fetchall()
+        return [{"id": doc_id, "contents": contents} for doc_id, contents in rows]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
 
-def build_index_for_dataset(dataset_name: str, db_path: str, save_index_path: str):
+class SearcherPool:
+    """
+    Bounded LRU pool of per-database searchers (with their vocabulary filters), opened lazily on first
+    use. When the pool is full the least recently used searcher is closed, which keeps the number of
+    open Lucene indexes, and so the JVM heap, independent of the number of databases.
+    """
+    def __init__(self, index_root: str, backend: str = "lucene", capacity: int = 8):
+        self.index_root = index_root
+        self.backend = backend
+        self.capacity = max(1, capacity)
+        self.searchers = OrderedDict()
+        self.missing = set()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, db_id):
+        """Return (searcher, vocabulary_filter) for db_id; (None, None) if its index was not built."""
+        if db_id in self.searchers:
+            self.hits += 1
+            self.searchers.move_to_end(db_id)
+            return self.searchers[db_id]
+        if db_id in self.missing:
+            return None, None
+
+        self.misses += 1
+        index_path = os.path.join(self.index_root, db_id)
+        searcher = open_value_searcher(index_path, self.backend)
+        if searcher is None:
+            self.missing.add(db_id)
+            return None, None
+        while len(self.searchers) >= self.capacity:
+            _, (evicted, _) = self.searchers.popitem(last=False)
+            evicted.close()
+            self.evictions += 1
+        self.searchers[db_id] = (searcher, load_vocabulary_filter(index_path))
+        return self.searchers[db_id]
+
+    def close(self):
+        for searcher, _ in self.searchers.values():
+            searcher.close()
+        self.searchers.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions, "missing": len(self.missing)}
+
+def open_value_searcher(index_path: str, backend: str = "lucene"):
+    """Open the searcher of one database's content index, or return None if it was not built."""
+    if backend == "fts5":
+        if os.path.exists(os.path.join(index_path, FTS_INDEX_FILENAME)):
+            return FtsValueSearcher(index_path)
+        return None
+    if LuceneSearcher is None:
+        raise ImportError("pyserini is required for the lucene index backend; use the fts5 backend instead.")
+    return LuceneSearcher(index_path) if os.path.exists(index_path) else None
+
+def get_source_stamp(db_file_path: str, backend: str = "lucene", max_values_per_column: int = None):
+    """Size and mtime of the source database; an index is reused only while both (and the build options) are unchanged."""
+    stat = os.stat(db_file_path)
+    return {
+        "version": INDEX_STAMP_VERSION, "backend": backend, "max_values_per_column": max_values_per_column or None,
+        "size": stat.st_size, "mtime_ns": stat.st_mtime_ns
+    }
+
+def read_index_stamp(index_path: str):
+    try:
+        with open(os.path.join(index_path, INDEX_STAMP_FILENAME), "r") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+def build_content_index_if_changed(db_file_path: str, index_path: str, threads: int = 16, force: bool = False, backend: str = "lucene",
+                                   max_values_per_column: int = None, column_workers: int = 4):
+    """
+    Rebuild one database's index only when its stamp is missing or differs from the source file.
+    Returns "skipped", "built" or "failed".
+    """
+    stamp = get_source_stamp(db_file_path, backend, max_values_per_column)
+    if not force and read_index_stamp(index_path) == stamp:
+        return "skipped"
+
+    # Only this database's folder is cleared; a failed build leaves no stamp, so it is retried next time.
+    remove_contents_of_a_folder(index_path)
+    builder = build_fts_content_index if backend == "fts5" else build_content_index
+    if not builder(db_file_path, index_path, threads, max_values_per_column, column_workers):
+        return "failed"
+    with open(os.path.join(index_path, INDEX_STAMP_FILENAME), "w") as f:
+        json.dump(stamp, f)
+    return "built"
+
+def build_index_for_dataset(dataset_name: str, db_path: str, save_index_path: str, num_workers: int = 4, force: bool = False,
+                            backend: str = "lucene", max_values_per_column: int = None, column_workers: int = 4):
+    """
+    Build the per-database content indexes of a dataset incrementally and in parallel.
+    Databases whose .sqlite file is unchanged since the last build are skipped, and index folders of
+    databases that no longer exist are removed. force=True rebuilds every database.
+    backend is "lucene" (pyserini) or "fts5" (SQLite FTS5 sidecar file, no JVM).
+    Within a database, column_workers columns are extracted concurrently and at most
+    max_values_per_column distinct values are indexed per column (None for no cap).
+    """
     print(f"build index for dataset: {dataset_name} - {db_path}")
     print(f"save_index_path : {save_index_path}")
-    remove_contents_of_a_folder(save_index_path)
-    db_ids = os.listdir(db_path)
-    for db_id in db_ids:
+    os.makedirs(save_index_path, exist_ok=True)
+
+    db_files = {}
+    for db_id in os.listdir(db_path):
         db_file_path = os.path.join(db_path, db_id, db_id + ".sqlite")
         if os.path.exists(db_file_path) and os.path.isfile(db_file_path):
-            print(f"db_id: {db_id}, The file '{db_file_path}' exists.")
-            build_content_index(
-                db_file_path,
-                os.path.join(save_index_path, db_id)
-            )
+            db_files[db_id] = db_file_path
         else:
             print(f"The file '{db_file_path}' does not exist.")
 
+    for name in os.listdir(save_index_path):
+        stale_path = os.path.join(save_index_path, name)
+        if name not in db_files and os.path.isdir(stale_path):
+            print(f"Removing index of missing database: {name}")
+            shutil.rmtree(stale_path, ignore_errors=True)
+
+    num_workers = max(1, num_workers)
+    # Split the Lucene indexing threads between the concurrent builds.
+    threads = max(1, 16 // num_workers)
+    outcomes = {"skipped": 0, "built": 0, "failed": 0}
+    with ThreadPoolExecutor(max_workers=num_workers) as executor:
+        futures = {
+            executor.submit(
+                build_content_index_if_changed, db_file_path, os.path.join(save_index_path, db_id), threads, force, backend,
+                max_values_per_column, column_workers
+            ): db_id
+            for db_id, db_file_path in db_files.items()
+        }
+        for future in tqdm(as_completed(futures), total=len(futures), desc="Building content indexes"):
+            db_id = futures[future]
+            try:
+                outcome = future.result()
+            except Exception as e:
+                print(f"db_id: {db_id}, index build failed: {e}")
+                outcome = "failed"
+            outcomes[outcome] += 1
+    print(f"content index: {outcomes['built']} built, {outcomes['skipped']} unchanged, {outcomes['failed']} failed")
+    return outcomes
+
+def calculate_substring_match_percentages(queries, target):
+    """Batch form of calculate_substring_match_percentage: one automaton over target, one pass per query."""
+    matcher = SubstringMatcher(target)
+    return [matcher.score(query) for query in queries]
+
 def calculate_substring_match_percentage(query, target):
+    return SubstringMatcher(target).score(query)
+
+def _legacy_calculate_substring_match_percentage(query, target):
+    """Previous implementation that enumerates every substring of query; kept for the benchmark."""
     query = query.lower()
     target = target.lower()
 
@@ -147,6 +526,9 @@ def calculate_substring_match_percentage(query, target):
 # --- 这是被修改的函数 ---
 def retrieve_relevant_hits(searcher, queries):
     queries = list(dict.fromkeys(queries))
+    if isinstance(searcher, FtsValueSearcher):
+        return {query: searcher.search_hits(query, k=10) for query in queries}
+
     q_ids = [f"{idx}" for idx in range(len(queries))]
 
     query2hits = dict()
@@ -176,9 +558,9 @@ def retrieve_relevant_hits(searcher, queries):
 
 def retrieve_question_related_db_values(hits, question):
     high_score_hits = []
-    for idx, hit in enumerate(hits):
+    scores = calculate_substring_match_percentages([hit["contents"] for hit in hits], question)
+    for idx, (hit, score) in enumerate(zip(hits, scores)):
         table_name, column_name, c_id = hit["id"].split("-**-")
-        score = calculate_substring_match_percentage(hit["contents"], question)
         if score > 0.85:
             high_score_hits.append(
                 {
@@ -200,6 +582,61 @@ def retrieve_question_related_db_values(hits, question):
 
     return relavant_db_values_dict
 
+class QueryHitCache:
+    """
+    Dataset-level cache of db_id -> query -> hits for value retrieval.
+    Queries of all questions on one database are deduplicated and searched in one batch; hits are
+    interned by document id so repeated documents share one dict. With a vocabulary filter, queries
+    none of whose tokens occur in the database get no hits without a searcher call. requested/searched
+    count the searches the per-question loop would have made and the ones actually sent to the searcher;
+    screened counts the unique queries dropped by the filter.
+    """
+    def __init__(self, batch_size: int = 10000):
+        self.batch_size = batch_size
+        self.hits = {}
+        self.documents = {}
+        self.requested = 0
+        self.searched = 0
+        self.screened = 0
+
+    def retrieve(self, searcher, db_id, queries_per_question, vocabulary_filter=None):
+        """Return one query2hits dict per question, in the order of queries_per_question."""
+        self.requested += sum(len(set(queries)) for queries in queries_per_question)
+        db_hits = self.hits.setdefault(db_id, {})
+        missing = [
+            query for query in dict.fromkeys(itertools.chain.from_iterable(queries_per_question))
+            if query not in db_hits
+        ]
+        kept = screen_queries(missing, vocabulary_filter)
+        self.screened += len(missing) - len(kept)
+        for query in set(missing).difference(kept):
+            db_hits[query] = []
+        missing = kept
+        documents = self.documents.setdefault(db_id, {})
+        for start in range(0, len(missing), self.batch_size):
+            for query, hits in retrieve_relevant_hits(searcher, missing[start:start + self.batch_size]).items():
+                db_hits[query] = [documents.setdefault(hit["id"], hit) for hit in hits]
+        self.searched += len(missing)
+        return [
+            {query: db_hits[query] for query in dict.fromkeys(queries)}
+            for queries in queries_per_question
+        ]
+
+    def evict(self, db_id):
+        """Drop the cached hits of a database once all of its questions are processed."""
+        self.hits.pop(db_id, None)
+        self.documents.pop(db_id, None)
+
+    def stats(self):
+        saved = self.requested - self.searched
+        return {
+            "requested": self.requested,
+            "searched": self.searched,
+            "saved": saved,
+            "screened": self.screened,
+            "saved_ratio": saved / self.requested if self.requested else 0.0,
+        }
+
 def obtain_n_grams(sequence, max_n):
     tokens = word_tokenize(sequence)
     all_n_grams = []
@@ -207,19 +644,53 @@ def obtain_n_grams(sequence, max_n):
         all_n_grams.extend([" ".join(gram) for gram in ngrams(tokens, n)])
     return all_n_grams
 
-# 假设的主程序入口，用于演示代码完整性
-if __name__ == '__main__':
-    # 这里的代码是假设的，因为原始错误追溯中显示了对 process_dataset 的调用
-    # 你需要根据你的实际项目结构来运行代码
-    # 例如:
-    # process_dataset(...)
-    print("代码已修正。请在您的主程序中调用相应函数。")
-    # 示例用法 (需要有已构建的索引和searcher对象)
-    # try:
-    #     searcher = LuceneSearcher('path/to/your/index')
-    #     queries = ['some query text', 'another query']
-    #     relevant_hits = retrieve_relevant_hits(searcher, queries)
-    #     print(json.dumps(relevant_hits, indent=2))
-    # except Exception as e:
-    #     print(f"无法执行示例，请确保索引路径正确: {e}")
+def benchmark_substring_match(json_dataset: str, db_dir: str, max_questions: int = 200, max_values_per_db: int = 2000):
+    """
+    Compare the legacy substring scorer with the suffix-automaton batch scorer on real database values:
+    every question (with its evidence) is scored against up to max_values_per_db values of its database.
+    """
+    with open(json_dataset, "r", encoding="utf-8") as f:
+        dataset = json.load(f)[:max_questions]
 
+    db_values = {}
+    for item in dataset:
+        db_id = item["db_id"]
+        if db_id not in db_values:
+            documents = iter_column_documents(os.path.join(db_dir, db_id, db_id + ".sqlite"))
+            db_values[db_id] = [document["contents"] for document in itertools.islice(documents, max_values_per_db)]
+
+    legacy_seconds, batch_seconds, pairs, mismatches = 0.0, 0.0, 0, 0
+    for item in tqdm(dataset, desc="Benchmarking substring match"):
+        question = f"{item['question']}\n{item.get('evidence', '')}".strip()
+        values = db_values[item["db_id"]]
+
+        start = time.perf_counter()
+        legacy_scores = []
+        for value in values:
+            try:
+                legacy_scores.append(_legacy_calculate_substring_match_percentage(value, question))
+            except ValueError:  # no character in common: the legacy scorer fails on max([])
+                legacy_scores.append(0.0)
+        legacy_seconds += time.perf_counter() - start
+
+        start = time.perf_counter()
+        batch_scores = calculate_substring_match_percentages(values, question)
+        batch_seconds += time.perf_counter() - start
+
+        pairs += len(values)
+        mismatches += sum(abs(a - b) > 1e-12 for a, b in zip(legacy_scores, batch_scores))
+
+    print(f"questions: {len(dataset)}, scored pairs: {pairs}, mismatches: {mismatches}")
+    print(f"legacy: {legacy_seconds:.3f}s, suffix automaton: {batch_seconds:.3f}s, "
+          f"speedup: {legacy_seconds / max(batch_seconds, 1e-9):.1f}x")
+    return {"pairs": pairs, "mismatches": mismatches, "legacy_seconds": legacy_seconds, "batch_seconds": batch_seconds}
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Benchmark value-hit substring scoring on a dataset's databases.")
+    parser.add_argument("--json_dataset", required=True, help="Path to the dataset JSON (e.g. BIRD dev.json).")
+    parser.add_argument("--db_dir", required=True, help="Directory containing <db_id>/<db_id>.sqlite.")
+    parser.add_argument("--max_questions", type=int, default=200)
+    parser.add_argument("--max_values_per_db", type=int, default=2000)
+    args = parser.parse_args()
+    benchmark_substring_match(args.json_dataset, args.db_dir, args.max_questions, args.max_values_per_db)
@@ -3,10 +3,12 @@ import re
 import sys
 import json
 import argparse
-import sqlite3
+import math
+import time
 import multiprocessing as mp
 from func_timeout import func_timeout, FunctionTimedOut
 import logging
+from pipeline.utils.db_residency import connect_database, init_db_residency
 
 # --- Copied functions from evaluation_bird_ex.py ---
 def replace_multiple_spaces(text):
@@ -32,23 +34,33 @@ exec_result = []
 def result_callback(result):
     exec_result.append(result)
 
+def fan_out_callback(members):
+    """Callback for a deduplicated execution: hand the result to every (sql_idx, question_id) that shares it."""
+    def callback(result):
+        for idx, question_id in members:
+            result_callback({**result, 'sql_idx': idx, 'question_id': question_id})
+    return callback
+
 def execute_sql(predicted_sql,ground_truth, db_path):
-    conn = sqlite3.connect(db_path)
+    conn = connect_database(db_path)
     # Connect to the database
     cursor = conn.cursor()
     cursor.execute(predicted_sql)
     predicted_res = cursor.fetchall()
+    start_time = time.time()
     cursor.execute(ground_truth)
     ground_truth_res = cursor.fetchall()
+    gold_time = time.time() - start_time
     res = 0
     # todo: this should permute column order!
     if set(predicted_res) == set(ground_truth_res):
         res = 1
-    return res
+    return res, gold_time
 
 def execute_model(predicted_sql,ground_truth, db_place, idx, question_id, meta_time_out):
+    gold_time = None
     try:
-        res = func_timeout(meta_time_out, execute_sql,
+        res, gold_time = func_timeout(meta_time_out, execute_sql,
                                   args=(predicted_sql, ground_truth, db_place))
     except KeyboardInterrupt:
         sys.exit(0)
@@ -58,9 +70,37 @@ def execute_model(predicted_sql,ground_truth, db_place, idx, question_id, meta_t
     except Exception as e:
         result = [(f'error',)]  # possibly len(query) > 512 or not executable
         res = 0
-    result = {'sql_idx': idx, 'res': res, 'question_id': question_id}
+    result = {'sql_idx': idx, 'res': res, 'question_id': question_id, 'gold_time': gold_time}
     return result
 
+# --- Adaptive per-database timeouts, sharing the latency_stats.json written by the pipeline ---
+def load_latency_stats(path):
+    if not path or not os.path.exists(path):
+        return {}
+    try:
+        return load_json(path)
+    except (IOError, json.JSONDecodeError) as e:
+        logging.warning(f"Could not load latency stats from {path}: {e}")
+        return {}
+
+def save_latency_stats(path, latency_stats, max_samples=1000):
+    if not path:
+        return
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({db_id: values[-max_samples:] for db_id, values in latency_stats.items()}, f)
+
+def db_id_from_path(db_path):
+    return os.path.basename(os.path.dirname(db_path))
+
+def adaptive_timeout(samples, meta_time_out, multiplier, min_timeout, min_samples=20):
+    """multiplier * p99 of the observed latencies, clamped to [min_timeout, meta_time_out]."""
+    if len(samples) < min_samples:
+        return meta_time_out
+    values = sorted(samples)
+    p99 = values[min(len(values) - 1, max(0, math.ceil(0.99 * len(values)) - 1))]
+    return min(meta_time_out, max(min_timeout, multiplier * p99))
+
 def package_sqls(sql_path, db_root_path, mode='gpt', data_mode='dev'):
     clean_sqls = []
     db_path_list = []
@@ -79,11 +119,26 @@ def package_sqls(sql_path, db_root_path, mode='gpt', data_mode='dev'):
             db_path_list.append(db_root_path + '/' + db_name + '/' + db_name + '.sqlite')
     return clean_sqls, db_path_list
 
-def run_sqls_parallel(sqls_with_qids, db_places, num_cpus=1, meta_time_out=30.0):
-    pool = mp.Pool(processes=num_cpus)
+def run_sqls_parallel(sqls_with_qids, db_places, num_cpus=1, meta_time_out=30.0, db_residency_mb=0):
+    # meta_time_out may be a single value or one timeout per query
+    time_outs = meta_time_out if isinstance(meta_time_out, list) else [meta_time_out] * len(sqls_with_qids)
+    if db_residency_mb > 0:
+        # every worker process keeps its own in-memory copies within db_residency_mb
+        pool = mp.Pool(processes=num_cpus, initializer=init_db_residency, initargs=(db_residency_mb,))
+    else:
+        pool = mp.Pool(processes=num_cpus)
+    # identical (predicted, gold, database) triples are executed once and the result is fanned out
+    groups = {}
     for i, (sql_pair, question_id) in enumerate(sqls_with_qids):
         predicted_sql, ground_truth = sql_pair
-        pool.apply_async(execute_model, args=(predicted_sql, ground_truth, db_places[i], i, question_id, meta_time_out), callback=result_callback)
+        groups.setdefault((predicted_sql.strip(), ground_truth.strip(), db_places[i]), []).append((i, question_id))
+    if sqls_with_qids:
+        print(f"Executing {len(groups)} distinct of {len(sqls_with_qids)} queries "
+              f"(dedup ratio {1 - len(groups) / len(sqls_with_qids):.1%})")
+    for (predicted_sql, ground_truth, db_place), members in groups.items():
+        idx, question_id = members[0]
+        time_out = max(time_outs[i] for i, _ in members)
+        pool.apply_async(execute_model, args=(predicted_sql, ground_truth, db_place, idx, question_id, time_out), callback=fan_out_callback(members))
     pool.close()
     pool.join()
 
@@ -146,8 +201,15 @@ if __name__ == '__main__':
     args_parser.add_argument('--difficulty',type=str, default='simple', help='Difficulty level (simple, moderate, challenging).')
     args_parser.add_argument('--diff_json_path',type=str,default='./data/bird/dev.json', help='Path to the difficulty JSON file.')
     args_parser.add_argument('--question_ids_path', type=str, required=True, help='Path to the question_ids.txt file.')
+    args_parser.add_argument('--latency_stats_path', type=str, default=None, help='Per-database latency stats (JSON) used for adaptive timeouts and updated with gold query timings. Fixed meta_time_out is used if omitted.')
+    args_parser.add_argument('--timeout_multiplier', type=float, default=5.0, help='Adaptive timeout = timeout_multiplier * p99 latency of the database.')
+    args_parser.add_argument('--min_timeout', type=float, default=5.0, help='Lower bound of the adaptive timeout.')
+    args_parser.add_argument('--db_residency_mb', type=int, default=0, help='Per-process memory budget (MB) for keeping frequently used databases in memory. 0 disables it.')
     args = args_parser.parse_args()
 
+    latency_stats = load_latency_stats(args.latency_stats_path)
+    recorded_gold_qids = set() # gold SQL is shared by every evaluated file, record its timing once
+
     # Function to run evaluation for a single model
     def run_evaluation(predicted_sql_path, ground_truth_sql_path, question_ids_path, db_root_path, data_mode, num_cpus, meta_time_out, mode_predict):
         global exec_result # Access the global variable
@@ -171,8 +233,26 @@ if __name__ == '__main__':
         # Combine sql_pairs with question_ids
         sqls_with_qids = list(zip(list(zip(pred_queries, gt_queries)), question_ids))
         
-        run_sqls_parallel(sqls_with_qids, db_places=db_paths_gt, num_cpus=num_cpus, meta_time_out=meta_time_out)
-        return sort_results(exec_result)
+        if args.latency_stats_path:
+            time_outs = [
+                adaptive_timeout(latency_stats.get(db_id_from_path(db_path), []), meta_time_out,
+                                 args.timeout_multiplier, args.min_timeout)
+                for db_path in db_paths_gt
+            ]
+        else:
+            time_outs = meta_time_out
+        run_sqls_parallel(sqls_with_qids, db_places=db_paths_gt, num_cpus=num_cpus, meta_time_out=time_outs,
+                          db_residency_mb=args.db_residency_mb)
+        results = sort_results(exec_result)
+
+        if args.latency_stats_path:
+            for result in results:
+                if result.get('gold_time') is not None and result['question_id'] not in recorded_gold_qids:
+                    recorded_gold_qids.add(result['question_id'])
+                    db_id = db_id_from_path(db_paths_gt[result['sql_idx']])
+                    latency_stats.setdefault(db_id, []).append(result['gold_time'])
+            save_latency_stats(args.latency_stats_path, latency_stats)
+        return results
 
     # Load dev.json once
     dev_contents = load_json(args.diff_json_path)
@@ -28,6 +28,7 @@ from func_timeout import func_timeout, FunctionTimedOut # 导入超时机制
 # Assuming process_sql and exec_eval are in the same directory or accessible via PYTHONPATH
 from process_sql import get_schema, Schema, get_sql
 from exec_eval import eval_exec_match
+from pipeline.utils.db_residency import init_db_residency, shutdown_db_residency
 
 # Flag to disable value evaluation
 DISABLE_VALUE = True
@@ -573,8 +574,12 @@ if __name__ == "__main__":
                         help='whether to print progress bar of running test inputs for each datapoint')
     parser.add_argument('--question_ids_path', dest='question_ids_path', type=str, required=True, help='Path to the question_ids.txt file.') # Added question_ids_path
     parser.add_argument('--meta_time_out', type=float, default=30.0, help='Timeout for SQL execution.') # Added meta_time_out
+    parser.add_argument('--db_residency_mb', type=int, default=0, help='Memory budget (MB) for keeping frequently used databases in memory. 0 disables it.')
     args = parser.parse_args()
 
+    if args.db_residency_mb > 0:
+        init_db_residency(args.db_residency_mb)
+
     # Load question_ids
     with open(args.question_ids_path, 'r', encoding='utf-8') as f:
         question_ids = [line.strip() for line in f.readlines()]
@@ -635,3 +640,5 @@ if __name__ == "__main__":
         compare_two_models(gold_pred_map_lst_2, gold_pred_map_lst_3, "Model 2", "Model 3")
     else:
         compare_two_models(gold_pred_map_lst_1, gold_pred_map_lst_2, "Model 1", "Model 2")
+
+    shutdown_db_residency()
@@ -1,7 +1,6 @@
 import os
 import re
 import asyncio
-import sqlite3
 import threading
 from typing import Tuple, Any, List, Set
 from itertools import product
@@ -13,6 +12,7 @@ import time
 import pickle as pkl
 import subprocess
 from itertools import chain
+from pipeline.utils.db_residency import connect_database
 
 
 
@@ -133,7 +133,7 @@ def get_cursor_from_path(sqlite_path: str):
     try:
         if not os.path.exists(sqlite_path):
             print("Openning a new connection %s" % sqlite_path)
-        connection = sqlite3.connect(sqlite_path)
+        connection = connect_database(sqlite_path)
     except Exception as e:
         print(sqlite_path)
         raise e
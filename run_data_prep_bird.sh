@@ -1,5 +1,8 @@
 #!/bin/bash
 
+# 脚本通过 pipeline.utils 导入与推理管道共用的模块
+export PYTHONPATH="$(pwd)/src${PYTHONPATH:+:$PYTHONPATH}"
+
 # 定义根路径
 BIRD_DATASET_ROOT="/home/jamtc/paper-code/lifh/Text-to-SQL/datasets/BIRD"
 BIRD_MODE="train" 
@@ -10,6 +13,8 @@ BIRD_DB_DIR_SUFFIX="${BIRD_MODE}/${BIRD_MODE}_databases"
 BIRD_DB_SCHEMAS_OUTPUT_DIR="./preprocess_data/bird/${BIRD_MODE}/db_schemas"
 BIRD_PROCESSED_DATA_OUTPUT_DIR="./preprocess_data/bird/${BIRD_MODE}"
 BIRD_DB_CONTENT_INDEX_DIR="./preprocess_data/bird/${BIRD_MODE}/db_content_index"
+BIRD_SHADOW_DB_DIR="./preprocess_data/bird/${BIRD_MODE}/shadow_databases"
+BIRD_INDEXED_DB_DIR="./preprocess_data/bird/${BIRD_MODE}/indexed_databases"
 JSON_DATASET_PATH="${BIRD_DATASET_ROOT}/${BIRD_MODE}/${BIRD_MODE}.json"
 DB_PATH="${BIRD_DATASET_ROOT}/${BIRD_MODE}/${BIRD_MODE}_databases"
 
@@ -30,6 +35,19 @@ python ./data_procession/process_dataset.py \
     --db_dir "${DB_PATH}" \
     --db_schema_dir "${BIRD_DB_SCHEMAS_OUTPUT_DIR}" \
     --output_dir "${BIRD_PROCESSED_DATA_OUTPUT_DIR}" \
-    --db_content_index_path "${BIRD_DB_CONTENT_INDEX_DIR}" # 新增：传递BM25索引路径
+    --db_content_index_path "${BIRD_DB_CONTENT_INDEX_DIR}" \
+    --index_workers 8 # 并行构建BM25索引；数据库文件未变化的索引会被跳过，加 --rebuild_index 强制重建
+
+echo "Running ./data_procession/build_shadow_databases.py"
+python ./data_procession/build_shadow_databases.py \
+    --db_dir "${DB_PATH}" \
+    --shadow_dir "${BIRD_SHADOW_DB_DIR}"
+
+# 根据gold SQL的谓词生成带推荐索引的数据库副本；流水线跑完后可加 --sql_results_dir 把候选SQL也纳入统计
+echo "Running ./data_procession/build_indexed_databases.py"
+python ./data_procession/build_indexed_databases.py \
+    --db_dir "${DB_PATH}" \
+    --output_dir "${BIRD_INDEXED_DB_DIR}" \
+    --json_dataset "${JSON_DATASET_PATH}"
 
 echo "BIRD dev data processing complete."
@@ -1,5 +1,8 @@
 #!/bin/bash
 
+# 脚本通过 pipeline.utils 导入与推理管道共用的模块
+export PYTHONPATH="$(pwd)/src${PYTHONPATH:+:$PYTHONPATH}"
+
 # 定义根路径
 SPIDER_DATASET_ROOT="/home/jamtc/paper-code/lifh/Text-to-SQL/datasets/Spider-DK"
 
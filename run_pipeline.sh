@@ -8,6 +8,9 @@ OUTPUT_BASE_DIR="outputs"
 DATASET_NAME="bird/dev"
 DB_SCHEMA_DIR="preprocess_data/bird/dev/db_schemas"
 DB_ROOT_DIR="../datasets/BIRD/dev/dev_databases"
+SHADOW_DB_ROOT_DIR="preprocess_data/bird/dev/shadow_databases"
+INDEXED_DB_ROOT_DIR="preprocess_data/bird/dev/indexed_databases"
+DB_CONTENT_INDEX_PATH="preprocess_data/bird/dev/db_content_index"
 CSV_FILE_PATH="preprocess_data/bird/dev/processed_dataset.csv"
 PIPELINE_CONFIGS_PATH="config/pipeline_configs.json"
 MAX_SCHEMA_TOKEN_LENGTH=8192
@@ -27,6 +30,27 @@ else
     MAX_SCHEMA_TOKEN_LENGTH_ARG=""
 fi
 
+# 检查是否存在采样影子数据库
+if [ -d "$SHADOW_DB_ROOT_DIR" ]; then
+    SHADOW_DB_ROOT_DIR_ARG="--shadow_db_root_dir $SHADOW_DB_ROOT_DIR"
+else
+    SHADOW_DB_ROOT_DIR_ARG=""
+fi
+
+# 检查是否存在带推荐索引的数据库副本
+if [ -d "$INDEXED_DB_ROOT_DIR" ]; then
+    INDEXED_DB_ROOT_DIR_ARG="--indexed_db_root_dir $INDEXED_DB_ROOT_DIR"
+else
+    INDEXED_DB_ROOT_DIR_ARG=""
+fi
+
+# 检查是否存在数据库值索引（在线值检索只使用 fts5 后端生成的索引）
+if [ -d "$DB_CONTENT_INDEX_PATH" ]; then
+    DB_CONTENT_INDEX_PATH_ARG="--db_content_index_path $DB_CONTENT_INDEX_PATH"
+else
+    DB_CONTENT_INDEX_PATH_ARG=""
+fi
+
 # 执行Python脚本
 python src/run_pipeline.py \
     --output_base_dir "$OUTPUT_BASE_DIR" \
@@ -35,6 +59,9 @@ python src/run_pipeline.py \
     --db_root_dir "$DB_ROOT_DIR" \
     --csv_file_path "$CSV_FILE_PATH" \
     $PIPELINE_CONFIGS_ARG \
+    $SHADOW_DB_ROOT_DIR_ARG \
+    $INDEXED_DB_ROOT_DIR_ARG \
+    $DB_CONTENT_INDEX_PATH_ARG \
     $MAX_SCHEMA_TOKEN_LENGTH_ARG 
     # --save_additional_data
 
@@ -1,8 +1,21 @@
-from .core.pipeline import Pipeline
-from .core.task import Task
-from .utils.prompts import table_extraction_prompt, sql_generation_prompt, sql_refinement_prompt, sql_selection_prompt
+import importlib
+
+# 导出项按需导入：只使用 pipeline.utils 中标准库模块的脚本（数据预处理、评估）不会因此加载模型依赖
+_EXPORTS = {
+    'Pipeline': '.core.pipeline',
+    'Task': '.core.task',
+    'table_extraction_prompt': '.utils.prompts',
+    'sql_generation_prompt': '.utils.prompts',
+    'sql_refinement_prompt': '.utils.prompts',
+    'sql_selection_prompt': '.utils.prompts',
+}
 
 __all__ = [
     'Pipeline', 'Task',
     'table_extraction_prompt', 'sql_generation_prompt', 'sql_refinement_prompt', 'sql_selection_prompt',
-]
\ No newline at end of file
+]
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -2,7 +2,9 @@ import logging
 import json
 import os
 from typing import Any, Dict, List, Callable, Optional
+from ..nodes.value_retrieval import retrieve_values
 from ..nodes.table_extraction import extract_related_table
+from ..nodes.path_routing import route_paths
 from ..nodes.sql_generation import candidate_generate
 from ..nodes.sql_refinement import refine_candidate
 from ..nodes.sql_selection import select_sql
@@ -73,10 +75,12 @@ class Pipeline:
     def _process_stage(self, 
                        stage_name: str, 
                        processor_func: Callable, 
-                       input_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+                       input_data: List[Dict[str, Any]],
+                       requires_model: bool = True) -> List[Dict[str, Any]]:
         """
         处理管道流中的一个阶段，支持批量处理和断点续传。
         input_data: 上一个阶段的输出，作为当前阶段的输入。
+        requires_model: 为 False 时不加载模型，processor_func 收到的 chat_model 为 None。
         """
         self.logger.info(f"开始处理阶段: {stage_name}")
         self.logger.debug(f"阶段 '{stage_name}' 接收到的 input_data 长度: {len(input_data)}")
@@ -114,7 +118,7 @@ class Pipeline:
             self.logger.info(f"阶段 '{stage_name}' 正在处理 {len(tasks_to_process)} 个任务...")
             
             # 加载模型
-            chat_model = self._load_model(stage_name)
+            chat_model = self._load_model(stage_name) if requires_model else None
             
             try:
                 # 调用批量处理函数，传入模型实例
@@ -126,7 +130,8 @@ class Pipeline:
                 raise
             finally:
                 # 卸载模型
-                self._unload_model(stage_name)
+                if requires_model:
+                    self._unload_model(stage_name)
 
             self.logger.debug(f"阶段 '{stage_name}' 合并前 completed_results 长度: {len(completed_results)}")
             self.logger.debug(f"阶段 '{stage_name}' 合并前 batch_output 长度: {len(batch_output)}")
@@ -170,6 +175,14 @@ class Pipeline:
         current_input_data = [task.to_dict() for task in tasks]
 
         try:
+            # 步骤0: 在线检索问题相关的数据库值并注入完整schema（不使用模型）
+            current_input_data = self._process_stage(
+                "value_retrieval",
+                retrieve_values,
+                current_input_data,
+                requires_model=False
+            )
+
             # 步骤1: 提取相关表格
             current_input_data = self._process_stage(
                 "table_extraction", 
@@ -177,6 +190,14 @@ class Pipeline:
                 current_input_data
             )
             
+            # 步骤1.5: 在预算下为每个问题选择路径（不使用模型）
+            current_input_data = self._process_stage(
+                "path_routing",
+                route_paths,
+                current_input_data,
+                requires_model=False
+            )
+
             # 步骤2: 生成候选SQL
             current_input_data = self._process_stage(
                 "sql_generation", 
@@ -1,4 +1,5 @@
 from .pipeline_manager import PipelineManager
 from .database_manager import DatabaseManager
+from .latency_manager import LatencyManager
 
-__all__ = ['PipelineManager', 'DatabaseManager']
\ No newline at end of file
+__all__ = ['PipelineManager', 'DatabaseManager', 'LatencyManager']
\ No newline at end of file
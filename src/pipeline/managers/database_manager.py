@@ -11,12 +11,27 @@ class DatabaseManager:
                 cls._instance = super(DatabaseManager, cls).__new__(cls)
         return cls._instance
 
-    def __init__(self, db_schema_dir=None, db_root_dir=None):
+    def __init__(self, db_schema_dir=None, db_root_dir=None, shadow_db_root_dir=None, indexed_db_root_dir=None, db_content_index_dir=None):
         if not hasattr(self, '_initialized'): # 避免重复初始化
             self._initialized = True
 
             self.db_schema_dir = db_schema_dir
             self.db_root_dir = db_root_dir
+            self.shadow_db_root_dir = shadow_db_root_dir
+            self.indexed_db_root_dir = indexed_db_root_dir
+            self.db_content_index_dir = db_content_index_dir
 
     def get_db_path(self, db_id):
+        """优先返回带推荐索引的数据库副本（由 data_procession/build_indexed_databases.py 生成），不存在时返回原数据库"""
+        if self.indexed_db_root_dir:
+            indexed_path = os.path.join(self.indexed_db_root_dir, db_id, f"{db_id}.sqlite")
+            if os.path.exists(indexed_path):
+                return indexed_path
         return os.path.join(self.db_root_dir, db_id, f"{db_id}.sqlite")
+
+    def get_shadow_db_path(self, db_id):
+        """返回 db_id 的采样影子数据库路径；未配置或不存在时返回 None"""
+        if not self.shadow_db_root_dir:
+            return None
+        shadow_path = os.path.join(self.shadow_db_root_dir, db_id, f"{db_id}.sqlite")
+        return shadow_path if os.path.exists(shadow_path) else None
@@ -0,0 +1,150 @@
+import json
+import logging
+import math
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 视为"正常完成"的执行结果；被代价检查拒绝和报错的执行不计入延迟样本
+_COMPLETED_ERRORS = ("", "Empty result.")
+# 超时的执行以超时阈值作为删失样本计入（真实延迟至少为该值），否则 p99 只来自旧阈值内完成的查询，超时会不断自我强化地缩小
+_TIMEOUT_ERROR = "Query timed out."
+
+class LatencyManager:
+    """
+    按 db_id 维护SQL执行延迟样本，并据此给出自适应的执行超时。
+    超时 = clamp(multiplier * p99, min_timeout, max_timeout)；样本不足时使用 max_timeout。
+    样本持久化到 stats_path（JSON: {db_id: [latency, ...]}），供后续运行和评估脚本复用。
+    """
+    _instance = None
+    _lock = threading.Lock()
+
+    def __new__(cls, *args, **kwargs):
+        with cls._lock:
+            if cls._instance is None:
+                cls._instance = super(LatencyManager, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(
+        self,
+        stats_path: Optional[str] = None,
+        multiplier: float = 5.0,
+        min_timeout: float = 5.0,
+        max_timeout: float = 300.0,
+        min_samples: int = 20,
+        max_samples: int = 1000
+    ):
+        if not hasattr(self, '_initialized'):
+            self._initialized = True
+
+            self.stats_path = stats_path
+            self.multiplier = multiplier
+            self.min_timeout = min_timeout
+            self.max_timeout = max_timeout
+            self.min_samples = min_samples
+            self.max_samples = max_samples
+            self._samples: Dict[str, List[float]] = {}
+            self._samples_lock = threading.Lock()
+            self.load()
+
+    def load(self):
+        """从 stats_path 加载历史延迟样本"""
+        if not self.stats_path or not os.path.exists(self.stats_path):
+            return
+        try:
+            with open(self.stats_path, 'r', encoding='utf-8') as f:
+                samples = json.load(f)
+        except (IOError, json.JSONDecodeError) as e:
+            logger.error(f"加载延迟统计文件 {self.stats_path} 失败: {e}")
+            return
+        with self._samples_lock:
+            self._samples = {db_id: list(values)[-self.max_samples:] for db_id, values in samples.items()}
+        logger.info(f"已从 {self.stats_path} 加载 {len(self._samples)} 个数据库的延迟样本。")
+
+    def save(self):
+        """将延迟样本写回 stats_path"""
+        if not self.stats_path:
+            return
+        with self._samples_lock:
+            samples = {db_id: list(values) for db_id, values in self._samples.items()}
+        os.makedirs(os.path.dirname(os.path.abspath(self.stats_path)), exist_ok=True)
+        tmp_path = f"{self.stats_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(samples, f)
+        os.replace(tmp_path, self.stats_path)
+
+    def record(self, db_id: str, latency: float, error: str = ""):
+        """记录一次执行的延迟；正常完成（含空结果）与超时（latency 为当时的超时阈值）的执行会被计入"""
+        if (error not in _COMPLETED_ERRORS and error != _TIMEOUT_ERROR) or latency is None or latency < 0:
+            return
+        with self._samples_lock:
+            values = self._samples.setdefault(db_id, [])
+            values.append(float(latency))
+            if len(values) > self.max_samples:
+                del values[:len(values) - self.max_samples]
+
+    def record_batch(self, executions: List[Tuple[str, str, str]], outcomes: List[Tuple[list, str, float]]):
+        """
+        记录一批 execute_sql_queries 的执行延迟。同一数据库上文本相同的查询只执行了一次，因此只计入一个样本，
+        避免重复请求放大其在 p99 中的权重。
+        :param executions: 与 outcomes 对应的 (db_id, db_path, query) 三元组列表。
+        :param outcomes: execute_sql_queries 的返回值。
+        """
+        seen = set()
+        for (db_id, db_path, query), (_, error, exec_time) in zip(executions, outcomes):
+            key = (db_path, query.strip() if isinstance(query, str) else query)
+            if key in seen:
+                continue
+            seen.add(key)
+            self.record(db_id, exec_time, error)
+
+    def sample_count(self, db_id: str) -> int:
+        with self._samples_lock:
+            return len(self._samples.get(db_id, []))
+
+    def percentile(self, db_id: str, q: float = 0.99) -> Optional[float]:
+        with self._samples_lock:
+            values = sorted(self._samples.get(db_id, []))
+        if not values:
+            return None
+        return values[min(len(values) - 1, max(0, math.ceil(q * len(values)) - 1))]
+
+    def get_timeout(self, db_id: str) -> float:
+        """返回 db_id 的执行超时（秒）"""
+        if self.sample_count(db_id) < self.min_samples:
+            return self.max_timeout
+        p99 = self.percentile(db_id, 0.99)
+        return min(self.max_timeout, max(self.min_timeout, self.multiplier * p99))
+
+    def seed(self, queries: List[Tuple[str, str, str]], per_db: int = 20, max_workers: int = 16):
+        """
+        使用已知可执行的查询（如 gold SQL）为样本不足的数据库预热延迟模型。
+        :param queries: (db_id, db_path, query) 三元组列表；query 不是非空字符串的行会被跳过。
+        :param per_db: 每个数据库最多执行的查询条数。
+        """
+        from ..utils.db_utils import execute_sql_queries, is_valid_query
+
+        selected = []
+        per_db_counts: Dict[str, int] = {}
+        for db_id, db_path, query in queries:
+            # 缺失或为空的查询（如线上问题没有 gold SQL）不能用于预热
+            if not is_valid_query(query):
+                continue
+            needed = min(per_db, self.min_samples - self.sample_count(db_id))
+            if per_db_counts.get(db_id, 0) >= needed:
+                continue
+            per_db_counts[db_id] = per_db_counts.get(db_id, 0) + 1
+            selected.append((db_id, db_path, query))
+
+        if not selected:
+            return
+        logger.info(f"使用 {len(selected)} 条查询为 {len(per_db_counts)} 个数据库预热延迟模型。")
+        outcomes = execute_sql_queries(
+            [(db_path, query) for _, db_path, query in selected],
+            max_workers=max_workers,
+            timeout=self.max_timeout
+        )
+        self.record_batch(selected, outcomes)
+        self.save()
@@ -20,6 +20,13 @@ class PipelineManager:
                 default_model_name = "Qwen/Qwen2.5-Coder-7B-Instruct"
                 
                 self.configs = {
+                    "value_retrieval": { # 对应 retrieve_values 节点，不使用模型
+                        "latency_budget_ms": 200, # 单个问题的值检索时间上限
+                        "max_ngram": 8, # 检索用的最大词 n-gram 长度
+                        "skip_precomputed": True, # 已有预先计算 Example 的问题不做在线检索
+                        "max_open_indexes": 16, # 同时保持打开的数据库值索引数
+                        "cache_size": 10000 # (db_id, 问题) -> 检索结果 的缓存条目数
+                    },
                     "table_extraction": { # 对应 extract_related_table 节点
                         "model_name": default_model_name,
                         "lora_path": "./final_checkpoint/7b/table_extracter/qwen",
@@ -30,6 +37,10 @@ class PipelineManager:
                         "single": True,
                         "model_type": "causal"
                     },
+                    "path_routing": { # 对应 route_paths 节点，不使用模型
+                        "budget_fraction": 1.0, # 预算占"全部走 dual_merge"总代价的比例，1.0 即原始流程
+                        "route_costs": {"single": 2.0, "dual": 4.0, "dual_merge": 8.0} # 各路径的估计代价
+                    },
                     "sql_generation": { # 对应 candidate_generate 节点
                         "model_name": default_model_name,
                         "lora_path": "./final_checkpoint/7b/sql_generator/qwen",
@@ -48,7 +59,13 @@ class PipelineManager:
                         "top_p": None,
                         "n": 1,
                         "single": True,
-                        "model_type": "causal"
+                        "model_type": "causal",
+                        "batch_size": 8, # 每轮批量修复时单次 generate 的最大 prompt 数
+                        "max_refine_iterations": 3,
+                        "execution_workers": 16, # 每轮并行执行SQL的线程数
+                        "max_plan_cost": 1e9, # 执行前代价检查阈值（估计访问行数），None 表示不检查
+                        "shadow_timeout": 10.0, # 在采样影子数据库上校验SQL的超时（秒）
+                        "rule_repair": True # 调用模型前先尝试基于规则的确定性修复
                     },
                     "sql_selection": { # 对应 select_sql 节点，实际使用的是 merge_sql 模型
                         "model_name": "cycloneboy/CscSQL-Merge-Qwen2.5-Coder-7B-Instruct",
@@ -58,7 +75,8 @@ class PipelineManager:
                         "top_p": None,
                         "n": 1,
                         "single": True,
-                        "model_type": "causal"
+                        "model_type": "causal",
+                        "consensus_policy": "result" # 两个候选一致时跳过合并模型: "off" | "text" | "result"
                     },
                     # 如果有分类器，可以取消注释并配置
                     # "select_sql_classifier": {
@@ -83,6 +101,10 @@ class PipelineManager:
             raise ValueError(f"未找到节点 '{node_name}' 的模型配置。")
         return config
 
+    def get_node_option(self, node_name: str, key: str, default: Any = None) -> Any:
+        """获取指定节点配置中的非模型参数（如迭代次数、并发数），缺省时返回 default"""
+        return self.configs.get(node_name, {}).get(key, default)
+
     def get_last_node_result(self, execution_history: List[Dict[str, Any]], node_name: str) -> Dict[str, Any]:
         """从执行历史中获取指定节点的最后结果"""
         for record in reversed(execution_history):
@@ -1,10 +1,14 @@
+from .value_retrieval import retrieve_values
 from .table_extraction import extract_related_table
+from .path_routing import route_paths
 from .sql_generation import candidate_generate
 from .sql_refinement import refine_candidate
 from .sql_selection import select_sql
 
 __all__ = [
+    'retrieve_values',
     'extract_related_table', 
+    'route_paths',
     'candidate_generate', 
     'refine_candidate', 
     'select_sql'
@@ -0,0 +1,36 @@
+import logging
+from collections import Counter
+from typing import Any, Dict, List
+from ..core.task import Task
+from ..managers.pipeline_manager import PipelineManager
+from ..utils.path_router import predict_difficulty, allocate_routes, route_cost
+
+logger = logging.getLogger(__name__)
+
+def route_paths(tasks: List[Task], chat_model: Any = None) -> List[Dict[str, Any]]:
+    """
+    路径路由节点（不使用模型）。位于表抽取之后、候选SQL生成之前，
+    根据廉价的难度信号在全局预算下为每个问题选择 single / dual / dual_merge 路径。
+    :param tasks: 当前任务对象列表。
+    :param chat_model: 未使用，保持与其他节点一致的签名。
+    :return: 包含 route 与 difficulty 的字典列表。
+    """
+    pipeline_manager = PipelineManager()
+    budget_fraction = pipeline_manager.get_node_option("path_routing", "budget_fraction", 1.0)
+    route_costs = pipeline_manager.get_node_option("path_routing", "route_costs")
+
+    difficulties = [
+        predict_difficulty(task.question, getattr(task, 'related_tables', None), getattr(task, 'scaled_down_db_schema', None))
+        for task in tasks
+    ]
+    routes = allocate_routes(difficulties, budget_fraction, route_costs)
+
+    counts = Counter(routes)
+    logger.info(
+        f"路径路由（预算比例 {budget_fraction}）: single {counts['single']} 个，dual {counts['dual']} 个，"
+        f"dual_merge {counts['dual_merge']} 个，估计代价 {route_cost(routes, route_costs):.0f}。"
+    )
+    return [
+        {"question_id": task.question_id, "route": route, "difficulty": difficulty}
+        for task, route, difficulty in zip(tasks, routes, difficulties)
+    ]
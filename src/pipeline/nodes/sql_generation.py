@@ -3,21 +3,30 @@ from typing import Any, Dict, List
 from tqdm import tqdm # 导入 tqdm
 
 from ..utils.prompts import sql_generation_prompt, cscsql_generation_prompt, cscsql_system_prompt
+from ..utils.schema_utils import is_same_schema
+from ..utils.model_utils import is_greedy_model
 from ..core.task import Task # 导入 Task 类
 
 logger = logging.getLogger(__name__)
 
 def candidate_generate(tasks: List[Task], chat_model: Any) -> List[Dict[str, Any]]:
     """候选SQL生成节点"""
+    greedy = is_greedy_model(chat_model)
+    reused = 0
     results = []
     for task in tqdm(tasks, desc="生成候选SQL"): # 添加进度条
         # 生成第一个候选SQL（使用精简schema）
         ans1 = chat_model.get_ans(_build_messages(task.scaled_down_db_schema, task.question))
         candidate_sql_1 = _extract_ans(ans1)
 
-        # 生成第二个候选SQL（使用完整schema）
-        ans2 = chat_model.get_ans(_build_messages(task.database_schema, task.question))
-        candidate_sql_2 = _extract_ans(ans2)
+        # 生成第二个候选SQL（使用完整schema）；贪心解码下两条路径的输入相同时输出必然相同，直接复用；
+        # 被路由到 single 路径的问题也只生成第一条
+        if getattr(task, 'route', None) == "single" or (greedy and is_same_schema(task.scaled_down_db_schema, task.database_schema)):
+            candidate_sql_2 = candidate_sql_1
+            reused += 1
+        else:
+            ans2 = chat_model.get_ans(_build_messages(task.database_schema, task.question))
+            candidate_sql_2 = _extract_ans(ans2)
 
         response = {
             "question_id": task.question_id, # 确保包含 question_id
@@ -25,6 +34,8 @@ def candidate_generate(tasks: List[Task], chat_model: Any) -> List[Dict[str, Any
             "candidate_sql_2": candidate_sql_2
         }
         results.append(response)
+    if reused:
+        logger.info(f"single 路径或精简schema与完整schema相同，复用第一条路径的结果，节省 {reused}/{len(tasks)} 次生成。")
     return results
 
 def _build_messages(database_schema, question):
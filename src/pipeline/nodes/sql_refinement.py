@@ -1,111 +1,276 @@
+import os
 import logging
-import time
-from typing import Any, Dict, List, Tuple
+from typing import Any, Dict, List, Optional
 from ..core.task import Task
 from tqdm import tqdm # 导入 tqdm
 from ..managers.database_manager import DatabaseManager
+from ..managers.pipeline_manager import PipelineManager
+from ..managers.latency_manager import LatencyManager
 from ..utils.prompts import sql_refinement_prompt
-from ..utils.db_utils import execute_sql_query, convert_row_to_list
-import logging
-import time
+from ..utils.db_utils import execute_sql_queries, is_data_independent_error
+from ..utils.sql_repair import load_schema_catalog, rule_based_repair
+from ..utils.schema_utils import is_same_schema
+from ..utils.model_utils import is_greedy_model
 
 logger = logging.getLogger(__name__)
 
+class RefineSlot:
+    """一条候选SQL在精炼过程中的状态"""
+    def __init__(self, db_id: str, db_path: str, shadow_db_path: Optional[str], question: str, sql: str, db_schema: str):
+        self.db_id = db_id
+        self.db_path = db_path
+        self.shadow_db_path = shadow_db_path
+        self.question = question
+        self.db_schema = db_schema
+        self.sql = sql
+        self.error = ""
+        self.exec_results = []
+        self.exec_time = 0.0
+        self.rule_repairs = 0 # 基于规则的修复次数
+        self.model_repairs = 0 # 模型修复次数
+
+    def copy_state_from(self, other: 'RefineSlot'):
+        """复用另一个输入完全相同的槽位的精炼结果"""
+        self.sql = other.sql
+        self.error = other.error
+        self.exec_results = other.exec_results
+        self.exec_time = other.exec_time
+        self.rule_repairs = other.rule_repairs
+        self.model_repairs = other.model_repairs
+
 def refine_candidate(tasks: List[Task], chat_model: Any) -> List[Dict[str, Any]]:
     """
     精炼候选SQL。
+    按轮次在整个批次上推进：每轮并行执行所有仍失败的候选SQL，再将失败的SQL一次性批量送入模型修复，
+    直到没有失败的SQL或达到最大轮数。
     :param tasks: 当前任务对象列表。
     :param chat_model: 用于SQL精炼的聊天模型实例。
     :return: 包含精炼结果的字典列表。
     """
     database_manager = DatabaseManager()
-    max_refine_iterations = 3
+    pipeline_manager = PipelineManager()
+    max_refine_iterations = pipeline_manager.get_node_option("sql_refinement", "max_refine_iterations", 3)
+    execution_workers = pipeline_manager.get_node_option("sql_refinement", "execution_workers", 16)
+    max_plan_cost = pipeline_manager.get_node_option("sql_refinement", "max_plan_cost")
+    shadow_timeout = pipeline_manager.get_node_option("sql_refinement", "shadow_timeout", 10.0)
+    rule_repair = pipeline_manager.get_node_option("sql_refinement", "rule_repair", True)
     logger.info("开始精炼候选SQL。")
 
-    results = []
-    for task in tqdm(tasks, desc="精炼候选SQL"): # 添加进度条
-
+    # 每个任务的两条候选SQL各占一个槽位：第一个使用精简schema，第二个使用完整schema
+    slots = []
+    for task in tasks:
         db_path = database_manager.get_db_path(task.db_id)
-        question = task.question
+        shadow_db_path = database_manager.get_shadow_db_path(task.db_id)
+        slots.append(RefineSlot(task.db_id, db_path, shadow_db_path, task.question, task.candidate_sql_1, task.scaled_down_db_schema))
+        slots.append(RefineSlot(task.db_id, db_path, shadow_db_path, task.question, task.candidate_sql_2, task.database_schema))
 
-        # 精炼第一个候选SQL
-        refined_sql_1, sql1_final_error, sql1_exec_results, sql1_exec_time = _iterative_refine_sql(
-            db_path, question, task.candidate_sql_1, task.scaled_down_db_schema, max_refine_iterations, chat_model, "第一个候选SQL"
-        )
-        # 确保 exec_results 可序列化，递归处理
-        sql1_exec_results = convert_row_to_list(sql1_exec_results)
+    # 贪心解码下，schema与候选SQL都相同的两个槽位精炼结果必然相同，只精炼第一个；single 路径同样只精炼第一个
+    greedy = is_greedy_model(chat_model)
+    duplicated = {
+        2 * i + 1 for i, task in enumerate(tasks)
+        if getattr(task, 'route', None) == "single"
+        or (greedy and task.candidate_sql_1 == task.candidate_sql_2
+            and is_same_schema(task.scaled_down_db_schema, task.database_schema))
+    }
+    if duplicated:
+        logger.info(f"{len(duplicated)} 个任务为 single 路径或两条精炼路径输入相同，只精炼一次。")
+    _refine_in_rounds(
+        [slot for i, slot in enumerate(slots) if i not in duplicated],
+        max_refine_iterations, chat_model, execution_workers, max_plan_cost, shadow_timeout, rule_repair
+    )
+    for i in duplicated:
+        slots[i].copy_state_from(slots[i - 1])
+    LatencyManager().save()
 
-        # 精炼第二个候选SQL
-        refined_sql_2, sql2_final_error, sql2_exec_results, sql2_exec_time = _iterative_refine_sql(
-            db_path, question, task.candidate_sql_2, task.database_schema, max_refine_iterations, chat_model, "第二个候选SQL"
-        )
-        # 确保 exec_results 可序列化，递归处理
-        sql2_exec_results = convert_row_to_list(sql2_exec_results)
+    fixed = [
+        slot for i, slot in enumerate(slots)
+        if i not in duplicated and not slot.error and slot.rule_repairs + slot.model_repairs > 0
+    ]
+    if fixed:
+        model_free = sum(1 for slot in fixed if slot.model_repairs == 0)
+        logger.info(f"精炼修复成功 {len(fixed)} 条SQL，其中 {model_free} 条仅靠规则修复、未调用模型（占比 {model_free / len(fixed):.1%}）。")
 
+    results = []
+    for i, task in enumerate(tasks):
+        slot1, slot2 = slots[2 * i], slots[2 * i + 1]
         result = {
             "question_id": task.question_id,
-            "refined_sql_1": refined_sql_1,
-            "refined_sql_2": refined_sql_2,
-            "sql1_final_error": sql1_final_error,
-            "sql2_final_error": sql2_final_error,
-            "sql1_exec_results": sql1_exec_results,
-            "sql2_exec_results": sql2_exec_results,
-            "sql1_exec_time": sql1_exec_time,
-            "sql2_exec_time": sql2_exec_time,
+            "refined_sql_1": slot1.sql,
+            "refined_sql_2": slot2.sql,
+            "sql1_final_error": slot1.error,
+            "sql2_final_error": slot2.error,
+            # exec_results 已由 execute_sql_queries 编码为可序列化的元组行
+            "sql1_exec_results": slot1.exec_results,
+            "sql2_exec_results": slot2.exec_results,
+            "sql1_exec_time": slot1.exec_time,
+            "sql2_exec_time": slot2.exec_time,
             "status": "success"
         }
         results.append(result)
     return results
 
-def _iterative_refine_sql(
-    db_path: str,
-    question: str,
-    current_sql: str,
-    db_schema: str,
+def _refine_in_rounds(
+    slots: List[RefineSlot],
     max_refine_iterations: int,
     chat_model: Any,
-    sql_type_label: str # 用于日志输出，例如 "第一个候选SQL"
-) -> Tuple[str, str, List[Any], float]: # 修改返回类型以适应更通用的列表
+    execution_workers: int,
+    max_plan_cost: Optional[float] = None,
+    shadow_timeout: float = 10.0,
+    rule_repair: bool = True
+):
     """
-    辅助函数：迭代精炼SQL。
+    辅助函数：按轮次精炼SQL，结果直接写回各槽位。
+    失败的SQL先尝试基于规则的修复并立即重新执行，规则无法修复的才送入模型。
+    与逐条迭代的语义一致：最后一轮修复后的SQL不再执行，其错误信息保留为上一次执行的错误。
+    被代价检查拒绝的SQL与执行失败的SQL一样，携带拒绝原因进入修复。
+    配置了影子数据库的SQL先在影子库上校验，出现与数据量无关的错误时直接进入修复，不再访问完整数据库。
     """
-    final_sql = current_sql
-    final_error = ""
-    exec_results = []
-    exec_time = 0.0
-
-    for i in range(max_refine_iterations):
-        results, sql_exec_error, current_exec_time = execute_sql_query(db_path, final_sql)
-        exec_time = current_exec_time # 记录每次执行的时间
-
-        if not sql_exec_error: # 如果没有错误，则精炼成功，跳出循环
-            exec_results = results
-            final_error = ""
-            # logger.info(f"{sql_type_label}精炼成功，结果: {final_sql}")
+    latency_manager = LatencyManager()
+    pending = list(slots)
+    for round_idx in tqdm(range(max_refine_iterations), desc="精炼候选SQL"): # 添加进度条
+        if not pending:
             break
+
+        failing = _validate_on_shadow(pending, execution_workers, shadow_timeout)
+        rejected_ids = {id(slot) for slot in failing}
+        to_execute = [slot for slot in pending if id(slot) not in rejected_ids]
+
+        outcomes = execute_sql_queries(
+            [(slot.db_path, slot.sql) for slot in to_execute],
+            max_workers=execution_workers,
+            timeout=[latency_manager.get_timeout(slot.db_id) for slot in to_execute],
+            max_plan_cost=max_plan_cost
+        )
+        latency_manager.record_batch([(slot.db_id, slot.db_path, slot.sql) for slot in to_execute], outcomes)
+        for slot, (results, sql_exec_error, exec_time) in zip(to_execute, outcomes):
+            slot.exec_time = exec_time # 记录每次执行的时间
+            if not sql_exec_error: # 如果没有错误，则该SQL精炼完成
+                slot.exec_results = results
+                slot.error = ""
+            else:
+                slot.error = sql_exec_error
+                failing.append(slot)
+
+        if rule_repair:
+            failing = _rule_repair(failing, execution_workers, max_plan_cost)
+
+        logger.info(f"精炼第 {round_idx + 1}/{max_refine_iterations} 轮: 执行 {len(pending)} 条SQL，{len(failing)} 条失败并送入批量修复。")
+        pending = _batch_repair(failing, chat_model)
+
+def _validate_on_shadow(pending: List[RefineSlot], execution_workers: int, shadow_timeout: float) -> List[RefineSlot]:
+    """
+    在采样影子数据库上快速执行SQL。
+    影子库的行是完整数据库的子集，因此其上出现的语法、schema、类型等错误在完整数据库上同样会出现；
+    空结果或超时则无法说明问题（子集可能恰好缺少匹配的行），这些SQL仍交由完整数据库执行。
+    :return: 已在影子库上确认失败的槽位列表，其 error 已写入。
+    """
+    to_validate = [slot for slot in pending if slot.shadow_db_path]
+    if not to_validate:
+        return []
+
+    outcomes = execute_sql_queries(
+        [(slot.shadow_db_path, slot.sql) for slot in to_validate],
+        max_workers=execution_workers,
+        timeout=shadow_timeout
+    )
+    rejected = []
+    for slot, (_, sql_exec_error, _) in zip(to_validate, outcomes):
+        if is_data_independent_error(sql_exec_error):
+            slot.error = sql_exec_error
+            slot.exec_time = 0.0 # 未在完整数据库上执行，不保留上一轮的执行时间
+            rejected.append(slot)
+    logger.info(f"影子数据库校验: {len(to_validate)} 条SQL中 {len(rejected)} 条直接判定失败，未访问完整数据库。")
+    return rejected
+
+def _rule_repair(
+    failing: List[RefineSlot],
+    execution_workers: int,
+    max_plan_cost: Optional[float] = None,
+    max_passes: int = 3
+) -> List[RefineSlot]:
+    """
+    对失败的SQL做基于规则的修复（标识符引号、模糊匹配表名列名、限定歧义列），修复后立即在完整数据库上重新执行。
+    一条SQL可能同时存在多处机械性错误，因此最多连续修复 max_passes 次。
+    :return: 规则无法修复、仍需送入模型的槽位列表。
+    """
+    database_manager = DatabaseManager()
+    latency_manager = LatencyManager()
+    if not database_manager.db_schema_dir:
+        return failing
+
+    still_failing = []
+    candidates = failing
+    passes = 0
+    while candidates and passes < max_passes:
+        passes += 1
+        repaired = []
+        for slot in candidates:
+            catalog = load_schema_catalog(os.path.join(database_manager.db_schema_dir, f"{slot.db_id}_schema.json"))
+            fixed_sql = rule_based_repair(slot.sql, slot.error, catalog)
+            if fixed_sql is None:
+                still_failing.append(slot)
+            else:
+                slot.sql = fixed_sql
+                slot.rule_repairs += 1
+                repaired.append(slot)
+
+        candidates = []
+        if not repaired:
+            break
+        outcomes = execute_sql_queries(
+            [(slot.db_path, slot.sql) for slot in repaired],
+            max_workers=execution_workers,
+            timeout=[latency_manager.get_timeout(slot.db_id) for slot in repaired],
+            max_plan_cost=max_plan_cost
+        )
+        latency_manager.record_batch([(slot.db_id, slot.db_path, slot.sql) for slot in repaired], outcomes)
+        for slot, (results, sql_exec_error, exec_time) in zip(repaired, outcomes):
+            slot.exec_time = exec_time
+            if not sql_exec_error:
+                slot.exec_results = results
+                slot.error = ""
+            else:
+                slot.error = sql_exec_error
+                candidates.append(slot)
+    still_failing.extend(candidates)
+
+    if len(still_failing) < len(failing):
+        logger.info(f"规则修复: {len(failing)} 条失败SQL中 {len(failing) - len(still_failing)} 条无需调用模型即修复成功。")
+    return still_failing
+
+def _batch_repair(failing: List[RefineSlot], chat_model: Any) -> List[RefineSlot]:
+    """
+    将本轮所有失败的SQL作为一次批量调用送入模型修复。
+    :return: 修复后需要在下一轮重新执行的槽位列表。
+    """
+    if not failing:
+        return []
+
+    prompts = [
+        sql_refinement_prompt.format(
+            database_schema=slot.db_schema,
+            question=slot.question,
+            candidate_sql=slot.sql,
+            error_message=slot.error
+        )
+        for slot in failing
+    ]
+    try:
+        if hasattr(chat_model, 'get_ans_batch') and callable(chat_model.get_ans_batch):
+            answers = chat_model.get_ans_batch(prompts)
         else:
-            # logger.info(f"精炼{sql_type_label} (迭代 {i+1}/{max_refine_iterations}): {final_sql}")
-            final_error = sql_exec_error
-            # logger.warning(f"{sql_type_label}执行错误: {final_error}")
-            prompt = sql_refinement_prompt.format(
-                database_schema=db_schema,
-                question=question,
-                candidate_sql=final_sql,
-                error_message=final_error
-            )
-            try:
-                ans = chat_model.get_ans(prompt)
-                final_sql = _extract_ans(ans)
-            except Exception as model_e:
-                logger.error(f"调用模型时发生错误: {str(model_e)}")
-                final_sql = "Error during model call."
-                final_error = f"Model call error: {str(model_e)}"
-                break # 发生模型错误，停止精炼
-    else: # 如果循环结束仍未成功，则使用最后一次精炼的结果
-        pass
-        # logger.warning(f"{sql_type_label}达到最大精炼次数，最终结果: {final_sql}")
-
-    return final_sql, final_error, exec_results, exec_time
+            answers = [chat_model.get_ans(prompt) for prompt in prompts]
+    except Exception as model_e:
+        logger.error(f"调用模型时发生错误: {str(model_e)}")
+        for slot in failing: # 发生模型错误，停止精炼
+            slot.sql = "Error during model call."
+            slot.error = f"Model call error: {str(model_e)}"
+        return []
+
+    for slot, ans in zip(failing, answers):
+        slot.sql = _extract_ans(ans)
+        slot.model_repairs += 1
+    return failing
 
 def _extract_ans(ans):
     try:
@@ -1,10 +1,13 @@
+import re
+import hashlib
 import logging
-from typing import Any, Dict, List, Iterable # 导入 Iterable
+from typing import Any, Dict, List, Iterable, Optional # 导入 Iterable
 from ..managers.pipeline_manager import PipelineManager
 from ..managers.database_manager import DatabaseManager
+from ..managers.latency_manager import LatencyManager
 from ..utils.model_utils import model_chose
 from ..utils.prompts import sql_selection_prompt, cscsql_merge_prompt, cscsql_system_prompt
-from ..utils.db_utils import execute_sql_query, convert_row_to_list # 导入 convert_row_to_list
+from ..utils.db_utils import execute_sql_query
 from ..core.task import Task
 from tqdm import tqdm # 导入 tqdm
 
@@ -19,10 +22,13 @@ def select_sql(tasks: List[Task], chat_model: Any) -> List[Dict[str, Any]]:
     :return: 包含选择结果的字典列表。
     """
     database_manager = DatabaseManager()
+    # 两个候选达成一致时跳过合并模型："off" 关闭；"text" 仅比较规范化后的SQL文本；"result" 另外比较执行结果指纹
+    consensus_policy = PipelineManager().get_node_option("sql_selection", "consensus_policy", "result")
 
     logger.info("开始选择最终SQL。")
 
     results = []
+    saved_merge_calls = 0
     for task in tqdm(tasks, desc="选择最终SQL"): # 添加进度条
         refined_sql_1 = task.refined_sql_1
         refined_sql_2 = task.refined_sql_2
@@ -36,6 +42,33 @@ def select_sql(tasks: List[Task], chat_model: Any) -> List[Dict[str, Any]]:
         sql1_exec_time = task.sql1_exec_time
         sql2_exec_time = task.sql2_exec_time
 
+        route = getattr(task, 'route', None) or "dual_merge"
+        if route == "single": # 只有一条路径，直接采用
+            selected_sql = refined_sql_1
+        elif route == "dual": # 两条路径，按规则选择，不调用合并模型
+            selected_sql = _fallback_sql_selection(
+                refined_sql_1, refined_sql_2,
+                sql1_final_error, sql2_final_error,
+                sql1_exec_results, sql2_exec_results,
+                sql1_exec_time, sql2_exec_time
+            )
+        else:
+            selected_sql = _consensus_sql(
+                consensus_policy,
+                refined_sql_1, refined_sql_2,
+                sql1_final_error, sql2_final_error,
+                sql1_exec_results, sql2_exec_results,
+                sql1_exec_time, sql2_exec_time
+            )
+        if selected_sql is not None:
+            saved_merge_calls += 1
+            results.append({
+                "question_id": task.question_id,
+                "selected_sql": selected_sql,
+                "status": "success"
+            })
+            continue
+
         try:
             selected_sql = _merge_sql_with_llm(
                 chat_model, task, database_manager,
@@ -59,8 +92,53 @@ def select_sql(tasks: List[Task], chat_model: Any) -> List[Dict[str, Any]]:
             "status": "success"
         }
         results.append(result)
+    LatencyManager().save()
+    if tasks:
+        logger.info(f"因路由或候选SQL一致而跳过合并模型 {saved_merge_calls}/{len(tasks)} 次（一致性策略: {consensus_policy}）。")
     return results
 
+# 单引号字符串和双引号记号都原样保留：SQLite 在没有同名列时把 "Alice" 当作字符串字面量，大小写不能折叠
+_STRING_LITERAL = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*")""")
+
+def _normalize_sql(sql: str) -> str:
+    """规范化SQL文本：引号内的记号之外统一小写、去掉反引号标识符的引号、合并空白、去掉结尾分号"""
+    parts = _STRING_LITERAL.split(sql.strip().rstrip(';'))
+    for i in range(0, len(parts), 2):
+        part = re.sub(r'`(\w+)`', r'\1', parts[i].lower())
+        part = re.sub(r'\s*([(),=<>!+\-*/])\s*', r'\1', part)
+        parts[i] = re.sub(r'\s+', ' ', part)
+    return "".join(parts).strip()
+
+def _result_fingerprint(sql: str, exec_results: Any) -> str:
+    """执行结果的指纹：SQL带 ORDER BY 时保留行顺序，否则与行顺序无关"""
+    rows = [tuple(row) if isinstance(row, (list, tuple)) else (row,) for row in exec_results]
+    if not re.search(r'\border\s+by\b', sql, re.IGNORECASE):
+        rows.sort(key=repr)
+    return hashlib.sha1(repr(rows).encode('utf-8')).hexdigest()
+
+def _consensus_sql(
+    policy: str,
+    refined_sql_1, refined_sql_2,
+    sql1_final_error, sql2_final_error,
+    sql1_exec_results, sql2_exec_results,
+    sql1_exec_time, sql2_exec_time
+) -> Optional[str]:
+    """
+    两个候选SQL都执行成功且达成一致（规范化文本相同，或执行结果指纹相同）时直接返回其中执行更快的一个，
+    即 _fallback_sql_selection 中的"情况3"；否则返回 None，交由合并模型处理。
+    """
+    if policy == "off" or sql1_final_error or sql2_final_error:
+        return None
+    agreed = _normalize_sql(refined_sql_1) == _normalize_sql(refined_sql_2)
+    if not agreed and policy == "result":
+        try:
+            agreed = _result_fingerprint(refined_sql_1, sql1_exec_results) == _result_fingerprint(refined_sql_2, sql2_exec_results)
+        except TypeError: # 结果不可迭代（例如被保存为字符串），无法比较
+            agreed = False
+    if not agreed:
+        return None
+    return refined_sql_1 if sql1_exec_time <= sql2_exec_time else refined_sql_2
+
 def _merge_sql_with_llm(
     chat_model: Any, task: Task, database_manager,
     refined_sql_1, refined_sql_2, 
@@ -93,10 +171,11 @@ def _merge_sql_with_llm(
     # logger.info(f"LLM merged SQL: {merged_sql}")
 
     db_path = database_manager.get_db_path(task.db_id)
-    results, sql_exec_error, current_exec_time = execute_sql_query(db_path, merged_sql)
-    
-    # 确保 results 可序列化
-    results = convert_row_to_list(results)
+    latency_manager = LatencyManager()
+    results, sql_exec_error, current_exec_time = execute_sql_query(
+        db_path, merged_sql, timeout=latency_manager.get_timeout(task.db_id)
+    )
+    latency_manager.record(task.db_id, current_exec_time, sql_exec_error)
 
     if sql_exec_error:
         logger.info("merged_sql执行失败，降级为选择任务。")
@@ -109,6 +188,15 @@ def _merge_sql_with_llm(
     else:
         return merged_sql
 
+def _rows_as_lists(rows):
+    """执行结果的行是元组，展示给模型时仍按列表格式输出，保持提示词格式不变"""
+    if isinstance(rows, (str, bytes)):
+        return rows
+    try:
+        return [list(row) if isinstance(row, tuple) else row for row in rows]
+    except TypeError:
+        return rows
+
 def truncated_str(sql1_exec_results, n):
     """
     返回 sql1_exec_results 的字符串表示：
@@ -122,18 +210,18 @@ def truncated_str(sql1_exec_results, n):
     # 优先尝试使用 len 和切片（适用于 list/tuple/str 等）
     try:
         if len(sql1_exec_results) <= n:
-            return str(sql1_exec_results)
+            return str(_rows_as_lists(sql1_exec_results))
         # 若支持切片，则取前 n 项
         try:
             prefix = sql1_exec_results[:n]
-            return str(prefix) + "..."
+            return str(_rows_as_lists(prefix)) + "..."
         except Exception:
             # 回退：构造前 n 项的列表
             prefix = []
             it = iter(sql1_exec_results)
             for _ in range(n):
                 prefix.append(next(it))
-            return str(prefix) + "..."
+            return str(_rows_as_lists(prefix)) + "..."
     except Exception:
         # 对于没有 len 的可迭代对象，取 n+1 项判断是否需要 "..."
         if isinstance(sql1_exec_results, Iterable):
@@ -143,8 +231,8 @@ def truncated_str(sql1_exec_results, n):
                 try:
                     prefix.append(next(it))
                 except StopIteration:
-                    return str(prefix)
-            return str(prefix[:n]) + "..."
+                    return str(_rows_as_lists(prefix))
+            return str(_rows_as_lists(prefix[:n])) + "..."
         # 其它情况直接返回完整字符串
         return str(sql1_exec_results)
 
@@ -30,7 +30,9 @@ def extract_related_table(tasks: List[Task], chat_model: Any) -> List[Dict[str,
         
         scaled_down_schema = ""
         if os.path.exists(db_schema_file):
-            scaled_down_schema = build_database_schema(db_schema_file, related_tables, task.question_id)
+            scaled_down_schema = build_database_schema(
+                db_schema_file, related_tables, task.question_id, getattr(task, 'value_examples', None)
+            )
         else:
             import logging
             logging.warning(f"数据库schema文件不存在: {db_schema_file}")
@@ -0,0 +1,79 @@
+import os
+import time
+import logging
+from typing import Any, Dict, List
+from tqdm import tqdm
+from ..core.task import Task
+from ..managers.database_manager import DatabaseManager
+from ..managers.pipeline_manager import PipelineManager
+from ..utils.schema_utils import quote_field, build_database_schema, has_precomputed_examples
+from ..utils.value_index import get_value_retriever
+
+logger = logging.getLogger(__name__)
+
+def retrieve_values(tasks: List[Task], chat_model: Any = None) -> List[Dict[str, Any]]:
+    """
+    在线值检索节点（不使用模型）。位于表抽取之前：对没有预先计算 Example 的问题（例如线上新问题），
+    在延迟预算内检索常驻的数据库值索引，把命中的值作为 Example 注入完整schema，
+    并通过 value_examples 传给表抽取节点用于构建精简schema。
+    :param tasks: 当前任务对象列表。
+    :param chat_model: 未使用，保持与其他节点一致的签名。
+    :return: 包含 value_examples 与更新后 database_schema 的字典列表；未检索到值的问题只返回 question_id。
+    """
+    database_manager = DatabaseManager()
+    pipeline_manager = PipelineManager()
+    if not database_manager.db_content_index_dir or not database_manager.db_schema_dir:
+        logger.info("未配置数据库值索引目录，跳过在线值检索。")
+        return [{"question_id": task.question_id} for task in tasks]
+
+    latency_budget = pipeline_manager.get_node_option("value_retrieval", "latency_budget_ms", 200) / 1000
+    max_ngram = pipeline_manager.get_node_option("value_retrieval", "max_ngram", 8)
+    skip_precomputed = pipeline_manager.get_node_option("value_retrieval", "skip_precomputed", True)
+    retriever = get_value_retriever(
+        database_manager.db_content_index_dir,
+        pipeline_manager.get_node_option("value_retrieval", "max_open_indexes", 16),
+        pipeline_manager.get_node_option("value_retrieval", "cache_size", 10000)
+    )
+
+    results = []
+    skipped, injected, elapsed = 0, 0, 0.0
+    stats_before = retriever.stats()
+    for task in tqdm(tasks, desc="在线值检索"):
+        db_schema_file = os.path.join(database_manager.db_schema_dir, f"{task.db_id}_schema.json")
+        if skip_precomputed and has_precomputed_examples(db_schema_file, task.question_id):
+            skipped += 1
+            results.append({"question_id": task.question_id})
+            continue
+
+        start = time.monotonic()
+        values = retriever.retrieve(task.db_id, task.question, latency_budget, max_ngram)
+        elapsed += time.monotonic() - start
+        if not values:
+            results.append({"question_id": task.question_id})
+            continue
+
+        examples = _to_schema_examples(values)
+        result = {"question_id": task.question_id, "value_examples": examples}
+        database_schema = build_database_schema(db_schema_file, None, task.question_id, examples)
+        if database_schema:
+            result["database_schema"] = database_schema
+            injected += 1
+        results.append(result)
+
+    searched = len(tasks) - skipped
+    stats = retriever.stats()
+    logger.info(
+        f"在线值检索: {searched} 个问题检索（缓存命中 {stats['cache_hits'] - stats_before['cache_hits']} 次，"
+        f"超出延迟预算 {stats['budget_exhausted'] - stats_before['budget_exhausted']} 次，平均 {elapsed / max(searched, 1) * 1000:.1f} ms），"
+        f"{injected} 个问题注入了 Example，{skipped} 个问题已有预先计算的 Example。"
+    )
+    return results
+
+def _to_schema_examples(values: Dict[str, List[str]]) -> Dict[str, Dict[str, List[str]]]:
+    """把 {表名.列名: [值]} 转换为与schema文件键一致的 {表名: {列名: [值]}}"""
+    examples: Dict[str, Dict[str, List[str]]] = {}
+    for full_column_name, column_values in values.items():
+        table_name, _, column_name = full_column_name.partition('.')
+        if column_name:
+            examples.setdefault(quote_field(table_name), {})[quote_field(column_name)] = column_values
+    return examples
@@ -1,11 +1,38 @@
-from .model_utils import model_chose
-from .schema_utils import quote_field, build_database_schema
-from .prompts import table_extraction_prompt, sql_generation_prompt, sql_refinement_prompt, sql_selection_prompt
-from .db_utils import execute_sql_query
+import importlib
+
+# 导出项按需导入：model_utils 依赖 torch/transformers，导入 pipeline.utils 下的其他模块时不应加载它们
+_EXPORTS = {
+    'model_chose': '.model_utils',
+    'quote_field': '.schema_utils',
+    'build_database_schema': '.schema_utils',
+    'is_same_schema': '.schema_utils',
+    'SchemaCatalog': '.schema_catalog',
+    'get_schema_catalog': '.schema_catalog',
+    'ExampleStore': '.example_store',
+    'get_example_store': '.example_store',
+    'OnlineValueRetriever': '.value_index',
+    'get_value_retriever': '.value_index',
+    'table_extraction_prompt': '.prompts',
+    'sql_generation_prompt': '.prompts',
+    'sql_refinement_prompt': '.prompts',
+    'sql_selection_prompt': '.prompts',
+    'execute_sql_query': '.db_utils',
+    'execute_sql_queries': '.db_utils',
+    'estimate_query_cost': '.query_plan',
+    'check_query_cost': '.query_plan',
+}
 
 __all__ = [
     'model_chose',  
-    'quote_field', 'build_database_schema',
+    'quote_field', 'build_database_schema', 'is_same_schema',
+    'SchemaCatalog', 'get_schema_catalog', 'ExampleStore', 'get_example_store',
+    'OnlineValueRetriever', 'get_value_retriever',
     'table_extraction_prompt', 'sql_generation_prompt', 'sql_refinement_prompt', 'sql_selection_prompt',
-    'execute_sql_query'
-]
\ No newline at end of file
+    'execute_sql_query', 'execute_sql_queries',
+    'estimate_query_cost', 'check_query_cost'
+]
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
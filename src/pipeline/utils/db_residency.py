@@ -0,0 +1,155 @@
+import os
+import sqlite3
+import logging
+import threading
+import itertools
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+class ResidentDatabase:
+    """常驻内存的数据库副本：keeper 连接维持共享缓存内存库的生命周期"""
+    def __init__(self, uri: str, keeper: sqlite3.Connection, size: int, mtime: float):
+        self.uri = uri
+        self.keeper = keeper
+        self.size = size
+        self.mtime = mtime
+
+class DatabaseResidency:
+    """
+    将频繁访问的 SQLite 数据库通过 backup API 复制到共享缓存的内存库中，按总字节预算做 LRU 淘汰。
+    connect() 返回只读连接：已常驻的数据库连接到内存副本，其余连接到磁盘文件。
+    """
+    _ids = itertools.count()
+
+    def __init__(self, budget_bytes: int, promote_after: int = 2):
+        """
+        :param budget_bytes: 所有常驻数据库的总字节预算。超过预算的单个数据库不会常驻。
+        :param promote_after: 同一数据库被访问多少次后复制到内存。
+        """
+        self.budget_bytes = budget_bytes
+        self.promote_after = max(1, promote_after)
+        self._lock = threading.Lock()
+        self._resident: "OrderedDict[str, ResidentDatabase]" = OrderedDict()
+        self._request_counts: Dict[str, int] = {}
+        # 正在复制到内存的数据库，复制完成前对它的请求直接使用磁盘文件
+        self._loading: Set[str] = set()
+        self._resident_bytes = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.evictions = 0
+
+    def _load(self, db_path: str, size: int, mtime: float) -> ResidentDatabase:
+        uri = f"file:msrsql_resident_{next(self._ids)}?mode=memory&cache=shared"
+        keeper = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        source = sqlite3.connect(_readonly_uri(db_path), uri=True)
+        try:
+            source.backup(keeper)
+        finally:
+            source.close()
+        return ResidentDatabase(uri, keeper, size, mtime)
+
+    def _evict(self, db_path: str):
+        entry = self._resident.pop(db_path)
+        # 已发出的连接仍可继续使用该内存库，全部关闭后内存才会被释放
+        entry.keeper.close()
+        self._resident_bytes -= entry.size
+        self.evictions += 1
+
+    def _resolve(self, db_path: str) -> Optional[str]:
+        """返回 db_path 对应内存副本的 URI；不应常驻时返回 None"""
+        try:
+            stat = os.stat(db_path)
+        except OSError:
+            return None
+
+        with self._lock:
+            entry = self._resident.get(db_path)
+            if entry is not None:
+                if entry.mtime == stat.st_mtime:
+                    self._resident.move_to_end(db_path)
+                    return entry.uri
+                self._evict(db_path) # 磁盘文件已变化，丢弃旧副本
+
+            count = self._request_counts.get(db_path, 0) + 1
+            self._request_counts[db_path] = count
+            if count < self.promote_after or stat.st_size > self.budget_bytes or db_path in self._loading:
+                return None
+            self._loading.add(db_path)
+
+        # 复制在锁外进行：复制大数据库期间，其他数据库（以及本数据库的并发请求，改用磁盘文件）不会被阻塞
+        try:
+            entry = self._load(db_path, stat.st_size, stat.st_mtime)
+        except sqlite3.Error as e:
+            logger.warning(f"无法将数据库 {db_path} 复制到内存: {e}")
+            with self._lock:
+                self._loading.discard(db_path)
+            return None
+
+        with self._lock:
+            self._loading.discard(db_path)
+            while self._resident and self._resident_bytes + entry.size > self.budget_bytes:
+                self._evict(next(iter(self._resident)))
+            self._resident[db_path] = entry
+            self._resident_bytes += entry.size
+            return entry.uri
+
+    def connect(self, db_path: str) -> sqlite3.Connection:
+        """返回 db_path 的只读连接"""
+        uri = self._resolve(db_path)
+        with self._lock:
+            if uri is None:
+                self.disk_hits += 1
+            else:
+                self.memory_hits += 1
+        if uri is None:
+            return sqlite3.connect(_readonly_uri(db_path), uri=True)
+        conn = sqlite3.connect(uri, uri=True)
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "resident_databases": len(self._resident),
+                "resident_bytes": self._resident_bytes,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "evictions": self.evictions,
+            }
+
+    def close(self):
+        with self._lock:
+            for db_path in list(self._resident):
+                self._evict(db_path)
+
+def _readonly_uri(db_path: str) -> str:
+    """磁盘数据库文件的只读 URI（路径中的特殊字符已转义）"""
+    return f"{Path(db_path).absolute().as_uri()}?mode=ro"
+
+_default_residency: Optional[DatabaseResidency] = None
+
+def init_db_residency(budget_mb: int, promote_after: int = 2) -> DatabaseResidency:
+    """启动全局数据库常驻层；之后 connect_database 会优先返回内存副本的连接"""
+    global _default_residency
+    if _default_residency is None:
+        _default_residency = DatabaseResidency(budget_mb * 1024 * 1024, promote_after)
+    return _default_residency
+
+def get_db_residency() -> Optional[DatabaseResidency]:
+    return _default_residency
+
+def connect_database(db_path: str) -> sqlite3.Connection:
+    """获取数据库连接：启用常驻层时可能返回内存副本的只读连接，否则直接连接磁盘文件"""
+    if _default_residency is not None:
+        return _default_residency.connect(db_path)
+    return sqlite3.connect(db_path)
+
+def shutdown_db_residency():
+    global _default_residency
+    if _default_residency is not None:
+        logger.info(f"数据库常驻层统计: {_default_residency.stats()}")
+        _default_residency.close()
+        _default_residency = None
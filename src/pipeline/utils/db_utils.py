@@ -2,24 +2,57 @@ import sqlite3
 import logging
 import time
 import threading
-from typing import Any, List, Tuple, Dict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Tuple, Dict, Optional, Union
+from .query_plan import check_query_cost
+from .db_residency import connect_database
+from .row_encoding import encode_row
+from .sql_sandbox import get_sandbox_pool
 
 logger = logging.getLogger(__name__)
 
-# 辅助函数：递归地将包含 Row 对象的列表或嵌套结构转换为包含列表的列表，以便 JSON 序列化。
-def convert_row_to_list(data: Any) -> Any:
+# 与数据量无关的错误（语法、schema、函数误用等）的特征片段，均为 SQLite 的原始错误信息。
+# 采用白名单：无法打开数据库、数据库被锁定、被中断等环境错误以及超时、资源超限都不在其列
+_DATA_INDEPENDENT_ERROR_MARKERS = (
+    "no such table",
+    "no such column",
+    "no such function",
+    "no such collation sequence",
+    "syntax error",
+    "incomplete input",
+    "unrecognized token",
+    "ambiguous column name",
+    "misuse of aggregate",
+    "misuse of aliased aggregate",
+    "misuse of window function",
+    "wrong number of arguments to function",
+    "aggregate functions are not allowed",
+    "a group by clause is required before having",
+    "do not have the same number of result columns",
+    "order by term out of range",
+    "group by term out of range",
+    "sub-select returns",
+    "row value misused",
+    "no tables specified",
+    "you can only execute one statement at a time",
+)
+
+def is_data_independent_error(error: str) -> bool:
     """
-    递归地将包含 Row 对象的列表或嵌套结构转换为包含列表的列表，以便 JSON 序列化。
+    判断错误是否与数据量无关（语法错误、不存在的表或列、聚合函数误用等）。
+    这类错误在数据子集上出现时，在完整数据库上同样会出现；不在白名单中的错误一律视为可能与数据或环境有关。
     """
-    if isinstance(data, list):
-        return [convert_row_to_list(item) for item in data]
-    elif hasattr(data, '__iter__') and not isinstance(data, (str, bytes, dict)):
-        # 如果是可迭代对象（如 Row），但不是字符串、字节或字典，则转换为列表
-        return list(data)
-    elif isinstance(data, dict):
-        return {k: convert_row_to_list(v) for k, v in data.items()}
-    else:
-        return data
+    if not error:
+        return False
+    error = error.lower()
+    return any(marker in error for marker in _DATA_INDEPENDENT_ERROR_MARKERS)
+
+# 查询不是非空字符串时（如数据集中缺失的 gold SQL 为 NaN）返回的错误
+INVALID_QUERY_ERROR = "Invalid SQL query: expected a non-empty string."
+
+def is_valid_query(query: Any) -> bool:
+    """判断查询是否为可执行的非空字符串"""
+    return isinstance(query, str) and bool(query.strip())
 
 # 用于在线程间传递结果的辅助类
 class QueryResult:
@@ -34,8 +67,9 @@ def _query_worker(db_path: str, query: str, result_obj: QueryResult):
     """
     conn = None
     try:
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row
+        conn = connect_database(db_path)
+        # 结果为可直接 JSON 序列化的元组行
+        conn.row_factory = encode_row
         cursor = conn.cursor()
 
         start_time = time.time()
@@ -56,18 +90,40 @@ def _query_worker(db_path: str, query: str, result_obj: QueryResult):
         if conn:
             conn.close()
 
-def execute_sql_query(db_path: str, query: str, timeout: float = 300.0) -> Tuple[List[Tuple[Any, ...]], str, float]:
+def execute_sql_query(
+    db_path: str,
+    query: str,
+    timeout: float = 300.0,
+    max_plan_cost: Optional[float] = None
+) -> Tuple[List[Tuple[Any, ...]], str, float]:
     """
     执行SQL查询并返回结果、错误信息和执行时间，支持超时机制。
     :param db_path: 数据库文件的路径。
     :param query: 要执行的SQL查询。
     :param timeout: 查询时间阈值（秒）。如果查询时间超过此值，将返回超时错误。
+    :param max_plan_cost: 执行前代价检查的阈值（EXPLAIN QUERY PLAN 估计的访问行数）。
+                          为 None 时不做检查；超过阈值的查询不会执行，直接返回描述性错误。
     :return: 一个元组，包含查询结果（如果成功）、错误信息（如果失败）和执行时间。
              如果成功且有结果，返回 (results, "", execution_time)。
              如果成功但结果为空，返回 ([], "Empty result", execution_time)。
              如果失败，返回 ([], error_message, execution_time)。
              如果超时，返回 ([], "Query timed out.", execution_time)。
+             如果被代价检查拒绝，返回 ([], rejection_message, 0.0)。
+             如果查询不是非空字符串，返回 ([], INVALID_QUERY_ERROR, 0.0)。
     """
+    if not is_valid_query(query):
+        return [], INVALID_QUERY_ERROR, 0.0
+
+    rejection = check_query_cost(db_path, query, max_plan_cost)
+    if rejection:
+        logger.warning(f"SQL查询未通过代价检查: {query}")
+        return [], rejection, 0.0
+
+    # 已启动沙箱进程池时，在受资源限制的独立进程中执行
+    sandbox_pool = get_sandbox_pool()
+    if sandbox_pool is not None:
+        return sandbox_pool.execute(db_path, query, timeout)
+
     result_obj = QueryResult()
     query_thread = threading.Thread(target=_query_worker, args=(db_path, query, result_obj))
     query_thread.start()
@@ -86,3 +142,50 @@ def execute_sql_query(db_path: str, query: str, timeout: float = 300.0) -> Tuple
         if result_obj.error:
             return [], result_obj.error, result_obj.execution_time
         return result_obj.results, "", result_obj.execution_time
+
+def execute_sql_queries(
+    queries: List[Tuple[str, str]],
+    max_workers: int = 16,
+    timeout: Union[float, List[float]] = 300.0,
+    max_plan_cost: Optional[float] = None
+) -> List[Tuple[List[Tuple[Any, ...]], str, float]]:
+    """
+    并行执行一批SQL查询。同一数据库上文本相同的查询只执行一次，结果分发给所有相同的请求。
+    :param queries: (db_path, query) 二元组列表。
+    :param max_workers: 并行执行的最大线程数。
+    :param timeout: 单条查询的时间阈值（秒），含义同 execute_sql_query；也可传入与 queries 等长的列表，逐条指定。
+      重复的查询按其中最大的阈值执行。
+    :param max_plan_cost: 执行前代价检查的阈值，含义同 execute_sql_query。
+    :return: 与 queries 顺序一致的 execute_sql_query 返回值列表。重复查询共享同一结果对象，调用方不应原地修改。
+             不是非空字符串的查询不会执行，返回 ([], INVALID_QUERY_ERROR, 0.0)。
+    """
+    if not queries:
+        return []
+    timeouts = timeout if isinstance(timeout, list) else [timeout] * len(queries)
+
+    results: List[Tuple[List[Tuple[Any, ...]], str, float]] = [None] * len(queries)
+
+    # 按 (db_path, 去除首尾空白的SQL) 分组，记录每组的下标；不是非空字符串的查询直接返回错误，不参与分组
+    groups: Dict[Tuple[str, str], List[int]] = {}
+    for i, (db_path, query) in enumerate(queries):
+        if is_valid_query(query):
+            groups.setdefault((db_path, query.strip()), []).append(i)
+        else:
+            results[i] = ([], INVALID_QUERY_ERROR, 0.0)
+    distinct = [(key, max(timeouts[i] for i in indices)) for key, indices in groups.items()]
+    requested = sum(len(indices) for indices in groups.values())
+    if not distinct:
+        return results
+    if len(distinct) < requested:
+        logger.info(f"批量执行SQL: {requested} 条请求去重后执行 {len(distinct)} 条，去重率 {1 - len(distinct) / requested:.1%}")
+
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(distinct)))) as executor:
+        distinct_results = list(executor.map(
+            lambda item: execute_sql_query(item[0][0], item[0][1], item[1], max_plan_cost),
+            distinct
+        ))
+
+    for indices, result in zip(groups.values(), distinct_results):
+        for i in indices:
+            results[i] = result
+    return results
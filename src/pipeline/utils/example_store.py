@@ -0,0 +1,106 @@
+import os
+import json
+import sqlite3
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 旁路存储与 {db_id}_schema.json 放在同一目录下
+EXAMPLE_STORE_FILENAME = "examples.sqlite"
+SCHEMA_FILE_SUFFIX = "_schema.json"
+
+class ExampleStore:
+    """
+    问题级 Example 值的旁路存储（SQLite），按 (db_id, question_id) 建索引。
+    schema文件只保存与问题无关的表结构，体积不随数据集中的问题数增长；
+    渲染某个问题的schema时只按主键读取该问题的几行记录。
+    """
+    def __init__(self, path: str, readonly: bool = False):
+        """
+        :param path: 存储文件路径。
+        :param readonly: 只读打开（推理阶段使用），此时文件必须已存在。
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        if readonly:
+            self._conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS examples ("
+                "db_id TEXT NOT NULL, question_id TEXT NOT NULL, table_name TEXT NOT NULL, "
+                "column_name TEXT NOT NULL, example_values TEXT NOT NULL, "
+                "PRIMARY KEY (db_id, question_id, table_name, column_name)) WITHOUT ROWID"
+            )
+            self._conn.commit()
+
+    def put_many(self, rows: Iterable[Tuple[str, Any, str, str, Any]]) -> None:
+        """
+        批量写入 (db_id, question_id, 表名, 列名, values)，同一主键的旧记录会被覆盖。
+        """
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO examples VALUES (?, ?, ?, ?, ?)",
+                (
+                    (db_id, str(question_id), table_name, column_name, json.dumps(values, ensure_ascii=False))
+                    for db_id, question_id, table_name, column_name, values in rows
+                )
+            )
+            self._conn.commit()
+
+    def get(self, db_id: str, question_id: Any) -> Dict[str, Dict[str, Any]]:
+        """返回某个问题的 {表名: {列名: values}}，没有记录时返回空字典"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT table_name, column_name, example_values FROM examples WHERE db_id = ? AND question_id = ?",
+                (db_id, str(question_id))
+            ).fetchall()
+        examples: Dict[str, Dict[str, Any]] = {}
+        for table_name, column_name, values in rows:
+            examples.setdefault(table_name, {})[column_name] = json.loads(values)
+        return examples
+
+    def clear(self) -> None:
+        """删除全部记录"""
+        with self._lock:
+            self._conn.execute("DELETE FROM examples")
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+# 进程内缓存：schema目录 -> 只读 ExampleStore（目录下没有存储文件时为 None）
+_stores: Dict[str, Optional[ExampleStore]] = {}
+_stores_lock = threading.Lock()
+
+def get_example_store(db_schema_dir: str) -> Optional[ExampleStore]:
+    """获取schema目录下的只读 ExampleStore，不存在时返回 None"""
+    db_schema_dir = os.fspath(db_schema_dir)
+    with _stores_lock:
+        if db_schema_dir not in _stores:
+            path = os.path.join(db_schema_dir, EXAMPLE_STORE_FILENAME)
+            _stores[db_schema_dir] = ExampleStore(path, readonly=True) if os.path.exists(path) else None
+        return _stores[db_schema_dir]
+
+def load_question_examples(db_schema_file, question_id: Any) -> Optional[Dict[str, Dict[str, Any]]]:
+    """
+    根据schema文件路径（{db_id}_schema.json）从同目录的旁路存储中读取某个问题的 Example。
+    没有存储文件、question_id 为空或该问题没有记录时返回 None。
+    """
+    if question_id is None:
+        return None
+    db_schema_file = os.fspath(db_schema_file)
+    file_name = os.path.basename(db_schema_file)
+    if not file_name.endswith(SCHEMA_FILE_SUFFIX):
+        return None
+    store = get_example_store(os.path.dirname(db_schema_file))
+    if store is None:
+        return None
+    try:
+        return store.get(file_name[:-len(SCHEMA_FILE_SUFFIX)], question_id) or None
+    except sqlite3.Error as e:
+        logger.warning(f"读取 Example 存储失败 {store.path}: {e}")
+        return None
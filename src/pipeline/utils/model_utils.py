@@ -2,7 +2,7 @@ import requests, time
 import torch
 import json
 import re
-from typing import Any, Dict
+from typing import Any, Dict, List
 
 import torch
 from transformers import AutoTokenizer, AutoModelForCausalLM, AutoModelForSequenceClassification
@@ -24,6 +24,11 @@ def model_chose(config: Dict[str, Any]) -> Any:
     else:
         raise ValueError(f"未知模型类型: {model_type}")
 
+def is_greedy_model(chat_model: Any) -> bool:
+    """模型是否使用贪心解码（temperature 为 0 或未设置），此时相同输入必然得到相同输出"""
+    config = getattr(chat_model, 'config', None) or {}
+    return not config.get("temperature")
+
 class HFModel:
     """Hugging Face 模型基类"""
     def __init__(self, config: Dict[str, Any]):
@@ -74,9 +79,18 @@ class CausalModel(HFModel):
         
         self.model = model
 
-    def get_ans(self, content: Any) -> Any:
+    def _build_messages(self, content: Any) -> List[Dict[str, str]]:
+        """将字符串 prompt 包装为对话消息，已是消息列表时原样返回"""
+        if isinstance(content, str):
+            return [{
+                "role": "user", 
+                "content": content
+            }]
+        return content
+
+    def _generate_kwargs(self) -> Dict[str, Any]:
         """
-        获取模型答案。
+        构造 generate 参数。
         temperature, top_p, n, single 等参数从 config 中获取。
         """
         temperature = self.config.get("temperature", 0.0)
@@ -84,21 +98,6 @@ class CausalModel(HFModel):
         n = self.config.get("n", 1)
         single = self.config.get("single", True)
 
-        if isinstance(content, str):
-            messages = [{
-                "role": "user", 
-                "content": content
-            }]
-        else:
-            messages = content
-
-        inputs = self.tokenizer.apply_chat_template(
-            messages, 
-            return_tensors="pt", 
-            add_generation_prompt=True, 
-            tokenize=True
-        ).to(self.target_device)
-        
         generate_kwargs = {
             "max_new_tokens": 2048,
             "pad_token_id": self.tokenizer.eos_token_id,
@@ -115,8 +114,24 @@ class CausalModel(HFModel):
                 generate_kwargs["top_p"] = top_p
         else:
             generate_kwargs["do_sample"] = False
+        return generate_kwargs
+
+    def get_ans(self, content: Any) -> Any:
+        """
+        获取模型答案。
+        temperature, top_p, n, single 等参数从 config 中获取。
+        """
+        n = self.config.get("n", 1)
+        single = self.config.get("single", True)
+
+        inputs = self.tokenizer.apply_chat_template(
+            self._build_messages(content), 
+            return_tensors="pt", 
+            add_generation_prompt=True, 
+            tokenize=True
+        ).to(self.target_device)
         
-        output_tokens = self.model.generate(inputs, **generate_kwargs)
+        output_tokens = self.model.generate(inputs, **self._generate_kwargs())
 
         if single or n == 1:
             return self.tokenizer.decode(
@@ -133,6 +148,61 @@ class CausalModel(HFModel):
                 results.append(decoded)
             return results
 
+    def get_ans_batch(self, contents: List[Any]) -> List[Any]:
+        """
+        批量获取模型答案，返回顺序与 contents 一致。
+        每次最多将 config 中 batch_size 条 prompt 左填充后合并为一次 generate 调用。
+        """
+        batch_size = max(1, self.config.get("batch_size", 8))
+        answers = []
+        for start in range(0, len(contents), batch_size):
+            answers.extend(self._generate_batch(contents[start:start + batch_size]))
+        return answers
+
+    def _generate_batch(self, contents: List[Any]) -> List[Any]:
+        n = self.config.get("n", 1)
+        single = self.config.get("single", True)
+        num_return_sequences = 1 if single or n == 1 else n
+
+        texts = [
+            self.tokenizer.apply_chat_template(
+                self._build_messages(content),
+                add_generation_prompt=True,
+                tokenize=False
+            )
+            for content in contents
+        ]
+        # 生成任务需要左填充，保证每条 prompt 的末尾对齐到生成起点
+        padding_side = self.tokenizer.padding_side
+        self.tokenizer.padding_side = "left"
+        try:
+            inputs = self.tokenizer(
+                texts,
+                return_tensors="pt",
+                padding=True,
+                add_special_tokens=False
+            ).to(self.target_device)
+        finally:
+            self.tokenizer.padding_side = padding_side
+
+        output_tokens = self.model.generate(
+            inputs["input_ids"],
+            attention_mask=inputs["attention_mask"],
+            **self._generate_kwargs()
+        )
+        prompt_length = inputs["input_ids"].shape[1]
+        decoded = [
+            self.tokenizer.decode(tokens[prompt_length:], skip_special_tokens=True).strip()
+            for tokens in output_tokens
+        ]
+
+        if num_return_sequences == 1:
+            return decoded
+        return [
+            decoded[i * num_return_sequences:(i + 1) * num_return_sequences]
+            for i in range(len(contents))
+        ]
+
 # class ClassificationModel(HFModel):
 #     """分类模型类 (待实现)"""
 #     def __init__(self, config: Dict[str, Any]):
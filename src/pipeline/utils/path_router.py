@@ -0,0 +1,66 @@
+import re
+import math
+from typing import Dict, List, Optional
+
+# 路径类型：single 只走精简schema一条路径；dual 两条路径+规则选择；dual_merge 两条路径+合并模型（原始流程）
+ROUTES = ("single", "dual", "dual_merge")
+
+# 各路径的默认代价（单位：一次普通生成调用）。合并模型是长思维链输出，按约4次普通调用计
+DEFAULT_ROUTE_COSTS = {"single": 2.0, "dual": 4.0, "dual_merge": 8.0}
+
+# 问题中暗示需要聚合、比较或多步计算的词
+_HARD_QUESTION_PATTERN = re.compile(
+    r'\b(average|avg|percentage|percent|ratio|proportion|rate|difference|compare|more than|less than|'
+    r'most|least|highest|lowest|top|rank|each|per|total|sum|between|at least|at most|not|never|except|'
+    r'both|either|all|how many times|times)\b',
+    re.IGNORECASE
+)
+
+def predict_difficulty(question: str, related_tables: Optional[str], scaled_down_db_schema: Optional[str]) -> float:
+    """
+    基于廉价信号估计问题难度，数值越大越难：
+      - 表抽取选中的表数（需要 JOIN 的表越多越难）
+      - 精简schema的长度
+      - 问题的词数与其中的聚合/比较类关键词数
+    :param related_tables: 表抽取节点输出的以 ", " 分隔的表名。
+    """
+    tables = [t for t in (related_tables or "").split(", ") if t.strip()]
+    schema_chars = len(scaled_down_db_schema or "")
+    question = question or ""
+    return (
+        1.0 * max(len(tables) - 1, 0)
+        + 0.5 * math.log2(1 + schema_chars / 1000)
+        + 0.02 * len(question.split())
+        + 0.5 * len(_HARD_QUESTION_PATTERN.findall(question))
+    )
+
+def allocate_routes(
+    difficulties: List[float],
+    budget_fraction: float = 1.0,
+    route_costs: Optional[Dict[str, float]] = None
+) -> List[str]:
+    """
+    在全局预算下为每个问题分配路径。预算为 budget_fraction × (全部走 dual_merge 的总代价)。
+    所有问题先走 single；然后按难度从高到低升级为 dual，预算仍有剩余时再按难度从高到低升级为 dual_merge。
+    budget_fraction >= 1 时所有问题都走 dual_merge，与不做路由的原始流程一致。
+    :return: 与 difficulties 顺序一致的路径列表。
+    """
+    costs = {**DEFAULT_ROUTE_COSTS, **(route_costs or {})}
+    n = len(difficulties)
+    budget = budget_fraction * n * costs["dual_merge"] + 1e-9
+    routes = ["single"] * n
+    spent = n * costs["single"]
+    order = sorted(range(n), key=lambda i: difficulties[i], reverse=True)
+    for current, target in (("single", "dual"), ("dual", "dual_merge")):
+        step = costs[target] - costs[current]
+        for i in order:
+            if spent + step > budget:
+                break
+            routes[i] = target
+            spent += step
+    return routes
+
+def route_cost(routes: List[str], route_costs: Optional[Dict[str, float]] = None) -> float:
+    """一组路径的总代价"""
+    costs = {**DEFAULT_ROUTE_COSTS, **(route_costs or {})}
+    return sum(costs[route] for route in routes)
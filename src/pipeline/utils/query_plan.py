@@ -0,0 +1,177 @@
+import re
+import sqlite3
+import logging
+import threading
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 无法解析到真实表（子查询、CTE、未识别的别名）时使用的行数估计
+_UNKNOWN_TABLE_ROWS = 1000
+# 等值索引查找每次命中的行数估计
+_EQ_SEARCH_ROWS = 10
+# 范围索引查找命中的比例（与 SQLite 自身对单个范围约束的估计一致）
+_RANGE_SEARCH_FRACTION = 0.25
+
+_LOOP_PATTERN = re.compile(r'^(SCAN|SEARCH) (.+?)(?: USING (.*))?$')
+_ALIAS_PATTERN = re.compile(
+    r'(?:\bFROM\b|\bJOIN\b|,)\s*(`[^`]+`|"[^"]+"|\[[^\]]+\]|\w+)(?:\s+AS)?\s+(\w+)',
+    re.IGNORECASE
+)
+
+# 缓存每个数据库中各表的行数估计：db_path -> {小写表名: 行数}
+_table_rows_cache: Dict[str, Dict[str, int]] = {}
+_cache_lock = threading.Lock()
+
+class PlanNode:
+    """EXPLAIN QUERY PLAN 输出中的一个节点"""
+    def __init__(self, detail: str):
+        self.detail = detail
+        self.children: List['PlanNode'] = []
+
+def _load_table_rows(conn: sqlite3.Connection) -> Dict[str, int]:
+    """估计每张表的行数：优先使用 sqlite_stat1，否则使用 max(rowid)（对 rowid 表是 O(log n) 的）"""
+    table_rows = {}
+    table_names = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
+    stat_rows = {}
+    if 'sqlite_stat1' in table_names:
+        for tbl, stat in conn.execute("SELECT tbl, stat FROM sqlite_stat1"):
+            try:
+                stat_rows[tbl.lower()] = int(str(stat).split()[0])
+            except (ValueError, IndexError, AttributeError):
+                continue
+    for table_name in table_names:
+        key = table_name.lower()
+        if key in stat_rows:
+            table_rows[key] = stat_rows[key]
+            continue
+        try:
+            quoted = table_name.replace('"', '""')
+            max_rowid = conn.execute(f'SELECT max(rowid) FROM "{quoted}"').fetchone()[0]
+            table_rows[key] = int(max_rowid or 0)
+        except sqlite3.Error: # WITHOUT ROWID 表
+            table_rows[key] = _UNKNOWN_TABLE_ROWS
+    return table_rows
+
+def _get_table_rows(db_path: str, conn: sqlite3.Connection) -> Dict[str, int]:
+    with _cache_lock:
+        cached = _table_rows_cache.get(db_path)
+    if cached is None:
+        cached = _load_table_rows(conn)
+        with _cache_lock:
+            _table_rows_cache[db_path] = cached
+    return cached
+
+def _resolve_aliases(query: str, table_rows: Dict[str, int]) -> Dict[str, str]:
+    """从 FROM/JOIN 子句中解析 别名 -> 表名 映射，只保留指向真实表的别名"""
+    aliases = {}
+    for table_token, alias in _ALIAS_PATTERN.findall(query):
+        table_name = table_token.strip('`"[]').lower()
+        if table_name in table_rows:
+            aliases[alias.lower()] = table_name
+    return aliases
+
+def _build_plan_tree(plan_rows: List[Tuple]) -> List[PlanNode]:
+    nodes = {0: PlanNode("")}
+    for node_id, parent_id, _, detail in plan_rows:
+        node = PlanNode(detail)
+        nodes[node_id] = node
+        nodes.get(parent_id, nodes[0]).children.append(node)
+    return nodes[0].children
+
+def _loop_rows(detail: str, table_rows: Dict[str, int], aliases: Dict[str, str]) -> Tuple[float, float, bool]:
+    """
+    估计一个 SCAN/SEARCH 循环节点每次被执行时访问的行数。
+    :return: (每次访问行数, 一次性建立自动索引的代价, 是否为全表扫描)
+    """
+    match = _LOOP_PATTERN.match(detail)
+    name, using = match.group(2), match.group(3) or ""
+    if name == "CONSTANT ROW":
+        return 1, 0, False
+    table_name = aliases.get(name.lower(), name.lower())
+    rows = table_rows.get(table_name, _UNKNOWN_TABLE_ROWS)
+
+    if match.group(1) == "SCAN":
+        return max(rows, 1), 0, True
+    build_cost = rows if "AUTOMATIC" in using else 0
+    if "(rowid=?)" in using:
+        return 1, build_cost, False
+    if '>' in using or '<' in using:
+        return max(rows * _RANGE_SEARCH_FRACTION, 1), build_cost, False
+    return min(_EQ_SEARCH_ROWS, max(rows, 1)), build_cost, False
+
+def _block_cost(
+    nodes: List[PlanNode],
+    outer_rows: float,
+    table_rows: Dict[str, int],
+    aliases: Dict[str, str],
+    worst_chain: List
+) -> float:
+    """
+    递归估计同一层节点（一个嵌套循环）的代价：依次累加各层循环的前缀乘积。
+    worst_chain 记录代价最高的嵌套循环链，用于生成错误描述。
+    """
+    cost = 0.0
+    loop_rows = 1.0
+    chain = []
+    for node in nodes:
+        if _LOOP_PATTERN.match(node.detail):
+            rows, build_cost, full_scan = _loop_rows(node.detail, table_rows, aliases)
+            loop_rows *= rows
+            cost += outer_rows * loop_rows + build_cost
+            chain.append((node.detail, rows, full_scan))
+            if node.children:
+                cost += _block_cost(node.children, outer_rows * loop_rows, table_rows, aliases, worst_chain)
+        else:
+            # 相关子查询对外层每一行都执行一次，其余子查询/物化只执行一次
+            multiplier = outer_rows * loop_rows if node.detail.startswith("CORRELATED") else 1.0
+            cost += _block_cost(node.children, multiplier, table_rows, aliases, worst_chain)
+    if chain and outer_rows * loop_rows > worst_chain[0]:
+        worst_chain[0] = outer_rows * loop_rows
+        worst_chain[1:] = chain
+    return cost
+
+def estimate_query_cost(db_path: str, query: str) -> Tuple[float, List[Tuple[str, float, bool]]]:
+    """
+    基于 EXPLAIN QUERY PLAN 估计查询需要访问的行数。
+    :return: (估计代价, 代价最高的嵌套循环链 [(计划描述, 行数估计, 是否全表扫描), ...])
+    :raises sqlite3.Error: 查询无法生成执行计划（语法错误、不存在的表或列等）。
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        plan_rows = conn.execute(f"EXPLAIN QUERY PLAN {query}").fetchall()
+        table_rows = _get_table_rows(db_path, conn)
+    finally:
+        conn.close()
+
+    aliases = _resolve_aliases(query, table_rows)
+    worst_chain = [0.0]
+    cost = _block_cost(_build_plan_tree(plan_rows), 1.0, table_rows, aliases, worst_chain)
+    return cost, worst_chain[1:]
+
+def check_query_cost(db_path: str, query: str, max_plan_cost: Optional[float]) -> str:
+    """
+    执行前的代价检查。
+    :return: 估计代价超过 max_plan_cost 时返回描述性的错误信息，否则返回空字符串。
+             无法生成执行计划时同样返回空字符串，交由实际执行报告错误。
+    """
+    if not max_plan_cost:
+        return ""
+    try:
+        cost, chain = estimate_query_cost(db_path, query)
+    except sqlite3.Error:
+        return ""
+    except Exception as e:
+        logger.warning(f"估计查询代价时发生意外错误: {e}")
+        return ""
+    if cost <= max_plan_cost:
+        return ""
+
+    loops = " x ".join(f"{detail} (~{rows:.0f} rows)" for detail, rows, _ in chain)
+    message = (
+        f"Query rejected before execution: estimated cost of {cost:.3g} row visits exceeds "
+        f"the limit of {max_plan_cost:.3g}. Nested-loop plan: {loops}."
+    )
+    if sum(1 for _, _, full_scan in chain if full_scan) > 1:
+        message += " Several tables are fully scanned inside the same loop; check for missing join conditions (cartesian product)."
+    return message
@@ -0,0 +1,84 @@
+import math
+import hashlib
+from typing import Any, List, Tuple
+
+# 不超过该长度的 BLOB 以完整十六进制展示，更长的只保留长度与摘要，避免结果和提示词被二进制数据撑大
+BLOB_INLINE_BYTES = 32
+
+_INFINITIES = (math.inf, -math.inf)
+
+def encode_value(value: Any) -> Any:
+    """
+    将单个 SQLite 值转换为可直接 JSON 序列化的值：
+      - BLOB (bytes) -> "0x..." 十六进制字符串；超过 BLOB_INLINE_BYTES 时为 "<BLOB n bytes sha1:...>"
+      - NaN -> None；±inf -> "Infinity" / "-Infinity"
+      - 其余值原样返回
+    """
+    if type(value) is bytes:
+        if len(value) <= BLOB_INLINE_BYTES:
+            return "0x" + value.hex()
+        return f"<BLOB {len(value)} bytes sha1:{hashlib.sha1(value).hexdigest()[:16]}>"
+    if type(value) is float:
+        if value != value:
+            return None
+        if value in _INFINITIES:
+            return "Infinity" if value > 0 else "-Infinity"
+    return value
+
+def encode_row(cursor: Any, row: Tuple[Any, ...]) -> Tuple[Any, ...]:
+    """
+    sqlite3 行工厂（connection.row_factory = encode_row）：取数时把行转换为可直接 JSON 序列化的元组。
+    只有含 BLOB 或 ±inf 的行才逐值调用 encode_value 重建，其余行原样返回。
+    SQLite 会把 NaN 结果变为 NULL，因此无需在此查找 NaN。
+    """
+    for value in row:
+        if type(value) is bytes or (type(value) is float and value in _INFINITIES):
+            return tuple(map(encode_value, row))
+    return row
+
+def _legacy_convert_row_to_list(data: Any) -> Any:
+    """旧版的递归转换（sqlite3.Row -> list），仅用于基准对比"""
+    if isinstance(data, list):
+        return [_legacy_convert_row_to_list(item) for item in data]
+    elif hasattr(data, '__iter__') and not isinstance(data, (str, bytes, dict)):
+        return list(data)
+    elif isinstance(data, dict):
+        return {k: _legacy_convert_row_to_list(v) for k, v in data.items()}
+    else:
+        return data
+
+def benchmark_row_encoding(num_rows: int = 200000, repeat: int = 5) -> List[Tuple[str, str, float]]:
+    """
+    微基准：分别对不含与含 BLOB 的查询，比较 sqlite3.Row + 递归转换 与 encode_row 行工厂的
+    取数加转换耗时（秒，取多次中的最小值）。
+    """
+    import json
+    import sqlite3
+    import timeit
+
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE t (id INTEGER, name TEXT, score REAL, payload BLOB)")
+    conn.executemany(
+        "INSERT INTO t VALUES (?, ?, ?, ?)",
+        ((i, f"name_{i}", i * 0.5, bytes([i % 256]) if i % 100 == 0 else None) for i in range(num_rows))
+    )
+
+    timings = []
+    for query in ("SELECT id, name, score FROM t", "SELECT id, name, score, payload FROM t"):
+        def legacy():
+            conn.row_factory = sqlite3.Row
+            return _legacy_convert_row_to_list(conn.execute(query).fetchall())
+
+        def encoded():
+            conn.row_factory = encode_row
+            return conn.execute(query).fetchall()
+
+        json.dumps(encoded()) # 编码后的结果必须可以直接序列化
+        timings.append((query, "sqlite3.Row + convert_row_to_list", min(timeit.repeat(legacy, number=1, repeat=repeat))))
+        timings.append((query, "encode_row row factory", min(timeit.repeat(encoded, number=1, repeat=repeat))))
+    conn.close()
+    return timings
+
+if __name__ == "__main__":
+    for query, name, seconds in benchmark_row_encoding():
+        print(f"{query:40s} {name:36s} {seconds * 1000:8.1f} ms")
@@ -0,0 +1,95 @@
+import os
+import math
+import signal
+import sqlite3
+import time
+from typing import Any, List, Optional, Tuple
+from .row_encoding import encode_row
+
+try:
+    import resource
+except ImportError: # 非 POSIX 平台不支持资源限制
+    resource = None
+
+# 沙箱工作进程侧的代码：forkserver 会预先导入本模块，因此这里只允许依赖标准库
+
+MEMORY_LIMIT_ERROR = "Query exceeded memory limit."
+CPU_LIMIT_ERROR = "Query exceeded CPU limit."
+
+def _current_address_space() -> int:
+    """当前进程已占用的虚拟地址空间（字节），用于在其基础上叠加内存上限"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[0]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+def _apply_memory_limit(memory_limit_bytes: Optional[int]):
+    if resource is None or not memory_limit_bytes:
+        return
+    limit = _current_address_space() + memory_limit_bytes
+    _, hard = resource.getrlimit(resource.RLIMIT_AS)
+    if hard != resource.RLIM_INFINITY:
+        limit = min(limit, hard)
+    resource.setrlimit(resource.RLIMIT_AS, (limit, hard))
+
+def _apply_cpu_budget(cpu_limit_seconds: Optional[float]):
+    """将 CPU 软限制设为"已用CPU时间 + 单条查询预算"，超出时进程收到 SIGXCPU 并退出"""
+    if resource is None or not cpu_limit_seconds:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = math.ceil(usage.ru_utime + usage.ru_stime + cpu_limit_seconds)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+def _run_query(db_path: str, query: str) -> Tuple[List[Tuple[Any, ...]], str, float, bool]:
+    """
+    在工作进程中执行一条查询。
+    :return: (结果行, 错误信息, 执行时间, 是否触发资源限制)。结果行为普通元组，便于跨进程传输。
+    """
+    conn = None
+    start_time = time.time()
+    try:
+        conn = sqlite3.connect(db_path)
+        conn.row_factory = encode_row
+        cursor = conn.cursor()
+        cursor.execute(query)
+        rows = cursor.fetchall()
+        exec_time = time.time() - start_time
+        if not rows:
+            return [], "Empty result.", exec_time, False
+        return rows, "", exec_time, False
+    except MemoryError:
+        return [], MEMORY_LIMIT_ERROR, time.time() - start_time, True
+    except sqlite3.Error as e:
+        if "out of memory" in str(e).lower():
+            return [], MEMORY_LIMIT_ERROR, time.time() - start_time, True
+        return [], str(e), time.time() - start_time, False
+    except Exception as e:
+        return [], str(e), time.time() - start_time, False
+    finally:
+        if conn:
+            conn.close()
+
+def worker_main(conn, memory_limit_bytes: Optional[int], cpu_limit_seconds: Optional[float]):
+    """工作进程主循环：逐条接收 (db_path, query)，返回紧凑的结果元组"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # 由父进程负责中断处理
+    _apply_memory_limit(memory_limit_bytes)
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, OSError):
+            break
+        if request is None:
+            break
+        db_path, query = request
+        _apply_cpu_budget(cpu_limit_seconds)
+        payload = _run_query(db_path, query)
+        try:
+            conn.send(payload)
+        except MemoryError:
+            conn.send(([], MEMORY_LIMIT_ERROR, payload[2], True))
+        if payload[3]: # 触发资源限制后退出，由父进程重新拉起
+            break
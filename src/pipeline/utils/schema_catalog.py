@@ -0,0 +1,143 @@
+import os
+import json
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+KEY_INFO = "<<key_info>>"
+
+class SchemaCatalog:
+    """
+    单个 {db_id}_schema.json 的内存表示。
+    每张表的 CREATE TABLE 片段在加载时渲染一次并缓存；schema文件中遗留的各列 examples 列表一次性建立索引：
+    question_id -> {表名: {列名: values}}，也可以由调用方传入旁路存储中的 Example。渲染某个问题的schema时，没有 Example 的表直接复用缓存片段，
+    有 Example 的表只在对应列的缓存行后追加注释，耗时与文件中存储的 example 数量无关。
+    """
+    def __init__(self, schema: Dict[str, Dict[str, Any]]):
+        # 表名 -> 列名 -> 列信息（不含 examples），保持schema文件中的顺序
+        self.tables: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.key_info: Dict[str, str] = {}
+        self.examples: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # 表名 -> 每列的 (列名, 未加 Example 的定义行（未去除首尾空白）, 该行是否已有注释)
+        self._column_lines: Dict[str, List[Tuple[str, str, bool]]] = {}
+        # 表名 -> 不含 Example 的完整 CREATE TABLE 片段
+        self._fragments: Dict[str, str] = {}
+
+        for table_name, table_info in schema.items():
+            columns = {}
+            column_lines = []
+            for column_name, column_info in table_info.items():
+                if column_name == KEY_INFO:
+                    continue
+                columns[column_name] = {k: v for k, v in column_info.items() if k != "examples"}
+                column_lines.append((column_name, *_render_column(column_name, column_info)))
+                examples = column_info.get("examples")
+                if not isinstance(examples, list):
+                    continue
+                seen = set()
+                for example in examples:
+                    question_id = example.get("question_id")
+                    # 与原先的 next(...) 查找一致：同一问题只取第一条
+                    if question_id in seen:
+                        continue
+                    seen.add(question_id)
+                    if "values" in example:
+                        self.examples.setdefault(question_id, {}).setdefault(table_name, {})[column_name] = example["values"]
+            self.tables[table_name] = columns
+            self.key_info[table_name] = table_info.get(KEY_INFO, "")
+            self._column_lines[table_name] = column_lines
+            self._fragments[table_name] = self._assemble(table_name, [line.strip() for _, line, _ in column_lines])
+
+    def _assemble(self, table_name: str, column_defs: List[str]) -> str:
+        col_info = '\n    '.join(column_defs)
+        return f"""CREATE TABLE {table_name} (
+    {col_info}
+    {self.key_info[table_name]}
+);"""
+
+    def column_catalog(self) -> Dict[str, List[str]]:
+        """返回 {表名: [列名]}，均为小写且去掉引号，供基于规则的SQL修复使用"""
+        return {
+            _unquote(table_name): [_unquote(c) for c in columns]
+            for table_name, columns in self.tables.items()
+        }
+
+    def examples_for(self, question_id: Any) -> Dict[str, Dict[str, Any]]:
+        """返回schema文件中某个问题的 {表名: {列名: values}}，没有时返回空字典"""
+        if question_id is None:
+            return {}
+        return self.examples.get(str(question_id), {})
+
+    def table_fragment(self, table_name: str, question_id: Any = None, examples: Optional[Dict[str, Dict[str, Any]]] = None) -> str:
+        """
+        返回单张表的 CREATE TABLE 片段，Example 以注释形式叠加在缓存行上。
+        :param examples: {表名: {列名: values}}；为 None 时使用schema文件中 question_id 对应的 Example。
+        """
+        if examples is None:
+            examples = self.examples_for(question_id)
+        table_examples = examples.get(table_name)
+        if not table_examples:
+            return self._fragments[table_name]
+        column_defs = []
+        for column_name, line, has_comment in self._column_lines[table_name]:
+            if column_name in table_examples:
+                example_part = f"Example: {str(table_examples[column_name])}"
+                line += f" {example_part}" if has_comment else f" -- {example_part}"
+            column_defs.append(line.strip())
+        return self._assemble(table_name, column_defs)
+
+    def render(
+        self,
+        related_tables: Optional[Iterable[str]] = None,
+        question_id: Any = None,
+        examples: Optional[Dict[str, Dict[str, Any]]] = None
+    ) -> str:
+        """
+        拼接各表片段得到 CREATE TABLE 形式的schema文本。
+        :param related_tables: 只包含这些表；为 None 时包含全部表。
+        :param question_id: 为列附加该问题检索到的 Example 值。
+        :param examples: 旁路存储中该问题的 {表名: {列名: values}}，给定时代替schema文件中的 examples。
+        """
+        if examples is None:
+            examples = self.examples_for(question_id)
+        return "\n\n".join(
+            self.table_fragment(table_name, examples=examples)
+            for table_name in self.tables
+            if related_tables is None or table_name in related_tables
+        )
+
+def _render_column(column_name: str, column_info: Dict[str, Any]) -> Tuple[str, bool]:
+    """渲染不含 Example 的列定义行，返回 (定义行, 是否已有注释)"""
+    column_type = column_info.get("type", "")
+    column_desc = column_info.get("description", "")
+    column_constraints = " ".join(column_info.get("constraints", []))
+    column_details = column_info.get("details", "")
+
+    line = f"{column_name} {column_type} {column_constraints},"
+    if column_desc or column_details:
+        return f"{line} -- {column_desc}{column_details}", True
+    return line, False
+
+def _unquote(name: str) -> str:
+    return name.strip().strip('`"[]').lower()
+
+# 进程内缓存：schema文件路径 -> (文件修改时间, SchemaCatalog)。文件被重写后自动重新加载
+_catalogs: Dict[str, Tuple[float, SchemaCatalog]] = {}
+_catalogs_lock = threading.Lock()
+
+def get_schema_catalog(db_schema_file) -> SchemaCatalog:
+    """
+    获取schema文件对应的 SchemaCatalog，每个文件只解析一次。
+    文件不存在时抛出 FileNotFoundError，内容无法解析时抛出 json.JSONDecodeError。
+    """
+    path = os.fspath(db_schema_file)
+    mtime = os.stat(path).st_mtime
+    with _catalogs_lock:
+        cached = _catalogs.get(path)
+    if cached is not None and cached[0] == mtime:
+        return cached[1]
+
+    with open(path, 'r', encoding='utf-8') as f:
+        catalog = SchemaCatalog(json.load(f))
+    with _catalogs_lock:
+        _catalogs[path] = (mtime, catalog)
+    return catalog
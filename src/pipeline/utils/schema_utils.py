@@ -1,6 +1,7 @@
-import json
 import logging
 import re
+from .schema_catalog import get_schema_catalog
+from .example_store import load_question_examples
 
 def quote_field(field_name):
     """为字段名添加引号（如果需要）"""
@@ -10,58 +11,32 @@ def quote_field(field_name):
     else:
         return field_name
 
-def build_database_schema(db_schema_file, related_tables, question_id=None):
-    """构建数据库schema"""
+def is_same_schema(schema_a, schema_b):
+    """判断两个schema文本是否相同（忽略空白差异），例如表抽取选中了全部表时精简schema与完整schema相同"""
+    if schema_a is None or schema_b is None:
+        return False
+    return " ".join(str(schema_a).split()) == " ".join(str(schema_b).split())
+
+def build_database_schema(db_schema_file, related_tables, question_id=None, examples=None):
+    """
+    构建数据库schema。schema文件经 SchemaCatalog 解析并缓存，同一数据库的后续问题不再重复读取；
+    问题级 Example 优先从同目录的旁路存储读取，没有时回退到schema文件中遗留的 examples。
+    :param related_tables: 只包含这些表；为 None 时包含全部表。
+    :param examples: 在线检索得到的 {表名: {列名: values}}，给定时代替预先计算的 Example。
+    """
     try:
-        with open(db_schema_file, 'r', encoding='utf-8') as f:
-            schema = json.load(f)
+        catalog = get_schema_catalog(db_schema_file)
     except FileNotFoundError:
         logging.warning(f"Schema文件不存在: {db_schema_file}")
         return ""
-    
-    create_statements = []
-    for table_name, table_info in schema.items():
-        if table_name not in related_tables:
-            continue
-        
-        columns = []
-        for column_name, column_info in table_info.items():
-            if column_name == "<<key_info>>":
-                continue
-            
-            column_type = column_info.get("type", "")
-            column_desc = column_info.get("description", "")
-            column_constraints = " ".join(column_info.get("constraints", []))
-            column_details = column_info.get("details", "")
-            
-            column_def_base = f"{column_name} {column_type} {column_constraints},"
-            
-            comment_parts = []
-            if column_desc or column_details:
-                comment_parts.append(f"{column_desc}{column_details}")
-            
-            example_part = ""
-            if 'examples' in column_info and isinstance(column_info['examples'], list):
-                found_example = next((ex for ex in column_info['examples'] if ex.get('question_id') == str(question_id)), None)
-                if found_example and 'values' in found_example:
-                    example_values = found_example['values']
-                    example_part = f"Example: {str(example_values)}"
-            
-            final_comment = ""
-            if comment_parts:
-                final_comment += f" -- {''.join(comment_parts)}"
-            if example_part:
-                final_comment += f" {example_part}" if final_comment else f" -- {example_part}" # Add comma if there's already a comment
-            
-            column_def = f"{column_def_base}{final_comment}"
-            columns.append(column_def.strip())
-
-        key_info = table_info.get("<<key_info>>", "")
-        col_info = '\n    '.join(columns)
-        create_statement = f"""CREATE TABLE {table_name} (
-    {col_info}
-    {key_info}
-);"""
-        create_statements.append(create_statement)
+    if examples is None:
+        examples = load_question_examples(db_schema_file, question_id)
+    return catalog.render(related_tables, question_id, examples)
 
-    return "\n\n".join(create_statements)
+def has_precomputed_examples(db_schema_file, question_id):
+    """问题在旁路存储或schema文件中是否已有预先计算的 Example"""
+    try:
+        catalog = get_schema_catalog(db_schema_file)
+    except FileNotFoundError:
+        return False
+    return bool(load_question_examples(db_schema_file, question_id) or catalog.examples_for(question_id))
@@ -0,0 +1,173 @@
+import re
+import json
+import difflib
+import logging
+from typing import Dict, List, Optional, Tuple
+from .schema_catalog import get_schema_catalog
+
+logger = logging.getLogger(__name__)
+
+# 模糊匹配的相似度下限，低于该值的候选不会被采用
+_MATCH_CUTOFF = 0.8
+
+_IDENTIFIER = r'(?:`[^`]+`|"[^"]+"|\[[^\]]+\]|\w+)'
+_TABLE_PATTERN = re.compile(
+    rf'(?:\bFROM\b|\bJOIN\b|,)\s*({_IDENTIFIER})(?:\s+(?:AS\s+)?(\w+))?',
+    re.IGNORECASE
+)
+# 紧跟在表名之后、不能视为别名的关键字
+_NOT_ALIASES = {
+    "where", "join", "inner", "left", "right", "outer", "cross", "natural", "on", "using", "group",
+    "order", "limit", "having", "union", "intersect", "except", "as", "select", "from", "and", "or"
+}
+_STRING_LITERAL = re.compile(r"('(?:[^']|'')*')")
+
+_NO_SUCH_COLUMN = re.compile(r'^no such column: (.+)$')
+_NO_SUCH_TABLE = re.compile(r'^no such table: (?:main\.)?(.+)$')
+_AMBIGUOUS_COLUMN = re.compile(r'^ambiguous column name: (.+)$')
+
+def _unquote(name: str) -> str:
+    return name.strip().strip('`"[]').lower()
+
+def _quote(name: str) -> str:
+    """与 schema_utils.quote_field 一致：含非单词字符的名称用反引号包裹"""
+    return f"`{name}`" if re.search(r'\W', name) else name
+
+def _normalize(name: str) -> str:
+    return re.sub(r'[\W_]+', '', name.lower())
+
+def load_schema_catalog(db_schema_file: str) -> Dict[str, List[str]]:
+    """
+    读取 {db_id}_schema.json，返回 {表名: [列名]}。解析结果由 SchemaCatalog 按文件缓存。
+    schema文件不存在或无法解析时返回空字典。
+    """
+    try:
+        return get_schema_catalog(db_schema_file).column_catalog()
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"无法加载schema目录 {db_schema_file}: {e}")
+        return {}
+
+def _best_match(name: str, candidates: List[str]) -> Optional[str]:
+    """先按忽略大小写、空白和下划线的规范化名称精确匹配，再用 difflib 做模糊匹配"""
+    normalized = _normalize(name)
+    for candidate in candidates:
+        if _normalize(candidate) == normalized:
+            return candidate
+    matches = difflib.get_close_matches(name.lower(), candidates, n=1, cutoff=_MATCH_CUTOFF)
+    return matches[0] if matches else None
+
+def _sub_outside_literals(pattern: re.Pattern, repl, sql: str) -> str:
+    """只在字符串字面量之外做替换，避免改动 WHERE name = 'xxx' 中的值"""
+    parts = _STRING_LITERAL.split(sql)
+    for i in range(0, len(parts), 2):
+        parts[i] = pattern.sub(repl, parts[i])
+    return "".join(parts)
+
+def _identifier_pattern(name: str, qualifier: Optional[str] = None) -> re.Pattern:
+    """匹配 name 的任意引号形式；给定 qualifier 时匹配 qualifier.name，否则只匹配未限定的 name"""
+    escaped = re.escape(name)
+    quoted = rf'(?:`{escaped}`|"{escaped}"|\[{escaped}\]|(?<![\w`"\]]){escaped}(?![\w`"\[]))'
+    if qualifier is not None:
+        return re.compile(rf'(?<![\w.]){re.escape(qualifier)}\s*\.\s*{quoted}', re.IGNORECASE)
+    return re.compile(rf'(?<![.\w`"\]]){quoted}', re.IGNORECASE)
+
+def _query_tables(sql: str, catalog: Dict[str, List[str]]) -> List[Tuple[str, Optional[str]]]:
+    """按出现顺序返回查询中引用的 (表名, 别名)，只保留 schema 中存在的表"""
+    tables = []
+    for table_token, alias in _TABLE_PATTERN.findall(_STRING_LITERAL.sub("''", sql)):
+        table_name = _unquote(table_token)
+        if table_name not in catalog:
+            continue
+        alias = alias if alias and alias.lower() not in _NOT_ALIASES else None
+        if (table_name, alias) not in tables:
+            tables.append((table_name, alias))
+    return tables
+
+def _quote_multiword_identifiers(sql: str, catalog: Dict[str, List[str]]) -> str:
+    """为包含空格等字符却未加引号的表名、列名加上反引号，例如 School Name -> `school name`"""
+    names = set(catalog)
+    for columns in catalog.values():
+        names.update(columns)
+    for name in sorted((n for n in names if re.search(r'\W', n)), key=len, reverse=True):
+        words = re.findall(r'\w+', name)
+        if not words or not re.fullmatch(r'[\w\s]+', name):
+            continue
+        pattern = re.compile(
+            r'(?<![\w`"\[])' + r'\s+'.join(re.escape(w) for w in words) + r'(?![\w`"\]])',
+            re.IGNORECASE
+        )
+        sql = _sub_outside_literals(pattern, _quote(name), sql)
+    return sql
+
+def _repair_missing_table(sql: str, bad_table: str, catalog: Dict[str, List[str]]) -> Optional[str]:
+    match = _best_match(_unquote(bad_table), list(catalog))
+    if not match:
+        return None
+    return _sub_outside_literals(_identifier_pattern(bad_table.strip('`"[]')), _quote(match), sql)
+
+def _repair_missing_column(sql: str, bad_column: str, catalog: Dict[str, List[str]]) -> Optional[str]:
+    tables = _query_tables(sql, catalog)
+    qualifier, _, column = bad_column.rpartition('.')
+    column = column.strip('`"[]')
+
+    if qualifier:
+        owner = next((t for t, a in tables if (a or t).lower() == _unquote(qualifier)), None)
+        if owner is None:
+            return None
+        match = _best_match(column, catalog[owner])
+        if match:
+            return _sub_outside_literals(_identifier_pattern(column, qualifier), f"{qualifier}.{_quote(match)}", sql)
+        # 列写对了但别名写错：该列只存在于查询中的另一张表时，改用那张表的别名
+        owners = [(t, a) for t, a in tables if _best_match(column, catalog[t])]
+        if len(owners) != 1:
+            return None
+        other_table, other_alias = owners[0]
+        match = _best_match(column, catalog[other_table])
+        return _sub_outside_literals(_identifier_pattern(column, qualifier), f"{other_alias or _quote(other_table)}.{_quote(match)}", sql)
+
+    candidates = [c for t, _ in tables for c in catalog[t]] or [c for cols in catalog.values() for c in cols]
+    match = _best_match(column, candidates)
+    if not match:
+        return None
+    return _sub_outside_literals(_identifier_pattern(column), _quote(match), sql)
+
+def _repair_ambiguous_column(sql: str, column: str, catalog: Dict[str, List[str]]) -> Optional[str]:
+    """用FROM子句中第一张含有该列的表（或其别名）限定所有未限定的引用"""
+    column = column.strip('`"[]')
+    owner = next(((t, a) for t, a in _query_tables(sql, catalog) if column.lower() in catalog[t]), None)
+    if owner is None:
+        return None
+    table_name, alias = owner
+    return _sub_outside_literals(_identifier_pattern(column), f"{alias or _quote(table_name)}.{_quote(column.lower())}", sql)
+
+def rule_based_repair(sql: str, error: str, catalog: Dict[str, List[str]]) -> Optional[str]:
+    """
+    针对机械性错误的确定性修复：补全标识符引号、模糊匹配不存在的表名/列名、限定有歧义的列。
+    :param sql: 执行失败的SQL。
+    :param error: execute_sql_query 返回的错误信息。
+    :param catalog: load_schema_catalog 返回的 {表名: [列名]}。
+    :return: 修复后的SQL；规则无法处理或修复后与原SQL相同时返回 None。
+    """
+    if not catalog or not error:
+        return None
+
+    repaired = sql
+    if _NO_SUCH_COLUMN.match(error) or error.startswith('near "'):
+        # School Name 未加引号时会被解析为列 School 加别名 Name，或在其后报语法错误
+        repaired = _quote_multiword_identifiers(sql, catalog)
+    if repaired == sql:
+        try:
+            if match := _NO_SUCH_COLUMN.match(error):
+                repaired = _repair_missing_column(sql, match.group(1).strip(), catalog)
+            elif match := _NO_SUCH_TABLE.match(error):
+                repaired = _repair_missing_table(sql, match.group(1).strip(), catalog)
+            elif match := _AMBIGUOUS_COLUMN.match(error):
+                repaired = _repair_ambiguous_column(sql, match.group(1).strip(), catalog)
+            else:
+                repaired = None
+        except re.error as e:
+            logger.debug(f"规则修复时正则构造失败: {e}")
+            repaired = None
+    if not repaired or repaired == sql:
+        return None
+    return repaired
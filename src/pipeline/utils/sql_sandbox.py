@@ -0,0 +1,163 @@
+import sys
+import queue
+import signal
+import logging
+import threading
+import time
+import types
+import multiprocessing
+from contextlib import contextmanager
+from typing import Any, List, Optional, Tuple
+from . import sandbox_worker
+from .sandbox_worker import MEMORY_LIMIT_ERROR, CPU_LIMIT_ERROR
+
+logger = logging.getLogger(__name__)
+
+_main_module_lock = threading.Lock()
+
+@contextmanager
+def _main_module_hidden():
+    """
+    启动工作进程期间临时隐藏 __main__。spawn/forkserver 启动的子进程默认会重新执行主脚本，
+    而主脚本会导入 torch/transformers 等模型依赖；工作进程只需要 sandbox_worker 模块。
+    """
+    with _main_module_lock:
+        main_module = sys.modules["__main__"]
+        sys.modules["__main__"] = types.ModuleType("__main__")
+        try:
+            yield
+        finally:
+            sys.modules["__main__"] = main_module
+
+class SandboxWorker:
+    """父进程侧持有的工作进程句柄"""
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+        self.served = 0
+
+class SqlSandboxPool:
+    """
+    预先启动的SQL工作进程池。每个工作进程设置 RLIMIT_AS 与 CPU 限制，
+    父进程只接收结果元组；查询超时、触发限制或累计执行 max_queries_per_worker 条后回收并重启工作进程。
+    """
+    def __init__(
+        self,
+        num_workers: int = 8,
+        memory_limit_mb: Optional[int] = 4096,
+        cpu_limit_seconds: Optional[float] = None,
+        max_queries_per_worker: int = 200,
+        start_method: str = "forkserver"
+    ):
+        self.memory_limit_bytes = memory_limit_mb * 1024 * 1024 if memory_limit_mb else None
+        self.cpu_limit_seconds = cpu_limit_seconds
+        self.max_queries_per_worker = max_queries_per_worker
+        self._ctx = multiprocessing.get_context(start_method)
+        if start_method == "forkserver":
+            # forkserver 只预先导入只依赖标准库的 sandbox_worker，之后从干净的进程中派生工作进程，避免从持有线程和GPU上下文的主进程 fork
+            self._ctx.set_forkserver_preload([sandbox_worker.__name__])
+        self._idle: "queue.Queue[SandboxWorker]" = queue.Queue()
+        self._all_workers: List[SandboxWorker] = []
+        self._workers_lock = threading.Lock()
+        self.recycled_count = 0
+        for _ in range(num_workers):
+            self._idle.put(self._spawn())
+        logger.info(f"SQL沙箱进程池已启动: {num_workers} 个工作进程，内存上限 {memory_limit_mb} MB，CPU上限 {cpu_limit_seconds} 秒/查询。")
+
+    def _spawn(self) -> SandboxWorker:
+        parent_conn, child_conn = self._ctx.Pipe()
+        process = self._ctx.Process(
+            target=sandbox_worker.worker_main,
+            args=(child_conn, self.memory_limit_bytes, self.cpu_limit_seconds),
+            daemon=True
+        )
+        with _main_module_hidden():
+            process.start()
+        child_conn.close()
+        worker = SandboxWorker(process, parent_conn)
+        with self._workers_lock:
+            self._all_workers.append(worker)
+        return worker
+
+    def _retire(self, worker: SandboxWorker, kill: bool = False):
+        with self._workers_lock:
+            if worker in self._all_workers:
+                self._all_workers.remove(worker)
+        try:
+            if kill:
+                worker.process.kill()
+            else:
+                worker.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        worker.process.join(timeout=5)
+        if worker.process.is_alive():
+            worker.process.kill()
+            worker.process.join()
+        worker.conn.close()
+
+    def _recycle(self, worker: SandboxWorker, kill: bool = False) -> SandboxWorker:
+        self._retire(worker, kill=kill)
+        with self._workers_lock:
+            self.recycled_count += 1
+        return self._spawn()
+
+    def execute(self, db_path: str, query: str, timeout: float = 300.0) -> Tuple[List[Tuple[Any, ...]], str, float]:
+        """
+        在沙箱中执行查询，返回值与 execute_sql_query 一致。
+        超时的查询所在进程会被直接终止，不会继续占用资源。
+        """
+        worker = self._idle.get()
+        start_time = time.time()
+        try:
+            worker.conn.send((db_path, query))
+            if not worker.conn.poll(timeout):
+                logger.warning(f"SQL查询超时 (>{timeout}秒)，终止沙箱工作进程: {query}")
+                self._idle.put(self._recycle(worker, kill=True))
+                return [], "Query timed out.", timeout
+            rows, error, exec_time, breached = worker.conn.recv()
+        except (EOFError, OSError):
+            # 工作进程在执行中被终止（SIGXCPU、被系统 OOM killer 杀死等）
+            worker.process.join(timeout=5)
+            exitcode = worker.process.exitcode
+            error = CPU_LIMIT_ERROR if exitcode == -signal.SIGXCPU else f"SQL worker crashed (exit code {exitcode})."
+            logger.error(f"{error} 查询: {query}")
+            self._idle.put(self._recycle(worker, kill=True))
+            return [], error, time.time() - start_time
+        except BaseException:
+            self._idle.put(self._recycle(worker, kill=True))
+            raise
+
+        worker.served += 1
+        if breached:
+            logger.error(f"{error} 查询: {query}")
+        if breached or worker.served >= self.max_queries_per_worker:
+            worker = self._recycle(worker)
+        self._idle.put(worker)
+        return rows, error, exec_time
+
+    def close(self):
+        """关闭所有工作进程"""
+        with self._workers_lock:
+            workers = list(self._all_workers)
+        for worker in workers:
+            self._retire(worker)
+        logger.info(f"SQL沙箱进程池已关闭，期间共回收 {self.recycled_count} 个工作进程。")
+
+_default_pool: Optional[SqlSandboxPool] = None
+
+def init_sandbox_pool(**kwargs) -> SqlSandboxPool:
+    """启动全局沙箱进程池；之后 execute_sql_query 会在沙箱中执行查询"""
+    global _default_pool
+    if _default_pool is None:
+        _default_pool = SqlSandboxPool(**kwargs)
+    return _default_pool
+
+def get_sandbox_pool() -> Optional[SqlSandboxPool]:
+    return _default_pool
+
+def shutdown_sandbox_pool():
+    global _default_pool
+    if _default_pool is not None:
+        _default_pool.close()
+        _default_pool = None
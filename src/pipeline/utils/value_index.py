@@ -0,0 +1,224 @@
+import os
+import re
+import time
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# data_procession/value_retriever.py 的 FTS5 后端也使用该文件名：索引文件位于 <索引根目录>/<db_id>/values.fts.sqlite
+FTS_INDEX_FILENAME = "values.fts.sqlite"
+_TERM_PATTERN = re.compile(r'\w+')
+_TOKEN_PATTERN = re.compile(r'\w+|[^\w\s]+')
+
+# 与离线数据处理相同的值选择规则
+_MIN_MATCH_SCORE = 0.85
+_MAX_VALUES = 20
+_HITS_PER_QUERY = 10
+
+class SubstringMatcher:
+    """
+    问题（小写）的后缀自动机：构建一次后，可在 O(len(query)) 内求出 query 与问题的最长公共子串。
+    data_procession/value_retriever.py 离线选值时也直接使用此实现。
+    """
+    def __init__(self, target: str):
+        self.transitions = [{}]
+        self.suffix_link = [-1]
+        self.length = [0]
+        last = 0
+        for ch in target.lower():
+            cur = len(self.length)
+            self.transitions.append({})
+            self.length.append(self.length[last] + 1)
+            self.suffix_link.append(0)
+            p = last
+            while p != -1 and ch not in self.transitions[p]:
+                self.transitions[p][ch] = cur
+                p = self.suffix_link[p]
+            if p != -1:
+                q = self.transitions[p][ch]
+                if self.length[p] + 1 == self.length[q]:
+                    self.suffix_link[cur] = q
+                else:
+                    clone = len(self.length)
+                    self.transitions.append(dict(self.transitions[q]))
+                    self.length.append(self.length[p] + 1)
+                    self.suffix_link.append(self.suffix_link[q])
+                    while p != -1 and self.transitions[p].get(ch) == q:
+                        self.transitions[p][ch] = clone
+                        p = self.suffix_link[p]
+                    self.suffix_link[q] = clone
+                    self.suffix_link[cur] = clone
+            last = cur
+
+    def score(self, query: str) -> float:
+        """query 被其在问题中出现的最长子串覆盖的比例"""
+        query = query.lower()
+        if not query:
+            return 0.0
+        transitions, suffix_link, length = self.transitions, self.suffix_link, self.length
+        state, matched, best = 0, 0, 0
+        for ch in query:
+            while state and ch not in transitions[state]:
+                state = suffix_link[state]
+                matched = length[state]
+            if ch in transitions[state]:
+                state = transitions[state][ch]
+                matched += 1
+                best = max(best, matched)
+            else:
+                state, matched = 0, 0
+        return best / len(query)
+
+class ValueIndex:
+    """单个数据库的只读 FTS5 值索引（由 build_index_for_dataset(backend="fts5") 生成）"""
+    def __init__(self, fts_file: str):
+        self.fts_file = fts_file
+        self._conn = sqlite3.connect(f"file:{fts_file}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+
+    def search(self, query: str, k: int = _HITS_PER_QUERY) -> List[Tuple[str, str]]:
+        """BM25 检索，返回 [(doc_id, 值)]；doc_id 形如 表名-**-列名-**-序号"""
+        terms = _TERM_PATTERN.findall(query.lower())
+        if not terms:
+            return []
+        match = " OR ".join(f'"{term}"' for term in dict.fromkeys(terms))
+        with self._lock:
+            return self._conn.execute(
+                "SELECT doc_id, contents FROM column_values WHERE column_values MATCH ? ORDER BY rank LIMIT ?",
+                (match, k)
+            ).fetchall()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def question_queries(question: str, max_n: int) -> List[str]:
+    """
+    检索用的查询：完整问题在前，然后按 n 从小到大排列的词 n-gram（去重）。
+    在延迟预算内优先保证每个词都被单独检索过。
+    """
+    tokens = _TOKEN_PATTERN.findall(question)
+    queries = [question]
+    for n in range(1, max_n + 1):
+        queries.extend(" ".join(tokens[i:i + n]) for i in range(len(tokens) - n + 1))
+    return list(dict.fromkeys(q for q in queries if q.strip()))
+
+def select_question_values(hits: List[Tuple[str, str]], question: str) -> Dict[str, List[str]]:
+    """
+    与 value_retriever.retrieve_question_related_db_values 相同的选择规则：
+    保留与问题子串匹配度超过 0.85 的值，按 (匹配度, 长度, 顺序) 取前 20 个，按 表名.列名（小写）分组。
+    """
+    matcher = SubstringMatcher(question)
+    scored = []
+    for idx, (doc_id, value) in enumerate(hits):
+        score = matcher.score(value)
+        if score > _MIN_MATCH_SCORE:
+            table_name, column_name, _ = doc_id.split("-**-")
+            scored.append((score, len(value), idx, f"{table_name}.{column_name}".lower(), value))
+    scored.sort(reverse=True)
+
+    values: Dict[str, List[str]] = {}
+    for _, _, _, column, value in scored[:_MAX_VALUES]:
+        values.setdefault(column, []).append(value)
+    return values
+
+class OnlineValueRetriever:
+    """
+    推理阶段的在线值检索：按需打开并缓存各数据库的 FTS5 值索引（LRU），
+    每个问题在延迟预算内检索，结果按 (db_id, 问题) 缓存。
+    """
+    def __init__(self, index_root: str, max_open_indexes: int = 16, cache_size: int = 10000):
+        self.index_root = index_root
+        self.max_open_indexes = max(1, max_open_indexes)
+        self.cache_size = max(0, cache_size)
+        self._indexes: "OrderedDict[str, ValueIndex]" = OrderedDict()
+        self._missing = set()
+        self._cache: "OrderedDict[Tuple[str, str], Dict[str, List[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.cache_hits = 0
+        self.budget_exhausted = 0
+
+    def _get_index(self, db_id: str) -> Optional[ValueIndex]:
+        with self._lock:
+            if db_id in self._indexes:
+                self._indexes.move_to_end(db_id)
+                return self._indexes[db_id]
+            if db_id in self._missing:
+                return None
+            fts_file = os.path.join(self.index_root, db_id, FTS_INDEX_FILENAME)
+            if not os.path.exists(fts_file):
+                logger.warning(f"数据库 {db_id} 没有 FTS5 值索引: {fts_file}")
+                self._missing.add(db_id)
+                return None
+            while len(self._indexes) >= self.max_open_indexes:
+                _, evicted = self._indexes.popitem(last=False)
+                evicted.close()
+            index = ValueIndex(fts_file)
+            self._indexes[db_id] = index
+            return index
+
+    def retrieve(self, db_id: str, question: str, latency_budget: float, max_n: int = 8) -> Optional[Dict[str, List[str]]]:
+        """
+        检索问题相关的数据库值。
+        :param latency_budget: 单个问题的检索时间上限（秒）；超出后只使用已检索到的结果，且该结果不会被缓存。
+        :return: {表名.列名（小写）: [值]}；数据库没有值索引时返回 None。
+        """
+        key = (db_id, question)
+        with self._lock:
+            if key in self._cache:
+                self.cache_hits += 1
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        index = self._get_index(db_id)
+        if index is None:
+            return None
+
+        deadline = time.monotonic() + latency_budget
+        hits = {}
+        complete = True
+        for query in question_queries(question, max_n):
+            if time.monotonic() >= deadline:
+                complete = False
+                with self._lock:
+                    self.budget_exhausted += 1
+                break
+            try:
+                for doc_id, value in index.search(query):
+                    hits.setdefault(doc_id, value)
+            except sqlite3.Error as e:
+                logger.debug(f"值检索失败 {db_id}: {query} - {e}")
+        values = select_question_values(list(hits.items()), question)
+
+        # 超出延迟预算的结果不完整，不缓存，下次遇到同一问题时重新检索
+        if self.cache_size and complete:
+            with self._lock:
+                self._cache[key] = values
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return values
+
+    def stats(self) -> Dict[str, int]:
+        """返回累计的缓存命中次数与超出延迟预算次数"""
+        with self._lock:
+            return {"cache_hits": self.cache_hits, "budget_exhausted": self.budget_exhausted}
+
+    def close(self):
+        with self._lock:
+            for index in self._indexes.values():
+                index.close()
+            self._indexes.clear()
+
+# 进程内复用的检索器：索引根目录 -> OnlineValueRetriever，保持索引常驻以便后续批次直接命中
+_retrievers: Dict[str, OnlineValueRetriever] = {}
+_retrievers_lock = threading.Lock()
+
+def get_value_retriever(index_root: str, max_open_indexes: int = 16, cache_size: int = 10000) -> OnlineValueRetriever:
+    with _retrievers_lock:
+        if index_root not in _retrievers:
+            _retrievers[index_root] = OnlineValueRetriever(index_root, max_open_indexes, cache_size)
+        return _retrievers[index_root]
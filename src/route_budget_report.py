@@ -0,0 +1,133 @@
+import os
+import json
+import logging
+import argparse
+from pipeline.managers.pipeline_manager import PipelineManager
+from pipeline.utils.db_utils import execute_sql_queries
+from pipeline.utils.path_router import ROUTES, predict_difficulty, allocate_routes, route_cost
+from pipeline.nodes.sql_selection import _fallback_sql_selection
+
+def load_pipeline_results(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def route_answers(row):
+    """
+    从一次全预算运行（所有问题都走 dual_merge）的结果中还原三种路径各自的最终SQL：
+    single 即精简schema路径的精炼结果；dual 为规则选择；dual_merge 为实际选出的SQL。
+    """
+    return {
+        "single": row.get("refined_sql_1"),
+        "dual": _fallback_sql_selection(
+            row.get("refined_sql_1"), row.get("refined_sql_2"),
+            row.get("sql1_final_error"), row.get("sql2_final_error"),
+            row.get("sql1_exec_results"), row.get("sql2_exec_results"),
+            row.get("sql1_exec_time", 0.0), row.get("sql2_exec_time", 0.0)
+        ),
+        "dual_merge": row.get("selected_sql"),
+    }
+
+def judge_answers(rows, db_root_dir, timeout, max_workers):
+    """按 BIRD 的执行准确率口径（结果集合相等）判断每个问题在每种路径下是否正确"""
+    queries = []
+    for row in rows:
+        db_path = os.path.join(db_root_dir, row["db_id"], f"{row['db_id']}.sqlite")
+        queries.append((db_path, row["query"]))
+        for route, sql in route_answers(row).items():
+            queries.append((db_path, sql or ""))
+    outcomes = execute_sql_queries(queries, max_workers=max_workers, timeout=timeout)
+
+    correct = {route: [] for route in ROUTES}
+    step = 1 + len(ROUTES)
+    for i in range(len(rows)):
+        gold_rows, gold_error, _ = outcomes[i * step]
+        gold = set(map(tuple, gold_rows)) if gold_error in ("", "Empty result.") else None
+        for j, route in enumerate(ROUTES):
+            pred_rows, pred_error, _ = outcomes[i * step + 1 + j]
+            pred = set(map(tuple, pred_rows)) if pred_error in ("", "Empty result.") else None
+            correct[route].append(gold is not None and pred == gold)
+    return correct
+
+def build_report(rows, correct, budget_fractions, route_costs):
+    difficulties = [
+        row["difficulty"] if row.get("difficulty") is not None
+        else predict_difficulty(row.get("question"), row.get("related_tables"), row.get("scaled_down_db_schema"))
+        for row in rows
+    ]
+    n = len(rows)
+    full_cost = route_cost(["dual_merge"] * n, route_costs)
+
+    budgets = []
+    for fraction in budget_fractions:
+        routes = allocate_routes(difficulties, fraction, route_costs)
+        budgets.append({
+            "budget_fraction": fraction,
+            "accuracy": sum(correct[route][i] for i, route in enumerate(routes)) / n,
+            "relative_cost": route_cost(routes, route_costs) / full_cost,
+            "routes": {route: routes.count(route) for route in ROUTES},
+        })
+
+    # 按预测难度四等分，检查难度预测是否与各路径的准确率相关
+    order = sorted(range(n), key=lambda i: difficulties[i])
+    quartiles = []
+    for q in range(4):
+        members = order[q * n // 4:(q + 1) * n // 4]
+        if not members:
+            continue
+        quartiles.append({
+            "quartile": q + 1,
+            "difficulty_range": [difficulties[members[0]], difficulties[members[-1]]],
+            "accuracy": {route: sum(correct[route][i] for i in members) / len(members) for route in ROUTES},
+        })
+    return {"num_questions": n, "budgets": budgets, "difficulty_quartiles": quartiles}
+
+def main():
+    parser = argparse.ArgumentParser(description="离线评估预算路由：在一次全预算运行的结果上比较不同预算下的准确率与代价。")
+    parser.add_argument('--pipeline_results', type=str, required=True,
+                        help='budget_fraction=1.0 运行得到的 pipeline_results.jsonl（每个问题都有两条路径与合并结果）。')
+    parser.add_argument('--db_root_dir', type=str, required=True, help='数据库根目录。')
+    parser.add_argument('--pipeline_configs_path', type=str, default=None, help='PipelineManager配置文件，用于读取 route_costs。')
+    parser.add_argument('--budget_fractions', type=str, default="0.25,0.375,0.5,0.625,0.75,0.875,1.0",
+                        help='逗号分隔的预算比例列表。')
+    parser.add_argument('--timeout', type=float, default=30.0, help='单条SQL的执行超时（秒）。')
+    parser.add_argument('--max_workers', type=int, default=16, help='并行执行SQL的线程数。')
+    parser.add_argument('--output_path', type=str, default=None, help='报告JSON的输出路径，默认与 pipeline_results 同目录。')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+
+    configs = None
+    if args.pipeline_configs_path:
+        with open(args.pipeline_configs_path, 'r', encoding='utf-8') as f:
+            configs = json.load(f)
+    route_costs = PipelineManager(configs=configs).get_node_option("path_routing", "route_costs")
+
+    rows = load_pipeline_results(args.pipeline_results)
+    partial = [row for row in rows if row.get("route", "dual_merge") != "dual_merge"]
+    if partial:
+        logging.warning(f"{len(partial)} 个问题不是以 dual_merge 路径运行的，其反事实结果不完整，已跳过。")
+        rows = [row for row in rows if row.get("route", "dual_merge") == "dual_merge"]
+    if not rows:
+        logging.error("没有可用于评估的结果。")
+        return
+
+    correct = judge_answers(rows, args.db_root_dir, args.timeout, args.max_workers)
+    budget_fractions = [float(x) for x in args.budget_fractions.split(',') if x.strip()]
+    report = build_report(rows, correct, budget_fractions, route_costs)
+
+    print(f"{'budget':>8} {'accuracy':>10} {'rel_cost':>10} {'single':>8} {'dual':>8} {'merge':>8}")
+    for item in report["budgets"]:
+        routes = item["routes"]
+        print(f"{item['budget_fraction']:>8.3f} {item['accuracy']:>10.4f} {item['relative_cost']:>10.3f} "
+              f"{routes['single']:>8} {routes['dual']:>8} {routes['dual_merge']:>8}")
+    for item in report["difficulty_quartiles"]:
+        accuracy = ", ".join(f"{route}={value:.3f}" for route, value in item["accuracy"].items())
+        print(f"难度第 {item['quartile']} 四分位 {item['difficulty_range'][0]:.2f}~{item['difficulty_range'][1]:.2f}: {accuracy}")
+
+    output_path = args.output_path or os.path.join(os.path.dirname(args.pipeline_results), 'route_budget_report.json')
+    with open(output_path, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    logging.info(f"预算路由报告已写入: {output_path}")
+
+if __name__ == "__main__":
+    main()
@@ -8,6 +8,9 @@ from transformers import AutoTokenizer
 import argparse
 from pipeline.managers.database_manager import DatabaseManager
 from pipeline.managers.pipeline_manager import PipelineManager
+from pipeline.managers.latency_manager import LatencyManager
+from pipeline.utils.sql_sandbox import init_sandbox_pool, shutdown_sandbox_pool
+from pipeline.utils.db_residency import init_db_residency, shutdown_db_residency
 
 def filter_dataframe_by_schema_token_length(df: pd.DataFrame, tokenizer, max_token_length: int = 8192):
     """
@@ -59,12 +62,40 @@ def main():
                         help='数据库schema文件目录')
     parser.add_argument('--db_root_dir', type=str, default='../../datasets/Spider/database',
                         help='数据库根目录')
+    parser.add_argument('--shadow_db_root_dir', type=str, default=None,
+                        help='采样影子数据库根目录（由 data_procession/build_shadow_databases.py 生成）。提供时精炼阶段先在影子库上校验SQL。')
+    parser.add_argument('--indexed_db_root_dir', type=str, default=None,
+                        help='带推荐索引的数据库副本根目录（由 data_procession/build_indexed_databases.py 生成）。存在副本的数据库优先使用副本执行SQL。')
+    parser.add_argument('--db_content_index_path', type=str, default=None,
+                        help='数据库值索引根目录（process_dataset.py --index_backend fts5 生成）。提供时在表抽取前在线检索问题相关的数据库值。')
     parser.add_argument('--csv_file_path', type=str, default='../preprocess_data/spider/dev/processed_dataset.csv',
                         help='包含任务数据的CSV文件路径')
     parser.add_argument('--pipeline_configs_path', type=str, default=None,
                         help='PipelineManager配置的JSON文件路径。如果未提供，将使用默认配置。')
     parser.add_argument('--max_schema_token_length', type=int, default=None,
                         help='数据库schema的最大token长度。如果未提供，则不进行过滤。')
+    parser.add_argument('--latency_stats_path', type=str, default=None,
+                        help='按数据库持久化SQL执行延迟样本的JSON文件路径。默认保存在输出目录下的 latency_stats.json。')
+    parser.add_argument('--timeout_multiplier', type=float, default=5.0,
+                        help='自适应执行超时 = timeout_multiplier * p99 延迟（限制在 [min_timeout, max_timeout] 内）。')
+    parser.add_argument('--min_timeout', type=float, default=5.0,
+                        help='自适应执行超时的下限（秒）。')
+    parser.add_argument('--max_timeout', type=float, default=300.0,
+                        help='自适应执行超时的上限（秒），样本不足时使用该值。')
+    parser.add_argument('--gold_warmup_per_db', type=int, default=20,
+                        help='执行管道前，每个样本不足的数据库最多执行多少条gold SQL来预热延迟模型。设为0则不预热。')
+    parser.add_argument('--sql_sandbox_workers', type=int, default=0,
+                        help='SQL沙箱工作进程数。大于0时所有SQL在受资源限制的独立进程中执行；为0时在进程内线程中执行。')
+    parser.add_argument('--sql_memory_limit_mb', type=int, default=4096,
+                        help='每个SQL沙箱工作进程的内存上限（MB，RLIMIT_AS）。')
+    parser.add_argument('--sql_cpu_limit', type=float, default=None,
+                        help='单条SQL在沙箱中可使用的CPU时间上限（秒）。未提供则不限制。')
+    parser.add_argument('--sql_worker_max_queries', type=int, default=200,
+                        help='每个SQL沙箱工作进程执行多少条查询后回收重启。')
+    parser.add_argument('--db_residency_mb', type=int, default=0,
+                        help='常驻内存的数据库副本总预算（MB）。大于0时频繁访问的数据库会被复制到内存中执行查询（仅对进程内执行生效）。')
+    parser.add_argument('--db_residency_promote_after', type=int, default=2,
+                        help='同一数据库被访问多少次后复制到内存。')
     
     args = parser.parse_args()
 
@@ -73,9 +104,13 @@ def main():
     SAVE_ADDITIONAL_DATA = args.save_additional_data
     db_schema_dir = args.db_schema_dir
     db_root_dir = args.db_root_dir
+    shadow_db_root_dir = args.shadow_db_root_dir
+    indexed_db_root_dir = args.indexed_db_root_dir
+    db_content_index_dir = args.db_content_index_path
     csv_file_path = args.csv_file_path
     pipeline_configs_path = args.pipeline_configs_path
     max_schema_token_length = args.max_schema_token_length
+    latency_stats_path = args.latency_stats_path or os.path.join(output_base_dir, dataset_name, 'latency_stats.json')
 
     table_output_dir = os.path.join(output_base_dir, dataset_name, 'table_results')
     sql_output_dir = os.path.join(output_base_dir, dataset_name, 'sql_results')
@@ -90,8 +125,8 @@ def main():
     logging.info(f"错误日志将写入: {error_log_file_path}")
 
     # 实例化DatabaseManager
-    DatabaseManager(db_schema_dir=db_schema_dir, db_root_dir=db_root_dir)
-    logging.info(f"DatabaseManager已初始化，db_schema_dir设置为：{db_schema_dir}，db_root_dir设置为：{db_root_dir}")
+    DatabaseManager(db_schema_dir=db_schema_dir, db_root_dir=db_root_dir, shadow_db_root_dir=shadow_db_root_dir, indexed_db_root_dir=indexed_db_root_dir, db_content_index_dir=db_content_index_dir)
+    logging.info(f"DatabaseManager已初始化，db_schema_dir设置为：{db_schema_dir}，db_root_dir设置为：{db_root_dir}，shadow_db_root_dir设置为：{shadow_db_root_dir}，indexed_db_root_dir设置为：{indexed_db_root_dir}，db_content_index_dir设置为：{db_content_index_dir}")
 
     # 实例化PipelineManager
     pipeline_configs = None
@@ -108,6 +143,28 @@ def main():
     PipelineManager(configs=pipeline_configs)
     logging.info("PipelineManager已初始化。")
 
+    # 实例化LatencyManager
+    latency_manager = LatencyManager(
+        stats_path=latency_stats_path,
+        multiplier=args.timeout_multiplier,
+        min_timeout=args.min_timeout,
+        max_timeout=args.max_timeout
+    )
+    logging.info(f"LatencyManager已初始化，延迟样本保存到：{latency_stats_path}")
+
+    if args.db_residency_mb > 0:
+        init_db_residency(args.db_residency_mb, args.db_residency_promote_after)
+        logging.info(f"数据库常驻层已启用，内存预算 {args.db_residency_mb} MB。")
+
+    # 在加载任何模型之前启动SQL沙箱进程池
+    if args.sql_sandbox_workers > 0:
+        init_sandbox_pool(
+            num_workers=args.sql_sandbox_workers,
+            memory_limit_mb=args.sql_memory_limit_mb,
+            cpu_limit_seconds=args.sql_cpu_limit,
+            max_queries_per_worker=args.sql_worker_max_queries
+        )
+
     # 使用pandas读取CSV文件
     try:
         df = pd.read_csv(csv_file_path)
@@ -149,6 +206,14 @@ def main():
         logging.warning("没有从CSV文件中构建任何任务。")
         return
 
+    # 使用gold SQL预热延迟模型
+    if args.gold_warmup_per_db > 0:
+        database_manager = DatabaseManager()
+        latency_manager.seed(
+            [(task.db_id, database_manager.get_db_path(task.db_id), task.query) for task in tasks],
+            per_db=args.gold_warmup_per_db
+        )
+
     # 创建并执行管道流
     pipeline = Pipeline(output_base_dir=output_base_dir, dataset_name=dataset_name)
     
@@ -164,6 +229,9 @@ def main():
     except Exception as e:
         logging.error(f"批量执行管道流时发生错误: {e}")
         return
+    finally:
+        shutdown_sandbox_pool()
+        shutdown_db_residency()
 
     # 调用 result_processing 处理结果
     logging.info("所有任务执行完毕，开始处理和保存结果...")
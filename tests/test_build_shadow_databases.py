@@ -0,0 +1,28 @@
+import os
+import sys
+import sqlite3
+
+import pytest
+
+pytest.importorskip("tqdm")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "data_procession"))
+
+from build_shadow_databases import build_shadow_database
+
+
+def test_without_rowid_table_is_sampled(tmp_path):
+    db_file_path = str(tmp_path / "source.sqlite")
+    conn = sqlite3.connect(db_file_path)
+    conn.execute("CREATE TABLE kv (k TEXT PRIMARY KEY, v INTEGER) WITHOUT ROWID")
+    conn.executemany("INSERT INTO kv VALUES (?, ?)", ((f"key_{i}", i) for i in range(50)))
+    conn.commit()
+    conn.close()
+
+    shadow_file_path = str(tmp_path / "shadow" / "source.sqlite")
+    build_shadow_database(db_file_path, shadow_file_path, max_rows_per_table=10)
+
+    conn = sqlite3.connect(shadow_file_path)
+    try:
+        assert conn.execute("SELECT count(*) FROM kv").fetchone()[0] == 10
+    finally:
+        conn.close()